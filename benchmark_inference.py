@@ -0,0 +1,628 @@
+"""
+Reproducible inference benchmark for the cattle & breed prediction pipeline.
+
+Drives ``predict_cattle``, ``predict_breed`` and ``perform_prediction`` from
+``cattle_with_breed_classifier.py`` with synthetic (seeded) and sample images
+across batch sizes, thread counts and image resolutions, and records latency
+percentiles, throughput and peak RSS to a JSON results file.
+
+Usage:
+    python benchmark_inference.py                         # run, compare with baseline
+    python benchmark_inference.py --save-baseline         # run and store as new baseline
+    python benchmark_inference.py --samples ./samples     # include real sample images
+    python benchmark_inference.py --threads 1 2 4 --batch-sizes 1 8 16
+    python benchmark_inference.py --threads 1 2 4 --concurrency 1 4 8   # throughput vs threads
+    python benchmark_inference.py --tta --samples ./labelled_samples    # TTA accuracy vs compute
+    python benchmark_inference.py --video walkby.mp4                    # video frames processed vs decoded
+    CATTLE_PRECISION=bf16 CATTLE_CHANNELS_LAST=1 python benchmark_inference.py --output benchmarks/bf16.json
+
+The "How It Works" page reads its performance figures from the latest
+results file written by this script.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+import runtime_config
+import tta
+import video_ingest
+from mixed_precision import autocast, prepare_input
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# -----------------------------
+# Defaults
+# -----------------------------
+BENCHMARK_DIR = Path('benchmarks')
+LATEST_RESULTS_PATH = BENCHMARK_DIR / 'latest.json'
+BASELINE_RESULTS_PATH = BENCHMARK_DIR / 'baseline.json'
+
+DEFAULT_RESOLUTIONS = ['640x480', '1920x1080', '4000x3000']
+REFERENCE_RESOLUTION = '1920x1080'
+DEFAULT_BATCH_SIZES = [1, 8, 32]
+DEFAULT_TOLERANCE = 0.15
+SEED = 42
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+# -----------------------------
+# Measurement helpers
+# -----------------------------
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def summarize_latencies(latencies_s, items_per_call=1, wall_s=None):
+    """
+    Turn a list of per-call latencies (seconds) into percentiles and throughput.
+    Pass ``wall_s`` when calls overlapped, so throughput uses elapsed time.
+    """
+    latencies_ms = np.asarray(latencies_s) * 1000.0
+    total_s = wall_s if wall_s is not None else float(np.sum(latencies_s))
+    return {
+        'latency_ms': {
+            'mean': float(latencies_ms.mean()),
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p90': float(np.percentile(latencies_ms, 90)),
+            'p95': float(np.percentile(latencies_ms, 95)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'max': float(latencies_ms.max()),
+        },
+        'throughput_ips': (len(latencies_s) * items_per_call) / total_s if total_s > 0 else 0.0,
+    }
+
+
+def time_calls(fn, iterations, warmup):
+    """Call ``fn`` ``warmup`` times untimed, then ``iterations`` times timed"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def parse_resolution(text):
+    """Parse a ``WIDTHxHEIGHT`` string"""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+def make_synthetic_images(resolution, count, seed=SEED):
+    """Deterministic RGB noise images of the given ``WIDTHxHEIGHT``"""
+    width, height = parse_resolution(resolution)
+    rng = np.random.default_rng(seed)
+    return [
+        Image.fromarray(rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8), 'RGB')
+        for _ in range(count)
+    ]
+
+
+def load_sample_images(samples_dir):
+    """Load every jpg/jpeg/png under ``samples_dir`` (sorted for reproducibility)"""
+    paths = sorted(
+        p for p in Path(samples_dir).rglob('*')
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    return [Image.open(p).convert('RGB') for p in paths]
+
+
+def load_labelled_samples(samples_dir):
+    """
+    Load sample images labelled by their parent directory name, e.g.
+    ``samples/Cow/img1.jpg`` or ``samples/Gir/img2.jpg``.
+
+    Returns:
+        list of (image, label) tuples
+    """
+    paths = sorted(
+        p for p in Path(samples_dir).rglob('*')
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    return [(Image.open(p).convert('RGB'), p.parent.name) for p in paths]
+
+
+def load_benchmark_models(app):
+    """
+    Lease the models the app serves from its registry (the active versions, or
+    the legacy checkpoints), so the timings cover the served path including
+    the heatmap hook. Without any checkpoint, randomly initialised ResNet-18s
+    are built and warmed up the same way. Latency does not depend on the weight
+    values, so random weights are fine for timing (but not for
+    perform_prediction, which needs real checkpoints).
+
+    Returns:
+        cattle_model, breed_model, weights ('checkpoint' or 'random'),
+        versions ({task: version} or None), leases to release when done
+    """
+    registry = app.get_model_registry()
+    leases = []
+    try:
+        for task in ('cattle', 'breed'):
+            leases.append(registry.lease(task))
+    except FileNotFoundError:
+        for lease in leases:
+            lease.release()
+    else:
+        versions = {'cattle': leases[0].version, 'breed': leases[1].version}
+        return leases[0].model, leases[1].model, 'checkpoint', versions, leases
+
+    torch.manual_seed(SEED)
+    models_out = []
+    for task, num_classes in (('cattle', len(app.cattle_class_names)), ('breed', len(app.breed_names))):
+        model = app.build_classifier(task, num_classes)
+        model.eval()
+        app.warm_up_classifier(model)
+        models_out.append(model)
+    return models_out[0], models_out[1], 'random', None, []
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+def bench_predict_cattle(app, cattle_model, images, iterations, warmup):
+    image_cycle = itertools.cycle(images)
+    return time_calls(
+        lambda: app.predict_cattle(next(image_cycle), cattle_model),
+        iterations, warmup
+    )
+
+
+def bench_predict_breed(app, breed_model, images, iterations, warmup):
+    image_cycle = itertools.cycle(images)
+    return time_calls(
+        lambda: app.predict_breed(next(image_cycle), breed_model, app.breed_names),
+        iterations, warmup
+    )
+
+
+def bench_perform_prediction(app, images, iterations, warmup, near_duplicates=False):
+    """
+    Time ``perform_prediction``. The same few images come round again and
+    again, so with the near-duplicate cache on every timed call after warmup
+    is a cache hit; it is off unless ``near_duplicates`` asks for hit latency.
+    """
+    app.NEAR_DUP_ENABLED = near_duplicates
+    app.get_prediction_cache.clear()
+    image_cycle = itertools.cycle(images)
+    return time_calls(
+        lambda: app.perform_prediction(next(image_cycle)),
+        iterations, warmup
+    )
+
+
+def bench_batched_forward(app, model, images, batch_size, iterations, warmup):
+    """Preprocess ``batch_size`` images and run them through ``model`` in one forward pass"""
+    batch_images = [images[i % len(images)] for i in range(batch_size)]
+
+    def run():
+        batch = prepare_input(torch.stack([app.transform(img) for img in batch_images]),
+                              app.precision_config['channels_last'])
+        with torch.no_grad(), autocast(app.precision_config['precision']):
+            torch.softmax(model(batch).float(), dim=1)
+
+    return time_calls(run, iterations, warmup)
+
+
+def bench_concurrent_sessions(app, breed_model, images, concurrency, iterations, warmup):
+    """
+    Simulate ``concurrency`` Streamlit sessions each calling ``predict_breed``
+    ``iterations`` times at once.
+
+    Returns:
+        latencies: per-call latencies across all sessions
+        wall_s: elapsed time for the whole run
+    """
+    def session(offset):
+        session_images = images[offset % len(images):] + images[:offset % len(images)]
+        return bench_predict_breed(app, breed_model, session_images, iterations, warmup)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        per_session = list(pool.map(session, range(concurrency)))
+        wall_s = time.perf_counter() - start
+    return [latency for latencies in per_session for latency in latencies], wall_s
+
+
+def bench_tta(predict, class_names, labelled_images, band):
+    """
+    Compare single-pass, band-triggered TTA and always-on TTA for one model.
+
+    ``predict(image, tta_band)`` returns the predicted class name. Accuracy is
+    only reported for images whose label is one of ``class_names``.
+    """
+    always = (0.0, 1.01)
+    modes = {'single_pass': None, 'band_triggered': band, 'always': always}
+    summary = {}
+    for mode, mode_band in modes.items():
+        latencies, correct, labelled = [], 0, 0
+        for image, label in labelled_images:
+            start = time.perf_counter()
+            predicted = predict(image, mode_band)
+            latencies.append(time.perf_counter() - start)
+            if label in class_names:
+                labelled += 1
+                correct += predicted == label
+        summary[mode] = {
+            **summarize_latencies(latencies),
+            'accuracy': correct / labelled if labelled else None,
+            'labelled_images': labelled,
+        }
+    single_ms = summary['single_pass']['latency_ms']['mean']
+    for mode in modes:
+        summary[mode]['relative_compute'] = summary[mode]['latency_ms']['mean'] / single_ms
+    return summary
+
+
+def run_tta_suite(app, cattle_model, breed_model, args):
+    """TTA accuracy gain against extra compute, on labelled samples or synthetic images"""
+    if args.samples:
+        labelled = load_labelled_samples(args.samples)
+    else:
+        labelled = [(img, None) for img in make_synthetic_images(REFERENCE_RESOLUTION, args.images_per_resolution)]
+
+    results = {'band': list(tta.TTA_BAND), 'images': len(labelled)}
+    results['predict_cattle'] = bench_tta(
+        lambda img, band: app.predict_cattle(img, cattle_model, band)[0],
+        app.cattle_class_names, labelled, tta.TTA_BAND
+    )
+    results['predict_breed'] = bench_tta(
+        lambda img, band: app.predict_breed(img, breed_model, app.breed_names, band),
+        app.breed_names, labelled, tta.TTA_BAND
+    )
+
+    for stage in ('predict_cattle', 'predict_breed'):
+        for mode in ('single_pass', 'band_triggered', 'always'):
+            entry = results[stage][mode]
+            accuracy = f"{entry['accuracy']:.2%}" if entry['accuracy'] is not None else "n/a"
+            print(f"TTA {stage:<15} {mode:<15} mean={entry['latency_ms']['mean']:8.2f} ms  "
+                  f"compute x{entry['relative_compute']:.2f}  accuracy={accuracy}")
+    return results
+
+
+def bench_video_decode(source):
+    """Frames/sec of decoding every frame of ``source`` and nothing else"""
+    capture = video_ingest.open_capture(source)
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while capture.grab():
+            frames += 1
+    finally:
+        capture.release()
+    elapsed = time.perf_counter() - start
+    return frames, frames / elapsed if elapsed > 0 else 0.0
+
+
+def run_video_suite(app, cattle_model, breed_model, args):
+    """
+    Frames classified per second against frames decoded per second for each
+    video: every frame, fixed-rate sampling, and sampling with the
+    frame-difference skip.
+    """
+    modes = {
+        'every_frame': dict(sample_fps=None, diff_threshold=0),
+        'sampled': dict(sample_fps=video_ingest.SAMPLE_FPS, diff_threshold=0),
+        'sampled_diff_skip': dict(sample_fps=video_ingest.SAMPLE_FPS,
+                                  diff_threshold=video_ingest.FRAME_DIFF_THRESHOLD),
+    }
+
+    def classify(batch):
+        return app.classify_batch(batch, cattle_model, breed_model)
+
+    results = []
+    for source in args.video:
+        decoded, decode_fps = bench_video_decode(source)
+        print(f"VIDEO {source}: {decoded} frames, decode only {decode_fps:8.1f} frames/s")
+        reference = None
+        for mode, sampling in modes.items():
+            clip = video_ingest.analyze_clip(source, classify, app.mean, app.std, keep_previews=False,
+                                             max_frames=None, **sampling)
+            stats = clip['stats']
+            prediction = int(clip['clip_cattle_probs'].argmax()) if clip['timestamps'] else None
+            if reference is None:
+                reference = stats['wall_seconds'], prediction
+            entry = {
+                'video': str(source),
+                'mode': mode,
+                'decode_only_fps': decode_fps,
+                **{k: stats[k] for k in ('decoded', 'sampled', 'skipped_similar', 'classified', 'wall_seconds',
+                                         'decoded_fps', 'processed_fps')},
+                'speedup': reference[0] / stats['wall_seconds'] if stats['wall_seconds'] > 0 else 0.0,
+                'agrees_with_every_frame': prediction == reference[1],
+            }
+            results.append(entry)
+            print(f"VIDEO {mode:<18} decoded={entry['decoded']:<6} classified={entry['classified']:<6} "
+                  f"skipped={entry['skipped_similar']:<5} {entry['decoded_fps']:8.1f} decoded/s  "
+                  f"{entry['processed_fps']:7.1f} classified/s  x{entry['speedup']:.1f}  "
+                  f"{'same' if entry['agrees_with_every_frame'] else 'different'} clip result")
+    return results
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def run_benchmarks(args):
+    """Run every configured scenario and return the results document"""
+    # Imported lazily: the app module configures Streamlit on import, which runs
+    # in "bare" mode (no server) when driven from this script.
+    import cattle_with_breed_classifier as app
+    # Timed predictions are not real traffic: keep them out of the prediction
+    # history and the hard-example store
+    app.HISTORY_ENABLED = app.CAPTURE_ENABLED = False
+    app.get_prediction_history.clear()
+    app.get_hard_example_store.clear()
+
+    default_threads = torch.get_num_threads()
+    thread_counts = args.threads or sorted({1, default_threads})
+
+    cattle_model, breed_model, weights, model_versions, leases = load_benchmark_models(app)
+    have_checkpoints = weights == 'checkpoint'
+
+    inputs = [(res, make_synthetic_images(res, args.images_per_resolution)) for res in args.resolutions]
+    if args.samples:
+        samples = load_sample_images(args.samples)
+        if samples:
+            inputs.append(('samples', samples))
+        else:
+            print(f"⚠️ No sample images found in {args.samples}")
+
+    results = []
+
+    def record(stage, threads, source, batch_size, latencies, wall_s=None, concurrency=1, slots=None):
+        entry = {
+            'stage': stage,
+            'threads': threads,
+            'source': source,
+            'batch_size': batch_size,
+            'concurrency': concurrency,
+            'slots': slots,
+            'iterations': len(latencies),
+            **summarize_latencies(latencies, items_per_call=batch_size, wall_s=wall_s),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        results.append(entry)
+        sessions = f" sessions={concurrency}/slots={slots or '-'}" if concurrency > 1 else ""
+        print(f"{stage:<20} threads={threads:<3} source={source:<10} batch={batch_size:<3}{sessions} "
+              f"p50={entry['latency_ms']['p50']:8.2f} ms  p95={entry['latency_ms']['p95']:8.2f} ms  "
+              f"{entry['throughput_ips']:8.1f} img/s")
+
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for source, images in inputs:
+            record('predict_cattle', threads, source, 1,
+                   bench_predict_cattle(app, cattle_model, images, args.iterations, args.warmup))
+            record('predict_breed', threads, source, 1,
+                   bench_predict_breed(app, breed_model, images, args.iterations, args.warmup))
+            if have_checkpoints:
+                record('perform_prediction', threads, source, 1,
+                       bench_perform_prediction(app, images, args.iterations, args.warmup))
+                record('perform_prediction_cached', threads, source, 1,
+                       bench_perform_prediction(app, images, args.iterations, args.warmup, near_duplicates=True))
+            for batch_size in args.batch_sizes:
+                if batch_size == 1:
+                    continue
+                record('batched_forward', threads, source, batch_size,
+                       bench_batched_forward(app, breed_model, images, batch_size,
+                                             max(1, args.iterations // 4), min(args.warmup, 2)))
+
+        # Throughput vs thread settings under concurrent sessions: unpinned
+        # (every session runs at once) against the slot budget the runtime
+        # configuration would pick for this thread count.
+        concurrent_images = inputs[0][1]
+        pinned_slots = max(1, app.runtime_config['cpu_budget'] // threads)
+        for concurrency in args.concurrency:
+            if concurrency == 1:
+                continue
+            for slots in sorted({concurrency, min(concurrency, pinned_slots)}, reverse=True):
+                runtime_config.set_inference_slots(slots)
+                latencies, wall_s = bench_concurrent_sessions(
+                    app, breed_model, concurrent_images, concurrency,
+                    max(1, args.iterations // 2), min(args.warmup, 2)
+                )
+                record('concurrent_predict_breed', threads, inputs[0][0], 1, latencies,
+                       wall_s=wall_s, concurrency=concurrency, slots=slots)
+
+    torch.set_num_threads(default_threads)
+    runtime_config.set_inference_slots(
+        app.runtime_config['inference_slots'] if app.runtime_config['pin_sessions'] else None
+    )
+
+    tta_results = run_tta_suite(app, cattle_model, breed_model, args) if args.tta else None
+    video_results = run_video_suite(app, cattle_model, breed_model, args) if args.video else None
+
+    for lease in leases:
+        lease.release()
+    if not have_checkpoints:
+        print("⚠️ Model checkpoints not found - timed randomly initialised models and skipped perform_prediction")
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'default_threads': default_threads,
+            'weights': weights,
+            'model_versions': model_versions,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'resolutions': args.resolutions,
+            'batch_sizes': args.batch_sizes,
+            'thread_counts': thread_counts,
+            'concurrency': args.concurrency,
+            'runtime_config': app.runtime_config,
+            'precision_config': app.precision_config,
+            'seed': SEED,
+        },
+        'peak_rss_mb': peak_rss_mb(),
+        'summary': build_summary(
+            results, default_threads if default_threads in thread_counts else max(thread_counts)
+        ),
+        'results': results,
+        'tta': tta_results,
+        'video': video_results,
+    }
+
+
+def build_summary(results, threads):
+    """
+    Headline numbers shown in the app: single-image latency per stage at the
+    reference resolution and the process' default thread count.
+    """
+    summary = {}
+    for entry in results:
+        if (entry['batch_size'] == 1 and entry['threads'] == threads
+                and entry['source'] == REFERENCE_RESOLUTION):
+            summary[entry['stage']] = {
+                'p50_ms': entry['latency_ms']['p50'],
+                'p95_ms': entry['latency_ms']['p95'],
+                'throughput_ips': entry['throughput_ips'],
+                'threads': entry['threads'],
+                'source': entry['source'],
+            }
+    return summary
+
+
+# -----------------------------
+# Baseline comparison
+# -----------------------------
+def _scenario_key(entry):
+    return (entry['stage'], entry['threads'], entry['source'], entry['batch_size'],
+            entry.get('concurrency', 1), entry.get('slots'))
+
+
+def compare_with_baseline(current, baseline, tolerance):
+    """
+    Compare p50 latency and throughput of every scenario present in both runs.
+
+    Returns:
+        regressions: list of human readable regression descriptions
+    """
+    baseline_by_key = {_scenario_key(e): e for e in baseline.get('results', [])}
+    regressions = []
+    for entry in current['results']:
+        reference = baseline_by_key.get(_scenario_key(entry))
+        if reference is None:
+            continue
+        label = '{} threads={} source={} batch={} sessions={} slots={}'.format(*_scenario_key(entry))
+        p50, base_p50 = entry['latency_ms']['p50'], reference['latency_ms']['p50']
+        if p50 > base_p50 * (1 + tolerance):
+            regressions.append(f"{label}: p50 {p50:.2f} ms vs baseline {base_p50:.2f} ms")
+        ips, base_ips = entry['throughput_ips'], reference['throughput_ips']
+        if ips < base_ips * (1 - tolerance):
+            regressions.append(f"{label}: throughput {ips:.1f} img/s vs baseline {base_ips:.1f} img/s")
+    return regressions
+
+
+def write_results(document, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path):
+    """Load a results file, returning None if it does not exist or is unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cattle & breed inference pipeline")
+    parser.add_argument('--threads', type=int, nargs='+',
+                        help="torch intra-op thread counts to sweep (default: 1 and torch's default)")
+    parser.add_argument('--resolutions', nargs='+', default=DEFAULT_RESOLUTIONS,
+                        help="synthetic image resolutions as WIDTHxHEIGHT")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1],
+                        help="simulated concurrent sessions for the throughput vs threads sweep")
+    parser.add_argument('--samples', help="directory of sample jpg/jpeg/png images to include "
+                                          "(sub-directories named after a class label them for --tta)")
+    parser.add_argument('--tta', action='store_true',
+                        help="also compare test-time augmentation accuracy against its extra compute")
+    parser.add_argument('--video', nargs='+',
+                        help="video files or stream URLs to compare frames classified against frames decoded")
+    parser.add_argument('--images-per-resolution', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--output', default=str(LATEST_RESULTS_PATH))
+    parser.add_argument('--baseline', default=str(BASELINE_RESULTS_PATH))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store this run as the new baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before a scenario counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    torch.manual_seed(SEED)
+
+    document = run_benchmarks(args)
+    write_results(document, args.output)
+    print(f"\n✅ Results written to {args.output} (peak RSS {document['peak_rss_mb'] or 0:.0f} MB)")
+
+    if args.save_baseline:
+        write_results(document, args.baseline)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        print(f"ℹ️ No baseline at {args.baseline} - run with --save-baseline to create one")
+        return 0
+
+    precision = document['meta']['precision_config']
+    base_precision = baseline['meta'].get('precision_config') or {'precision': 'fp32', 'channels_last': False}
+    if (precision['precision'], precision['channels_last']) != \
+            (base_precision['precision'], base_precision['channels_last']):
+        print(f"ℹ️ Baseline ran {base_precision['precision']} (channels-last: {base_precision['channels_last']}), "
+              f"this run {precision['precision']} (channels-last: {precision['channels_last']}) - not compared")
+        return 0
+
+    regressions = compare_with_baseline(document, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%} tolerance:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print(f"✅ No regressions against baseline ({args.tolerance:.0%} tolerance)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
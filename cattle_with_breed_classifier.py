@@ -7,8 +7,30 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
+import math
 import os
-from datetime import datetime
+import json
+import shutil
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from runtime_config import configure_torch_runtime, inference_slot
+from mixed_precision import autocast, detect_precision_config, prepare_input, prepare_model
+from image_ingest import encode_preview, ingest_image, ImageRejected, MAX_UPLOAD_BYTES
+from tta import TTA_ENABLED, TTA_BAND, build_tta_views, in_uncertainty_band, tta_probabilities
+from animal_detection import crop_animals, detect_animals, draw_detections, load_detector
+from model_registry import POLL_SECONDS, REGISTRY_DIR, ModelRegistry
+from prediction_history import CONFIDENCE_BUCKETS, HISTORY_DB, HISTORY_ENABLED, PredictionHistory, read_aggregates
+from near_duplicates import NEAR_DUP_ENABLED, NearDuplicateCache
+from saliency import attach_recorder, class_activation_map, heatmap_overlay, recorded_activations
+from session_memory import SessionArtifacts
+from shadow_eval import SHADOW_LOG, SHADOW_MODEL_PATH, ShadowEvaluator
+from video_ingest import VIDEO_EXTENSIONS, VideoRejected, allowed_streams, analyze_clip, check_stream_source
+from hard_examples import (
+    CAPTURE_BELOW, CAPTURE_DIR, CAPTURE_ENABLED, LOW_CONFIDENCE, USER_FLAG, HardExampleStore
+)
 
 # -----------------------------
 # Page configuration
@@ -225,6 +247,23 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# -----------------------------
+# Torch Runtime Configuration
+# -----------------------------
+@st.cache_resource
+def get_runtime_config():
+    """Size torch's thread pools to the container CPU quota once per process"""
+    return configure_torch_runtime()
+
+runtime_config = get_runtime_config()
+
+@st.cache_resource
+def get_precision_config():
+    """Opt-in bf16 / channels-last settings; bf16 falls back to fp32 without native CPU support"""
+    return detect_precision_config()
+
+precision_config = get_precision_config()
+
 # -----------------------------
 # Transform for images
 # -----------------------------
@@ -239,16 +278,6 @@ transform = transforms.Compose([
 # -----------------------------
 # Load Models with Caching for Performance
 # -----------------------------
-@st.cache_resource
-def load_cattle_model(model_path):
-    """Load cattle classification model with caching for better performance"""
-    model = models.resnet18(pretrained=False)
-    num_ftrs = model.fc.in_features
-    model.fc = nn.Linear(num_ftrs, 3)
-    model.load_state_dict(torch.load(model_path, map_location='cpu'))
-    model.eval()
-    return model
-
 @st.cache_resource
 def load_breed_model(model_path, num_classes):
     """Load breed classification model with caching for better performance"""
@@ -256,18 +285,83 @@ def load_breed_model(model_path, num_classes):
     num_ftrs = model.fc.in_features
     model.fc = nn.Linear(num_ftrs, num_classes)
     model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    prepare_model(model, precision_config['channels_last'])
     model.eval()
     return model
 
+def build_classifier(task, num_classes):
+    """
+    Untrained ResNet-18 with a ``num_classes`` head, as the registry loads it,
+    recording ``layer4`` activations for heatmaps
+    """
+    model = models.resnet18(pretrained=False)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return attach_recorder(model)
+
+def warm_up_classifier(model):
+    """Match the serving memory format and run a few passes before a version goes live"""
+    prepare_model(model, precision_config['channels_last'])
+    # Holds a slot like any request, so warming up on the watcher thread does
+    # not oversubscribe the CPU budget of live inferences
+    with inference_slot(), torch.no_grad(), autocast(precision_config['precision']):
+        for batch_size in (1, 1, 4):
+            model(prepare_input(torch.zeros(batch_size, 3, 224, 224), precision_config['channels_last']))
+
+@st.cache_resource
+def get_model_registry():
+    """Process-wide registry serving the active model versions, polling for new ones"""
+    registry = ModelRegistry(
+        REGISTRY_DIR,
+        build_model=build_classifier,
+        num_classes={'cattle': len(cattle_class_names), 'breed': len(breed_names)},
+        legacy_paths={'cattle': CATTLE_MODEL_PATH, 'breed': BREED_MODEL_PATH},
+        warmup=warm_up_classifier,
+    )
+    registry.start_watcher(POLL_SECONDS)
+    return registry
+
+@st.cache_resource
+def load_animal_detector():
+    """Load the COCO animal detector used by herd mode, once per process"""
+    return load_detector()
+
 @st.cache_data
 def get_breed_database():
     """Cache breed database for better performance"""
     return breed_database
 
+@st.cache_data
+def load_benchmark_summary(results_path, mtime):
+    """Load headline numbers from the latest benchmark_inference.py run (mtime busts the cache)"""
+    try:
+        with open(results_path) as f:
+            results = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {
+        'timestamp': results.get('meta', {}).get('timestamp'),
+        'weights': results.get('meta', {}).get('weights'),
+        'peak_rss_mb': results.get('peak_rss_mb'),
+        'stages': results.get('summary', {}),
+    }
+
+def get_benchmark_summary(results_path='benchmarks/latest.json'):
+    """Return the latest benchmark summary, or None if no benchmark has been run"""
+    if not os.path.exists(results_path):
+        return None
+    return load_benchmark_summary(results_path, os.path.getmtime(results_path))
+
 # -----------------------------
 # Class Names
 # -----------------------------
 cattle_class_names = ['Buffalo', 'Cow', 'None']
+CONFIDENCE_THRESHOLD = 0.60
+BATCH_SIZE = 16  # Images per forward pass in batch mode
+BATCH_PAGE_SIZE = 12  # Result cards per page in batch mode
+BATCH_GRID_COLUMNS = 4
+BATCH_THUMBNAIL_SIDE = 320
+CATTLE_MODEL_PATH = 'models/best_cow_buffalo_none_classifier.pth'
+BREED_MODEL_PATH = 'models/breed_classifier.pth'
 breed_names = ['Alambadi', 'Amritmahal', 'Ayrshire', 'Banni', 'Bargur', 'Bhadawari', 'Brown_Swiss', 'Dangi', 
                'Deoni', 'Gir', 'Guernsey', 'Hallikar', 'Hariana', 'Holstein_Friesian', 'Jaffrabadi', 'Jersey', 
                'Kangayam', 'Kankrej', 'Kasargod', 'Kenkatha', 'Kherigarh', 'Khillari', 'Krishna_Valley', 
@@ -941,20 +1035,488 @@ breed_database = {
 # -----------------------------
 # Prediction Functions
 # -----------------------------
-def predict_cattle(image, model):
-    image = transform(image).unsqueeze(0)
-    with torch.no_grad():
-        output = model(image)
-        probs = torch.softmax(output, dim=1)
-        confidence, predicted = torch.max(probs, 1)
-        return cattle_class_names[predicted.item()], confidence.item()
-
-def predict_breed(image, model, breed_names):
-    image = transform(image).unsqueeze(0)
-    with torch.no_grad():
-        output = model(image)
-        _, predicted = torch.max(output, 1)
-        return breed_names[predicted.item()]
+def refine_with_tta(model, image, first_pass_probs):
+    """
+    Batched pass over augmented views of a borderline prediction. The views
+    are built before taking the inference slot, which is held for the
+    forward pass only.
+    """
+    views = prepare_input(build_tta_views(image, mean, std), precision_config['channels_last'])
+    with inference_slot(), torch.no_grad(), autocast(precision_config['precision']):
+        return tta_probabilities(model, views, first_pass_probs)
+
+def predict_cattle(image, model, tta_band=None, return_probs=False):
+    tensor = prepare_input(transform(image).unsqueeze(0), precision_config['channels_last'])
+    with inference_slot(), torch.no_grad(), autocast(precision_config['precision']):
+        output = model(tensor).float()
+    probs = torch.softmax(output, dim=1)[0]
+    # Borderline first pass: refine with a batched pass over augmented views
+    if in_uncertainty_band(probs.max().item(), tta_band):
+        probs = refine_with_tta(model, image, probs)
+    confidence, predicted = torch.max(probs, 0)
+    if return_probs:
+        return cattle_class_names[predicted.item()], confidence.item(), probs.numpy()
+    return cattle_class_names[predicted.item()], confidence.item()
+
+def predict_breed(image, model, breed_names, tta_band=None, return_probs=False, tensor=None):
+    if tensor is None:
+        tensor = transform(image)
+    tensor = prepare_input(tensor.unsqueeze(0), precision_config['channels_last'])
+    with inference_slot(), torch.no_grad(), autocast(precision_config['precision']):
+        output = model(tensor).float()
+    if tta_band or return_probs:
+        probs = torch.softmax(output, dim=1)[0]
+        if in_uncertainty_band(probs.max().item(), tta_band):
+            probs = refine_with_tta(model, image, probs)
+            output = probs.unsqueeze(0)
+    _, predicted = torch.max(output, 1)
+    if return_probs:
+        return breed_names[predicted.item()], probs.numpy()
+    return breed_names[predicted.item()]
+
+def passes_breed_gate(predicted_cattle, confidence):
+    """Breed detection only runs on confident Cow/Buffalo classifications"""
+    return confidence >= CONFIDENCE_THRESHOLD and predicted_cattle in ['Cow', 'Buffalo']
+
+def predict_probabilities(model, batch):
+    """Softmax probabilities of ``model`` for a preprocessed [B, 3, 224, 224] batch, in one forward pass"""
+    batch = prepare_input(batch, precision_config['channels_last'])
+    with inference_slot(), torch.no_grad(), autocast(precision_config['precision']):
+        return torch.softmax(model(batch).float(), dim=1)
+
+def classify_batch(batch, cattle_model, breed_model):
+    """
+    Classify every image of a preprocessed batch: one cattle forward pass over
+    the batch, then one breed forward pass over the images passing the gate.
+
+    Returns:
+        cattle_probs: [B, 3] numpy array
+        breed_probs: [B, len(breed_names)] numpy array (zero rows where the gate
+            failed), or None without a breed model
+        breed_mask: [B] bool numpy array, True where the gate passed
+    """
+    cattle_probs = predict_probabilities(cattle_model, batch)
+    confidence, predicted = cattle_probs.max(dim=1)
+    breed_mask = np.array([
+        passes_breed_gate(cattle_class_names[p], c) for p, c in zip(predicted.tolist(), confidence.tolist())
+    ], dtype=bool)
+    breed_probs = None
+    if breed_model is not None:
+        breed_probs = np.zeros((len(batch), len(breed_names)), dtype=np.float32)
+        if breed_mask.any():
+            breed_probs[breed_mask] = predict_probabilities(breed_model, batch[torch.from_numpy(breed_mask)]).numpy()
+    return cattle_probs.numpy(), breed_probs, breed_mask
+
+def predict_herd(image, detector, cattle_model, breed_model):
+    """
+    Detect every animal in ``image`` and classify all crops as one batch.
+
+    Returns:
+        list of per-animal dicts, highest detection score first: 'box',
+        'score', 'cattle', 'confidence', 'breed', 'breed_confidence' and
+        'breed_probs' (the breed entries are None where the breed gate failed)
+    """
+    with inference_slot():
+        detections = detect_animals(detector, image)
+    if not detections:
+        return []
+    batch = torch.stack([transform(crop) for crop in crop_animals(image, detections)])
+    cattle_probs, breed_probs, breed_mask = classify_batch(batch, cattle_model, breed_model)
+    
+    animals = []
+    for i, detection in enumerate(detections):
+        predicted = int(cattle_probs[i].argmax())
+        animal = {
+            'box': detection['box'],
+            'score': detection['score'],
+            'cattle': cattle_class_names[predicted],
+            'confidence': float(cattle_probs[i, predicted]),
+            'breed': None,
+            'breed_confidence': None,
+            'breed_probs': None,
+        }
+        if breed_probs is not None and breed_mask[i]:
+            breed = int(breed_probs[i].argmax())
+            animal.update(breed=breed_names[breed], breed_confidence=float(breed_probs[i, breed]),
+                          breed_probs=breed_probs[i])
+        animals.append(animal)
+    return animals
+
+# -----------------------------
+# Hard-Example Capture
+# -----------------------------
+@st.cache_resource
+def get_hard_example_store():
+    """Process-wide append-only store of low-confidence and user-flagged predictions"""
+    if not CAPTURE_ENABLED:
+        return None
+    return HardExampleStore(CAPTURE_DIR, {'cattle': cattle_class_names, 'breed': breed_names})
+
+def capture_hard_example(image, task, probs, reason=None):
+    """Queue ``image`` for labelling if flagged or below CAPTURE_BELOW; never blocks"""
+    store = get_hard_example_store()
+    if store is None or (reason is None and float(probs.max()) >= CAPTURE_BELOW):
+        return
+    store.capture(image, task, probs, reason or LOW_CONFIDENCE)
+
+def predicted_class_cam(model, recorded, probs):
+    """CAM of the predicted class from the activations recorded during the prediction, or None"""
+    activations = recorded['activations']
+    if activations is None:
+        return None
+    return class_activation_map(activations[0], model.fc.weight, int(probs.argmax()))
+
+def classify_cattle(image, model, tta_band=None):
+    """
+    ``predict_cattle`` with its probabilities and heatmap, capturing
+    low-confidence results
+    """
+    with recorded_activations(model) as recorded:
+        predicted, confidence, probs = predict_cattle(image, model, tta_band, return_probs=True)
+    capture_hard_example(image, 'cattle', probs)
+    return predicted, confidence, probs, predicted_class_cam(model, recorded, probs)
+
+def classify_breed(image, model, tta_band=None):
+    """
+    ``predict_breed`` with its probabilities and heatmap, capturing
+    low-confidence results and sending the input to the shadow candidate,
+    if one is configured
+    """
+    tensor = transform(image)
+    with recorded_activations(model) as recorded:
+        predicted, probs = predict_breed(image, model, breed_names, tta_band, return_probs=True, tensor=tensor)
+    capture_hard_example(image, 'breed', probs)
+    shadow = get_shadow_evaluator()
+    if shadow is not None:
+        shadow.submit(tensor, probs)
+    return predicted, probs, predicted_class_cam(model, recorded, probs)
+
+# -----------------------------
+# Prediction History
+# -----------------------------
+@st.cache_resource
+def get_prediction_history():
+    """Process-wide prediction log with its aggregates, or None if disabled"""
+    return PredictionHistory(HISTORY_DB) if HISTORY_ENABLED else None
+
+def record_prediction(source, cattle, confidence, breed=None, breed_confidence=None):
+    """Queue one served prediction for the history; never blocks"""
+    history = get_prediction_history()
+    if history is not None:
+        history.record(source, cattle, confidence, breed, breed_confidence)
+
+def record_photo_job(cattle_future, breed_future):
+    """Record a finished single-photo job (called once, when its breed future resolves)"""
+    if cattle_future.exception() is not None:
+        return
+    predicted_cattle, confidence, _, _ = cattle_future.result()
+    breed_result = breed_future.result() if breed_future.exception() is None else None
+    if breed_result is None:
+        record_prediction('photo', predicted_cattle, confidence)
+    else:
+        predicted_breed, breed_probs, _ = breed_result
+        record_prediction('photo', predicted_cattle, confidence, predicted_breed, float(breed_probs.max()))
+
+def record_herd_job(herd_future):
+    if herd_future.exception() is not None:
+        return
+    for animal in herd_future.result():
+        record_prediction('herd', animal['cattle'], animal['confidence'], animal['breed'], animal['breed_confidence'])
+
+# -----------------------------
+# Shadow Evaluation
+# -----------------------------
+@st.cache_resource
+def get_shadow_evaluator():
+    """Process-wide evaluator of the candidate breed model, or None without one"""
+    if SHADOW_MODEL_PATH is None:
+        return None
+    try:
+        candidate = load_breed_model(SHADOW_MODEL_PATH, len(breed_names))
+    except Exception as e:
+        print(f"❌ Shadow evaluation disabled: could not load {SHADOW_MODEL_PATH}: {e}")
+        return None
+    def production(batch):
+        # Timed on the same batches as the candidate, so queueing and TTA don't skew the comparison
+        lease = get_model_registry().lease('breed')
+        try:
+            return predict_probabilities(lease.model, batch).numpy()
+        finally:
+            lease.release()
+    return ShadowEvaluator(lambda batch: predict_probabilities(candidate, batch).numpy(), breed_names,
+                           log_path=SHADOW_LOG, baseline=production)
+
+# -----------------------------
+# Session Artifacts
+# -----------------------------
+@st.cache_resource
+def get_session_artifacts():
+    """Process-wide store of large per-session values, bounded across sessions"""
+    def is_active(session_id):
+        return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+    return SessionArtifacts(is_active=is_active)
+
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+def get_session_artifact(key):
+    """A large value of this session (stored with ``set_session_artifact``), or None if absent or evicted"""
+    return get_session_artifacts().get(current_session_id(), key)
+
+def set_session_artifact(key, value, compactable=True, recomputable=False):
+    get_session_artifacts().put(current_session_id(), key, value, compactable, recomputable)
+
+def drop_session_artifacts(*keys):
+    """Free artifacts of this session that its current input no longer needs"""
+    for key in keys:
+        get_session_artifacts().pop(current_session_id(), key)
+
+# -----------------------------
+# Background Inference
+# -----------------------------
+@st.cache_resource
+def get_inference_executor():
+    """Process-wide executor so the script thread never blocks on a forward pass"""
+    return ThreadPoolExecutor(
+        max_workers=runtime_config['inference_slots'],
+        thread_name_prefix='inference'
+    )
+
+@st.cache_resource
+def get_decode_executor():
+    """Process-wide pool decoding multi-file uploads; PIL releases the GIL while it decodes"""
+    return ThreadPoolExecutor(
+        max_workers=min(8, runtime_config['available_cpus'] * 2),
+        thread_name_prefix='decode'
+    )
+
+@st.cache_resource
+def get_prediction_cache():
+    """Process-wide cache of predictions for near-duplicate images, or None if disabled"""
+    return NearDuplicateCache() if NEAR_DUP_ENABLED else None
+
+def submit_cached(task, classify, image, model, tta_band, fingerprint):
+    """
+    Future for ``classify(image, model, tta_band)``: resolved at once with the
+    result of a cached near-duplicate of ``image``, otherwise submitted to the
+    inference executor and cached when it completes.
+    """
+    cache = get_prediction_cache()
+    if cache is None:
+        return get_inference_executor().submit(classify, image, model, tta_band)
+    namespace = (task, getattr(model, 'registry_version', id(model)), tta_band)
+    cached = cache.lookup(namespace, fingerprint)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+    
+    def store(done):
+        if done.exception() is None:
+            cache.store(namespace, fingerprint, done.result())
+    
+    future = get_inference_executor().submit(classify, image, model, tta_band)
+    future.add_done_callback(store)
+    return future
+
+def _copy_future(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+def submit_prediction(image, cattle_model, breed_model, tta_band=None):
+    """
+    Submit cattle classification, then breed classification once the cattle
+    result passes the confidence gate. ``tta_band`` enables test-time
+    augmentation for first-pass confidences inside the band.
+
+    Returns:
+        cattle_future: resolves to (predicted_cattle, confidence, probs, cam)
+        breed_future: resolves to (predicted_breed, probs, cam), or None if the gate failed
+        (cam is a 7×7 heatmap of the predicted class, or None)
+    """
+    cache = get_prediction_cache()
+    fingerprint = cache.fingerprint(image) if cache is not None else None
+    cattle_future = submit_cached('cattle', classify_cattle, image, cattle_model, tta_band, fingerprint)
+    breed_future = Future()
+    # Futures keep their callbacks, and sessions keep their futures: hand the
+    # model and image over through a holder so a finished job does not pin
+    # the model version or the working image
+    pending = [(breed_model, image)]
+    
+    def start_breed(done):
+        # Chained from the callback rather than waiting inside a worker, so
+        # queued breed tasks can never starve the cattle tasks they depend on
+        breed_model, image = pending.pop()
+        if done.exception() is not None:
+            breed_future.set_result(None)
+            return
+        predicted_cattle, confidence, _, _ = done.result()
+        if breed_model is None or not passes_breed_gate(predicted_cattle, confidence):
+            breed_future.set_result(None)
+            return
+        submit_cached('breed', classify_breed, image, breed_model, tta_band, fingerprint).add_done_callback(
+            lambda f: _copy_future(f, breed_future)
+        )
+    
+    cattle_future.add_done_callback(start_breed)
+    return cattle_future, breed_future
+
+def decode_upload(uploaded_file):
+    """
+    Decode one upload and preprocess it for the models (runs on the decode pool).
+
+    Returns:
+        (image, tensor, None), or (None, None, error message) if the upload was rejected
+    """
+    try:
+        image, _ = ingest_image(uploaded_file, size_bytes=uploaded_file.size)
+    except ImageRejected as e:
+        return None, None, str(e)
+    finally:
+        uploaded_file.close()
+    return image, transform(image), None
+
+def analyze_uploads(uploaded_files, batch_size=BATCH_SIZE):
+    """
+    Decode ``uploaded_files`` concurrently and classify them in batches.
+    Decoding continues in the background while earlier batches are classified.
+
+    Returns:
+        one result dict per upload, in upload order, or None if the models
+        could not be loaded (the error is already shown)
+    """
+    leases = lease_prediction_models()
+    if leases is None:
+        return None
+    try:
+        return _classify_uploads(uploaded_files, leases[0].model, leases[1] and leases[1].model, batch_size)
+    finally:
+        release_models(leases)
+
+def _classify_uploads(uploaded_files, cattle_model, breed_model, batch_size):
+    results = []
+    pending = []
+    
+    def classify_pending():
+        batch = torch.stack([tensor for _, _, tensor in pending])
+        cattle_probs, breed_probs, breed_mask = classify_batch(batch, cattle_model, breed_model)
+        for row, (result, image, _) in enumerate(pending):
+            predicted = int(cattle_probs[row].argmax())
+            result.update(
+                cattle=cattle_class_names[predicted],
+                confidence=float(cattle_probs[row, predicted]),
+                cattle_probs=cattle_probs[row],
+            )
+            capture_hard_example(image, 'cattle', cattle_probs[row])
+            if breed_probs is not None and breed_mask[row]:
+                top = np.argsort(-breed_probs[row])[:3]
+                result.update(
+                    breed=breed_names[top[0]],
+                    breed_confidence=float(breed_probs[row, top[0]]),
+                    breed_top3=[(breed_names[i], float(breed_probs[row, i])) for i in top],
+                )
+                capture_hard_example(image, 'breed', breed_probs[row])
+            record_prediction('batch', result['cattle'], result['confidence'],
+                              result['breed'], result['breed_confidence'])
+            # Only an encoded thumbnail is kept, so 40 uploads don't pin 40
+            # working-size images and reruns don't re-encode them
+            result['thumbnail'] = encode_preview(image, BATCH_THUMBNAIL_SIDE)[0]
+        pending.clear()
+    
+    decoded = get_decode_executor().map(decode_upload, uploaded_files)
+    for uploaded_file, (image, tensor, error) in zip(uploaded_files, decoded):
+        result = {'name': uploaded_file.name, 'error': error, 'thumbnail': None, 'cattle': None,
+                  'confidence': None, 'cattle_probs': None, 'breed': None, 'breed_confidence': None,
+                  'breed_top3': []}
+        results.append(result)
+        if error is None:
+            pending.append((result, image, tensor))
+            if len(pending) == batch_size:
+                classify_pending()
+    if pending:
+        classify_pending()
+    return results
+
+def lease_prediction_models():
+    """
+    Lease the active cattle model version and, if available, the breed model.
+    The request runs on these versions even if newer ones are swapped in
+    meanwhile; pass the leases to ``release_models`` when it is done.
+
+    Returns:
+        (cattle_lease, breed_lease or None), or None if the cattle model could
+        not be loaded (the error is already shown)
+    """
+    registry = get_model_registry()
+    try:
+        cattle_lease = registry.lease('cattle')
+    except FileNotFoundError:
+        st.error("❌ Cattle classification model not found. Please ensure model files are uploaded correctly.")
+        return None
+    except Exception as e:
+        st.error(f"❌ Error loading cattle model: {str(e)}")
+        st.info("💡 This might be due to missing model files or memory constraints. Please try again or contact support.")
+        return None
+    
+    try:
+        breed_lease = registry.lease('breed')
+    except Exception:
+        # Reported when (and if) the cattle result passes the gate
+        breed_lease = None
+    return cattle_lease, breed_lease
+
+def release_models(leases):
+    """Return the leases taken by ``lease_prediction_models``"""
+    for lease in leases:
+        if lease is not None:
+            lease.release()
+
+def start_prediction(image, tta_band=None):
+    """
+    Load the models and submit the prediction job for ``image``.
+
+    Returns:
+        job: (cattle_future, breed_future, breed_model_available), or None if
+        the cattle model could not be loaded (the error is already shown)
+    """
+    leases = lease_prediction_models()
+    if leases is None:
+        return None
+    cattle_lease, breed_lease = leases
+    cattle_future, breed_future = submit_prediction(
+        image, cattle_lease.model, breed_lease and breed_lease.model, tta_band
+    )
+    # The breed future always resolves last, also when the gate fails
+    breed_future.add_done_callback(lambda _: release_models(leases))
+    breed_future.add_done_callback(lambda done: record_photo_job(cattle_future, done))
+    return cattle_future, breed_future, breed_lease is not None
+
+def start_herd_prediction(image):
+    """
+    Load the detector and models and submit herd analysis of ``image``.
+
+    Returns:
+        future resolving to predict_herd's result, or None if the models or the
+        detector could not be loaded (the error or a fallback note is already shown)
+    """
+    try:
+        detector = load_animal_detector()
+    except Exception as e:
+        st.warning(f"⚠️ Animal detector unavailable ({e}); analyzing the whole photo instead.")
+        return None
+    leases = lease_prediction_models()
+    if leases is None:
+        return None
+    cattle_lease, breed_lease = leases
+    herd_future = get_inference_executor().submit(
+        predict_herd, image, detector, cattle_lease.model, breed_lease and breed_lease.model
+    )
+    herd_future.add_done_callback(lambda _: release_models(leases))
+    herd_future.add_done_callback(record_herd_job)
+    return herd_future
 
 # -----------------------------
 # Model Information and Documentation
@@ -998,6 +1560,90 @@ def display_model_info():
         - **Resize:** 224×224 pixels
         - **Format:** RGB
         """)
+    
+    with st.sidebar.expander("🧵 Runtime Threads", expanded=False):
+        cpu_quota = runtime_config['cpu_quota']
+        st.markdown(f"""
+        **CPU Budget:**
+        - **Quota:** {f"{cpu_quota:.2f} CPUs" if cpu_quota else "Unlimited"}
+        - **Available CPUs:** {runtime_config['available_cpus']}
+        
+        **Torch Threads:**
+        - **Intra-op:** {runtime_config['intra_op_threads']}
+        - **Inter-op:** {runtime_config['inter_op_threads_effective']}
+        - **Concurrent Inferences:** {runtime_config['inference_slots'] if runtime_config['pin_sessions'] else "Unlimited"}
+        
+        **Precision:**
+        - **Compute:** {precision_config['precision'].upper()}
+        - **Native bf16:** {"Yes" if precision_config['native_bf16'] else "No"}
+        - **Channels-last:** {"On" if precision_config['channels_last'] else "Off"}
+        """)
+        if precision_config['fallback_reason']:
+            st.caption(f"⚠️ bf16 requested but running fp32: {precision_config['fallback_reason']}")
+
+        registry_status = get_model_registry().status()
+        if registry_status:
+            lines = []
+            for task, info in registry_status.items():
+                draining = ", ".join(f"{version} ({leases} in flight)" for version, leases in info['draining'])
+                lines.append(f"- **{task.capitalize()}:** {info['version']} since {info['loaded_at']}, "
+                             f"{info['in_flight']} in flight" + (f"; draining {draining}" if draining else ""))
+            st.markdown("**Model Versions:**\n" + "\n".join(lines))
+
+        cache = get_prediction_cache()
+        if cache is not None:
+            summary = cache.summary()
+            if summary['lookups']:
+                st.markdown(f"""
+                **Near-Duplicate Cache:**
+                - **Hit Rate:** {summary['hit_rate']:.1%} of {summary['lookups']} lookups ({summary['entries']} cached)
+                - **Hashing / Lookup (p50):** {summary['fingerprint_ms_p50']:.2f} ms / {summary['lookup_ms_p50']:.2f} ms
+                """)
+
+        shadow = get_shadow_evaluator()
+        if shadow is not None:
+            summary = shadow.summary()
+            agreement = f"{summary['agreement']:.1%}" if summary['agreement'] is not None else "n/a"
+            delta = summary['latency_delta_ms']
+            st.markdown(f"""
+            **Shadow Breed Model** ({os.path.basename(SHADOW_MODEL_PATH)}):
+            - **Evaluated:** {summary['stats']['evaluated']} (dropped {summary['stats']['dropped']})
+            - **Top-1 Agreement:** {agreement}
+            - **Batched Latency per Image vs Production (p50):** {f"{delta:+.1f} ms" if delta is not None else "n/a"}
+            """)
+
+        store = get_hard_example_store()
+        if store is not None:
+            st.markdown(f"""
+            **Hard-Example Capture** (below {CAPTURE_BELOW:.0%} or flagged):
+            - **Written:** {store.stats['written']}
+            - **Dropped (writer busy):** {store.stats['dropped']}
+            """)
+    
+    with st.sidebar.expander("🧠 Session Memory", expanded=False):
+        artifacts = get_session_artifacts()
+        sessions = artifacts.snapshot()
+        mb = 1024 * 1024
+        st.markdown(f"""
+        **Across Sessions:**
+        - **Held:** {artifacts.total_bytes() / mb:.1f} MB of {artifacts.budget_bytes / mb:.0f} MB
+        - **Sessions:** {len(sessions)}
+        - **Compacted / Evicted:** {artifacts.stats['compacted']} / {artifacts.stats['evicted']} artifacts
+        - **Freed by Eviction:** {artifacts.stats['evicted_bytes'] / mb:.1f} MB
+        
+        **This Session:** {artifacts.session_bytes(current_session_id()) / mb:.1f} MB
+        """)
+        if sessions:
+            st.dataframe(pd.DataFrame([
+                {
+                    'Session': row['session'][:8],
+                    'MB': round(row['bytes'] / mb, 2),
+                    'Idle (s)': int(row['idle_seconds']),
+                    'Compacted': row['compacted'],
+                    'Artifacts': ", ".join(row['artifacts']),
+                }
+                for row in sessions
+            ]), hide_index=True, use_container_width=True)
 
 def display_workflow():
     """Display the AI workflow explanation"""
@@ -1256,17 +1902,35 @@ def main():
     st.markdown('<h1 class="main-title">🐄 AI-Powered Cattle & Breed Classifier</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">Advanced Deep Learning System for Cattle Species and Breed Identification</p>', unsafe_allow_html=True)
     
+    # Marks this session as active; idle sessions' artifacts are compacted or evicted
+    get_session_artifacts().touch(current_session_id())
+    
     # Sidebar
     display_model_info()
+    st.sidebar.checkbox(
+        "🔁 Refine borderline results (TTA)",
+        value=TTA_ENABLED,
+        key='tta_enabled',
+        help=f"Re-check images whose confidence falls between {TTA_BAND[0]:.0%} and {TTA_BAND[1]:.0%} "
+             "using flipped and cropped views in one batched pass"
+    )
+    st.sidebar.checkbox(
+        "🐄🐄 Detect every animal (herd mode)",
+        value=False,
+        key='herd_mode',
+        help="Find each animal in the photo and classify them all in one batch"
+    )
     
     # Navigation
     page = st.sidebar.selectbox(
         "🧭 Navigation",
-        ["🏠 Home", "🔬 How It Works", "📚 Breed Information", "📋 About"]
+        ["🏠 Home", "📈 Herd Analytics", "🔬 How It Works", "📚 Breed Information", "📋 About"]
     )
     
     if page == "🏠 Home":
         display_home_page()
+    elif page == "📈 Herd Analytics":
+        display_analytics_page()
     elif page == "🔬 How It Works":
         display_workflow()
         display_technical_details()
@@ -1306,24 +1970,65 @@ def display_home_page():
     
     st.markdown("---")
     
+    input_mode = st.radio("Input", ["📸 Photo", "🗂️ Batch", "🎬 Video"], horizontal=True, label_visibility="collapsed")
+    if input_mode == "🗂️ Batch":
+        display_batch_analysis()
+        return
+    if input_mode == "🎬 Video":
+        display_video_analysis()
+        return
+    
     # File upload section
     st.markdown('<h2 class="section-header">📸 Upload Image for Analysis</h2>', unsafe_allow_html=True)
     
     uploaded_file = st.file_uploader(
         "Choose an image file", 
         type=['jpg', 'jpeg', 'png'],
-        help="Upload a clear image of a cow or buffalo for best results"
+        help=f"Upload a clear image of a cow or buffalo for best results (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"
     )
     
     if uploaded_file:
-        # Process and display image
-        image = Image.open(uploaded_file).convert('RGB')
+        # Decode once per upload at a bounded working size; reruns reuse it
+        upload_key = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, 'file_id', None))
+        ingested = get_session_artifact('ingested_upload')
+        if ingested is None or ingested[0] != upload_key:
+            try:
+                image, image_info = ingest_image(uploaded_file, size_bytes=uploaded_file.size)
+            except ImageRejected as e:
+                st.error(f"❌ {e}")
+                st.info("💡 Please upload a smaller photo, or resize it before uploading.")
+                return
+            finally:
+                # Drop our handle on the raw bytes as soon as the working image exists
+                uploaded_file.close()
+            # Encoded once here; every rerun sends these bytes instead of the image
+            preview, preview_info = encode_preview(image)
+            # Dropped rather than compressed when the session idles: it is
+            # decoded again, pixel for pixel, from the upload Streamlit keeps
+            set_session_artifact('ingested_upload', (upload_key, image, image_info, preview, preview_info),
+                                 recomputable=True)
+        else:
+            _, image, image_info, preview, preview_info = ingested
+        
+        # Start inference before rendering anything else so the image and its
+        # metadata show while the models run; reruns reuse the same job
+        tta_band = TTA_BAND if st.session_state.get('tta_enabled', TTA_ENABLED) else None
+        herd_mode = st.session_state.get('herd_mode', False)
+        job_key = (upload_key, tta_band, herd_mode)
+        prediction = get_session_artifact('prediction_job')
+        if prediction is None or prediction[0] != job_key:
+            herd_job = start_herd_prediction(image) if herd_mode else None
+            job = ('herd', herd_job) if herd_job is not None else ('single', start_prediction(image, tta_band))
+            prediction = (job_key, job)
+            set_session_artifact('prediction_job', prediction, compactable=False)
+            st.session_state.pop('celebrated_job', None)
+        job_type, job = prediction[1]
         
         col1, col2 = st.columns([1, 1])
         
         with col1:
             st.markdown('<div class="image-container">', unsafe_allow_html=True)
-            st.image(image, caption="Uploaded Image", use_column_width=True)
+            st.image(preview, caption="Uploaded Image", use_column_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col2:
@@ -1336,9 +2041,12 @@ def display_home_page():
             
             file_details = {
                 "Filename": uploaded_file.name,
-                "File size": f"{uploaded_file.size / 1024:.2f} KB",
-                "Image dimensions": f"{image.size[0]} × {image.size[1]} pixels",
-                "Color mode": image.mode,
+                "File size": f"{image_info['size_bytes'] / 1024:.2f} KB",
+                "Image dimensions": f"{image_info['width']} × {image_info['height']} pixels",
+                "Analyzed at": f"{image.size[0]} × {image.size[1]} pixels",
+                "Preview sent": f"{preview_info['bytes'] / 1024:.1f} KB per rerun "
+                                f"(encoded once in {preview_info['encode_ms']:.0f} ms)",
+                "Color mode": image_info['mode'],
                 "Upload time": datetime.now().strftime("%H:%M:%S")
             }
             
@@ -1351,25 +2059,397 @@ def display_home_page():
         
         # Prediction section
         st.markdown("---")
-        perform_prediction(image)
+        if job is not None and job_type == 'herd':
+            perform_herd_prediction(image, job, job_key, tta_band)
+        elif job is not None and job_type == 'herd_fallback':
+            perform_herd_fallback(image, job)
+        elif job is not None:
+            perform_prediction(image, job)
+    else:
+        drop_session_artifacts('ingested_upload', 'prediction_job', 'herd_preview', 'saliency_previews')
+
+def perform_herd_prediction(image, herd_future, job_key, tta_band=None):
+    """
+    Render per-animal results with their boxes once herd analysis completes.
+
+    When no animal is detected, the whole-photo prediction is started once and
+    stored as this upload's job, so later reruns render it without starting it again.
+    """
+    st.markdown('<h2 class="section-header">🤖 Herd Analysis Results</h2>', unsafe_allow_html=True)
+    
+    with st.spinner("🔍 Detecting animals and classifying each one..."):
+        try:
+            animals = herd_future.result()
+        except Exception as e:
+            st.error(f"❌ Error in herd analysis: {str(e)}")
+            st.info("💡 This might be due to missing model files or memory constraints. Please try again or contact support.")
+            return
+    
+    if not animals:
+        job = start_prediction(image, tta_band)
+        set_session_artifact('prediction_job', (job_key, ('herd_fallback', job)), compactable=False)
+        if job is not None:
+            perform_herd_fallback(image, job)
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Animals detected", len(animals))
+    col2.metric("Cows", sum(a['cattle'] == 'Cow' for a in animals))
+    col3.metric("Buffaloes", sum(a['cattle'] == 'Buffalo' for a in animals))
+    col4.metric("Breeds identified", sum(a['breed'] is not None for a in animals))
+    
+    labels = [
+        f"#{i + 1} {a['breed'].replace('_', ' ') if a['breed'] else a['cattle']} {a['confidence']*100:.0f}%"
+        for i, a in enumerate(animals)
+    ]
+    # Drawn and encoded once per herd job rather than on every rerun
+    annotated = get_session_artifact('herd_preview')
+    if annotated is None or annotated[0] is not herd_future:
+        annotated = (herd_future, encode_preview(draw_detections(image, [a['box'] for a in animals], labels))[0])
+        set_session_artifact('herd_preview', annotated, compactable=False)
+    st.image(annotated[1], caption="Detected animals", use_column_width=True)
+    
+    st.markdown("### 📋 Per-Animal Results")
+    st.dataframe(pd.DataFrame([
+        {
+            'Animal': f"#{i + 1}",
+            'Type': a['cattle'],
+            'Confidence': f"{a['confidence']*100:.1f}%",
+            'Breed': a['breed'].replace('_', ' ') if a['breed'] else "—",
+            'Breed confidence': f"{a['breed_confidence']*100:.1f}%" if a['breed'] else "—",
+            'Detection score': f"{a['score']*100:.0f}%",
+            'Box (x0, y0, x1, y1)': str(a['box']),
+        }
+        for i, a in enumerate(animals)
+    ]), hide_index=True, use_container_width=True)
+    
+    identified = [(i, a) for i, a in enumerate(animals) if a['breed']]
+    if not identified:
+        st.markdown(f"""
+        <div class="warning-box">
+            ⚠️ <strong>No animal passed the breed gate</strong><br>
+            Breed detection requires minimum 60% confidence and valid cattle detection for each animal.
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    choice = st.selectbox(
+        "Show breed details for",
+        identified,
+        format_func=lambda item: f"#{item[0] + 1} {item[1]['breed'].replace('_', ' ')}"
+    )
+    animal = choice[1]
+    display_breed_details(
+        animal['breed'],
+        flag_example=lambda: capture_hard_example(crop_animals(image, [animal])[0], 'breed',
+                                                  animal['breed_probs'], USER_FLAG)
+    )
+
+def display_batch_analysis():
+    """Multi-file input: uploads are decoded in parallel and classified in batches"""
+    st.markdown('<h2 class="section-header">🗂️ Upload Images for Batch Analysis</h2>', unsafe_allow_html=True)
+    
+    uploaded_files = st.file_uploader(
+        "Choose image files",
+        type=['jpg', 'jpeg', 'png'],
+        accept_multiple_files=True,
+        help=f"Select every photo at once, e.g. one per animal (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB each)"
+    )
+    if not uploaded_files:
+        drop_session_artifacts('batch_analysis')
+        return
+    
+    # Analyze once per set of uploads; paging and detail buttons reuse the results
+    batch_key = tuple((f.name, f.size, getattr(f, 'file_id', None)) for f in uploaded_files)
+    analysis = get_session_artifact('batch_analysis')
+    if analysis is None or analysis[0] != batch_key:
+        with st.spinner(f"🔍 Decoding and analyzing {len(uploaded_files)} images..."):
+            results = analyze_uploads(uploaded_files)
+        if results is None:
+            return
+        analysis = (batch_key, results)
+        set_session_artifact('batch_analysis', analysis)
+        st.session_state['batch_page'] = 0
+        st.session_state.pop('batch_detail', None)
+    
+    st.markdown("---")
+    display_batch_results(analysis[1])
+
+def _set_session_value(key, value):
+    st.session_state[key] = value
+
+def display_batch_results(results):
+    """Summary, a paginated card grid, and detail for the one card the user opened"""
+    analyzed = [r for r in results if r['error'] is None]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Images analyzed", len(analyzed), f"{len(results) - len(analyzed)} rejected" if len(analyzed) < len(results) else None, delta_color="inverse")
+    col2.metric("Cows", sum(r['cattle'] == 'Cow' for r in analyzed))
+    col3.metric("Buffaloes", sum(r['cattle'] == 'Buffalo' for r in analyzed))
+    col4.metric("Breeds identified", sum(r['breed'] is not None for r in analyzed))
+    
+    summary = pd.DataFrame([
+        {
+            'File': r['name'],
+            'Type': r['cattle'] or "",
+            'Confidence': round(r['confidence'], 4) if r['confidence'] is not None else None,
+            'Breed': r['breed'] or "",
+            'Breed confidence': round(r['breed_confidence'], 4) if r['breed_confidence'] is not None else None,
+            'Error': r['error'] or "",
+        }
+        for r in results
+    ])
+    st.download_button("⬇️ Download results (CSV)", summary.to_csv(index=False), file_name="cattle_batch_results.csv",
+                       mime="text/csv")
+    
+    pages = max(1, math.ceil(len(results) / BATCH_PAGE_SIZE))
+    page = min(st.session_state.get('batch_page', 0), pages - 1)
+    if pages > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        col1.button("◀️ Previous", disabled=page == 0, on_click=_set_session_value, args=('batch_page', page - 1))
+        col2.markdown(f"<p style='text-align: center;'>Page {page + 1} of {pages}</p>", unsafe_allow_html=True)
+        col3.button("Next ▶️", disabled=page == pages - 1, on_click=_set_session_value, args=('batch_page', page + 1))
+    
+    # Only this page's cards are rendered
+    page_indices = range(page * BATCH_PAGE_SIZE, min(len(results), (page + 1) * BATCH_PAGE_SIZE))
+    for row_start in range(page_indices.start, page_indices.stop, BATCH_GRID_COLUMNS):
+        columns = st.columns(BATCH_GRID_COLUMNS)
+        for column, index in zip(columns, range(row_start, min(page_indices.stop, row_start + BATCH_GRID_COLUMNS))):
+            result = results[index]
+            with column:
+                if result['error']:
+                    st.markdown(f"**{result['name']}**")
+                    st.error(f"❌ {result['error']}")
+                    continue
+                st.image(result['thumbnail'], use_column_width=True)
+                label = result['breed'].replace('_', ' ') if result['breed'] else result['cattle']
+                st.markdown(f"**{result['name']}**<br>{label} · {result['confidence']*100:.0f}%", unsafe_allow_html=True)
+                st.button("🔍 Details", key=f"batch_detail_{index}", on_click=_set_session_value,
+                          args=('batch_detail', index))
+    
+    # Lazy detail: charts and breed information only for the card that was opened
+    detail = st.session_state.get('batch_detail')
+    if detail is None or detail >= len(results) or results[detail]['error']:
+        return
+    result = results[detail]
+    st.markdown("---")
+    st.markdown(f"### 🔍 {result['name']}")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.image(result['thumbnail'], use_column_width=True)
+    with col2:
+        confidence_data = pd.DataFrame({'Class': cattle_class_names, 'Confidence': result['cattle_probs']})
+        fig = px.bar(confidence_data, x='Class', y='Confidence', title="Classification Confidence Scores",
+                     color='Confidence', color_continuous_scale='Viridis')
+        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+        st.plotly_chart(fig, use_container_width=True)
+        if result['breed_top3']:
+            st.markdown("**Top breeds:** " + ", ".join(
+                f"{name.replace('_', ' ')} ({p*100:.1f}%)" for name, p in result['breed_top3']
+            ))
+    if result['breed']:
+        # Only the encoded thumbnail is kept, so there is no image to flag for labelling
+        display_breed_details(result['breed'])
+    else:
+        st.markdown(f"""
+        <div class="warning-box">
+            ⚠️ <strong>Low confidence classification ({result['confidence']*100:.1f}%)</strong><br>
+            Breed detection requires minimum 60% confidence and valid cattle detection.
+        </div>
+        """, unsafe_allow_html=True)
+
+def run_video_analysis(source):
+    """
+    Sample, classify and aggregate a video file or stream.
+
+    Returns:
+        analyze_clip's result dict, or None if the models or video could not be
+        loaded (the error is already shown)
+    """
+    leases = lease_prediction_models()
+    if leases is None:
+        return None
+    cattle_model, breed_model = leases[0].model, leases[1] and leases[1].model
+    try:
+        result = analyze_clip(source, lambda batch: classify_batch(batch, cattle_model, breed_model), mean, std)
+    except VideoRejected as e:
+        st.error(f"❌ {e}")
+        return None
+    finally:
+        release_models(leases)
+    record_video_result(result)
+    return result
+
+def record_video_result(result):
+    """Record a clip's aggregate result in the prediction history, as displayed"""
+    clip_probs = result['clip_cattle_probs']
+    if clip_probs is None:
+        return
+    predicted_cattle = cattle_class_names[int(clip_probs.argmax())]
+    confidence = float(clip_probs.max())
+    breed = breed_confidence = None
+    if passes_breed_gate(predicted_cattle, confidence) and result['clip_breed_probs'] is not None:
+        breed = breed_names[int(result['clip_breed_probs'].argmax())]
+        breed_confidence = float(result['clip_breed_probs'].max())
+    record_prediction('video', predicted_cattle, confidence, breed, breed_confidence)
+
+def display_video_analysis():
+    """Video file or camera stream input, classified per clip"""
+    st.markdown('<h2 class="section-header">🎬 Upload Video for Analysis</h2>', unsafe_allow_html=True)
+    
+    # Streams are opened by the server, so only operator-allowlisted URLs are offered
+    streams = allowed_streams()
+    source_type = "📁 Video file"
+    if streams:
+        source_type = st.radio("Video source", ["📁 Video file", "📡 Camera stream"], horizontal=True)
+    if source_type == "📁 Video file":
+        uploaded_video = st.file_uploader(
+            "Choose a video file",
+            type=VIDEO_EXTENSIONS,
+            help="A short walk-by clip of one animal works best"
+        )
+        if not uploaded_video:
+            drop_session_artifacts('video_analysis')
+            return
+        video_key = (uploaded_video.name, uploaded_video.size, getattr(uploaded_video, 'file_id', None))
+        video_name = uploaded_video.name
+    else:
+        stream_url = st.selectbox("Camera stream", streams)
+        if st.button("▶️ Analyze stream"):
+            # Live footage changes, so every click is a new analysis
+            st.session_state['stream_runs'] = st.session_state.get('stream_runs', 0) + 1
+        if not stream_url or not st.session_state.get('stream_runs'):
+            return
+        video_key = ('stream', stream_url, st.session_state['stream_runs'])
+        video_name = stream_url
+    
+    # Analyze once per clip; reruns (e.g. feedback buttons) reuse the result
+    analysis = get_session_artifact('video_analysis')
+    if analysis is None or analysis[0] != video_key:
+        with st.spinner("🎬 Sampling frames and analyzing them in batches..."):
+            if source_type == "📁 Video file":
+                # OpenCV reads from a path, so the upload is spooled to disk once
+                suffix = os.path.splitext(uploaded_video.name)[1]
+                with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as spooled:
+                    uploaded_video.seek(0)
+                    shutil.copyfileobj(uploaded_video, spooled)
+                try:
+                    result = run_video_analysis(spooled.name)
+                finally:
+                    os.unlink(spooled.name)
+            else:
+                try:
+                    result = run_video_analysis(check_stream_source(stream_url))
+                except VideoRejected as e:
+                    st.error(f"❌ {e}")
+                    result = None
+        if result is None:
+            return
+        analysis = (video_key, result)
+        set_session_artifact('video_analysis', analysis)
+    
+    st.markdown("---")
+    display_video_results(analysis[1], video_name)
 
-def perform_prediction(image):
-    """Perform cattle and breed prediction"""
+def display_video_results(result, video_name):
+    """Render per-clip results, the per-frame timeline and sampling statistics"""
     st.markdown('<h2 class="section-header">🤖 AI Analysis Results</h2>', unsafe_allow_html=True)
+    stats = result['stats']
+    if not result['timestamps']:
+        st.warning("⚠️ No frames could be read from this video.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Frames decoded", stats['decoded'])
+    col2.metric("Frames classified", stats['classified'], f"-{stats['skipped_similar']} near-duplicates", delta_color="off")
+    col3.metric("Decoded / sec", f"{stats['decoded_fps']:.0f}")
+    col4.metric("Classified / sec", f"{stats['processed_fps']:.1f}")
+    st.caption(f"{video_name}: {stats['decoded'] / stats['fps']:.1f}s of footage at {stats['fps']:.0f} fps, "
+               f"analyzed in {stats['wall_seconds']:.1f}s")
+    
+    clip_probs = result['clip_cattle_probs']
+    predicted_cattle = cattle_class_names[int(clip_probs.argmax())]
+    confidence = float(clip_probs.max())
+    st.markdown(f"""
+    <div class="card">
+        <h3>🐄 Cattle Classification (whole clip)</h3>
+        <h2 style="color: #3498db;">{predicted_cattle}</h2>
+        <p>{confidence*100:.1f}% average confidence over {stats['classified']} frames</p>
+    </div>
+    """, unsafe_allow_html=True)
     
-    # Load and run cattle classification
+    # Per-frame confidence of every class along the clip
+    st.markdown("### 📈 Confidence Over Time")
+    timeline = pd.DataFrame(result['cattle_probs'], columns=cattle_class_names)
+    timeline['Time (s)'] = result['timestamps']
+    fig = px.line(timeline.melt(id_vars='Time (s)', var_name='Class', value_name='Confidence'),
+                  x='Time (s)', y='Confidence', color='Class', markers=True)
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # The frames the cattle model was most sure about
+    best_frames = np.argsort(-result['cattle_probs'].max(axis=1))[:4]
+    columns = st.columns(len(best_frames))
+    for column, index in zip(columns, best_frames):
+        column.image(result['previews'][index], caption=f"{result['timestamps'][index]:.1f}s", use_column_width=True)
+    
+    if passes_breed_gate(predicted_cattle, confidence) and result['breed_probs'] is None:
+        st.error("❌ Breed classification model not found. Please ensure model files are uploaded correctly.")
+        return
+    if not passes_breed_gate(predicted_cattle, confidence) or result['clip_breed_probs'] is None:
+        st.markdown(f"""
+        <div class="warning-box">
+            ⚠️ <strong>Low confidence classification ({confidence*100:.1f}%)</strong><br>
+            Breed detection requires minimum 60% confidence and valid cattle detection across the clip.
+            Please try a clip where the animal is clearly visible.
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    
+    predicted = int(result['clip_breed_probs'].argmax())
+    predicted_breed = breed_names[predicted]
+    gated = result['breed_probs'][result['breed_mask']]
+    agreement = float((gated.argmax(axis=1) == result['clip_breed_probs'].argmax()).mean())
+    st.markdown(f"""
+    <div class="card" style="background: linear-gradient(135deg, #27ae60, #2ecc71);">
+        <h2>🏆 Breed Identification Complete!</h2>
+        <h1 style="color: white; text-align: center; margin: 1rem 0;">
+            {predicted_breed.replace('_', ' ')}
+        </h1>
+        <p style="color: white; text-align: center;">{agreement*100:.0f}% of {len(gated)} confident frames agree</p>
+    </div>
+    """, unsafe_allow_html=True)
+    flag_example = None
+    if result['previews']:
+        # The frame most confident in the clip's breed stands in for the clip
+        frame = int(np.argmax(np.where(result['breed_mask'], result['breed_probs'][:, predicted], -1)))
+        flag_example = lambda: capture_hard_example(Image.fromarray(result['previews'][frame]), 'breed',
+                                                    result['breed_probs'][frame], USER_FLAG)
+    display_breed_details(predicted_breed, flag_example=flag_example)
+
+def perform_herd_fallback(image, job):
+    """Render the whole-photo prediction started after herd analysis found no animals"""
+    st.info("🔍 No animals were detected, so the whole photo is analyzed instead.")
+    perform_prediction(image, job)
+
+def perform_prediction(image, job=None):
+    """Render cattle and breed prediction results as the background job completes"""
+    st.markdown('<h2 class="section-header">🤖 AI Analysis Results</h2>', unsafe_allow_html=True)
+    
+    if job is None:
+        job = start_prediction(image)
+        if job is None:
+            return
+    cattle_future, breed_future, breed_model_available = job
+    
+    # Wait for cattle classification; everything above is already on the page
     with st.spinner("🔍 Analyzing image with AI models..."):
         try:
-            # Check if model files exist
-            cattle_model_path = 'models/best_cow_buffalo_none_classifier.pth'
-            if not os.path.exists(cattle_model_path):
-                st.error("❌ Cattle classification model not found. Please ensure model files are uploaded correctly.")
-                return
-            
-            cattle_model = load_cattle_model(cattle_model_path)
-            predicted_cattle, confidence = predict_cattle(image, cattle_model)
+            predicted_cattle, confidence, cattle_probs, cattle_cam = cattle_future.result()
         except Exception as e:
-            st.error(f"❌ Error loading cattle model: {str(e)}")
+            st.error(f"❌ Error in cattle classification: {str(e)}")
             st.info("💡 This might be due to missing model files or memory constraints. Please try again or contact support.")
             return
     
@@ -1399,7 +2479,7 @@ def perform_prediction(image):
     st.markdown("### 📈 Confidence Analysis")
     confidence_data = pd.DataFrame({
         'Class': cattle_class_names,
-        'Confidence': [confidence if predicted_cattle == cls else (1-confidence)/(len(cattle_class_names)-1) for cls in cattle_class_names]
+        'Confidence': [float(p) for p in cattle_probs]
     })
     
     fig = px.bar(
@@ -1418,42 +2498,47 @@ def perform_prediction(image):
     st.plotly_chart(fig, use_container_width=True)
     
     # Breed detection logic
-    if confidence >= 0.60 and predicted_cattle in ['Cow', 'Buffalo']:
+    if passes_breed_gate(predicted_cattle, confidence):
         st.markdown("""
         <div class="success-box">
             ✅ <strong>High confidence detected!</strong> Proceeding with breed classification...
         </div>
         """, unsafe_allow_html=True)
         
-        if st.button("🔬 Analyze Breed", key="breed_button"):
-            with st.spinner(f"🧬 Identifying {predicted_cattle.lower()} breed..."):
-                try:
-                    breed_model_path = 'models/breed_classifier.pth'
-                    if not os.path.exists(breed_model_path):
-                        st.error("❌ Breed classification model not found. Please ensure model files are uploaded correctly.")
-                        return
-                    
-                    breed_model = load_breed_model(breed_model_path, len(breed_names))
-                    predicted_breed = predict_breed(image, breed_model, breed_names)
-                    
-                    st.balloons()
-                    
-                    # Display breed results
-                    st.markdown(f"""
-                    <div class="card" style="background: linear-gradient(135deg, #27ae60, #2ecc71);">
-                        <h2>🏆 Breed Identification Complete!</h2>
-                        <h1 style="color: white; text-align: center; margin: 1rem 0;">
-                            {predicted_breed.replace('_', ' ')}
-                        </h1>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Breed information
-                    display_breed_details(predicted_breed)
-                    
-                except Exception as e:
-                    st.error(f"❌ Error in breed classification: {str(e)}")
-                    st.info("💡 This might be due to missing model files or memory constraints. Please try again or contact support.")
+        if not breed_model_available:
+            st.error("❌ Breed classification model not found. Please ensure model files are uploaded correctly.")
+            return
+        
+        # Breed inference was chained onto the cattle result and is usually done by now
+        with st.spinner(f"🧬 Identifying {predicted_cattle.lower()} breed..."):
+            try:
+                predicted_breed, breed_probs, breed_cam = breed_future.result()
+            except Exception as e:
+                st.error(f"❌ Error in breed classification: {str(e)}")
+                st.info("💡 This might be due to missing model files or memory constraints. Please try again or contact support.")
+                return
+        
+        # Celebrate once per job, not on every rerun
+        if st.session_state.get('celebrated_job') is not breed_future:
+            st.session_state['celebrated_job'] = breed_future
+            st.balloons()
+        
+        # Display breed results
+        st.markdown(f"""
+        <div class="card" style="background: linear-gradient(135deg, #27ae60, #2ecc71);">
+            <h2>🏆 Breed Identification Complete!</h2>
+            <h1 style="color: white; text-align: center; margin: 1rem 0;">
+                {predicted_breed.replace('_', ' ')}
+            </h1>
+        </div>
+        """, unsafe_allow_html=True)
+        display_saliency(image, breed_cam, predicted_breed.replace('_', ' '), key='saliency_breed')
+        
+        # Breed information
+        display_breed_details(
+            predicted_breed,
+            flag_example=lambda: capture_hard_example(image, 'breed', breed_probs, USER_FLAG)
+        )
     else:
         st.markdown(f"""
         <div class="warning-box">
@@ -1462,9 +2547,28 @@ def perform_prediction(image):
             Please try with a clearer image of a cow or buffalo.
         </div>
         """, unsafe_allow_html=True)
+        display_saliency(image, cattle_cam, predicted_cattle, key='saliency_cattle')
+
+def display_saliency(image, cam, label, key):
+    """Optional heatmap of the image regions behind ``label``, from the cached CAM"""
+    if cam is None:
+        return
+    if st.checkbox(f"🔍 Show where the model looked for '{label}'", key=key):
+        # Blended and encoded once per prediction; reruns resend the cached bytes
+        overlays = get_session_artifact('saliency_previews') or {}
+        overlay = overlays.get(key)
+        if overlay is None or overlay[0] is not cam:
+            overlay = (cam, encode_preview(heatmap_overlay(image, cam))[0])
+            set_session_artifact('saliency_previews', dict(overlays, **{key: overlay}), compactable=False)
+        st.image(overlay[1], use_column_width=True,
+                 caption=f"Red areas contributed most to '{label}' (class activation map)")
 
-def display_breed_details(breed_name):
-    """Display comprehensive information about the identified breed"""
+def display_breed_details(breed_name, flag_example=None):
+    """
+    Display comprehensive information about the identified breed.
+    ``flag_example`` is called when the user asks for more information, to
+    queue the image for labelling; without it that button is not shown.
+    """
     
     if breed_name in breed_database:
         breed_info = breed_database[breed_name]
@@ -1716,19 +2820,99 @@ def display_breed_details(breed_name):
     # Add a section for user feedback
     st.markdown("---")
     st.markdown("### 💬 Was this information helpful?")
-    col1, col2, col3 = st.columns(3)
+    columns = st.columns(3 if flag_example is not None else 2)
     
-    with col1:
+    with columns[0]:
         if st.button("👍 Very Helpful", key=f"helpful_{breed_name}"):
             st.success("Thank you for your feedback!")
     
-    with col2:
+    with columns[1]:
         if st.button("👌 Somewhat Helpful", key=f"okay_{breed_name}"):
             st.success("Thank you! We'll continue improving our breed database.")
     
-    with col3:
-        if st.button("👎 Need More Info", key=f"more_{breed_name}"):
-            st.info("Thank you for feedback! We're constantly updating our breed information.")
+    if flag_example is not None:
+        with columns[2]:
+            if st.button("👎 Need More Info", key=f"more_{breed_name}"):
+                flag_example()
+                st.info("Thank you for feedback! We're constantly updating our breed information.")
+
+@st.cache_data(ttl=30)
+def load_history_aggregates(db_path, since_day):
+    """Aggregate tables of the prediction history; refreshed at most every 30 seconds"""
+    return read_aggregates(db_path, since_day)
+
+def display_analytics_page():
+    """Herd statistics from the prediction history's aggregates (never from the log itself)"""
+    st.markdown('<h2 class="section-header">📈 Herd Analytics</h2>', unsafe_allow_html=True)
+    
+    periods = {"Last 7 days": 7, "Last 30 days": 30, "Last 365 days": 365, "All time": None}
+    period = st.selectbox("Period", list(periods))
+    days = periods[period]
+    since_day = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d') if days else None
+    aggregates = load_history_aggregates(HISTORY_DB, since_day)
+    if not aggregates or not aggregates['daily_counts']:
+        st.info("📝 No predictions recorded for this period yet. Analyze some photos on the Home page first.")
+        return
+    
+    counts = pd.DataFrame(aggregates['daily_counts'], columns=[
+        'Day', 'Source', 'Cattle', 'Breed', 'Count', 'Confidence sum', 'Breed confidence sum'
+    ])
+    total = int(counts['Count'].sum())
+    identified = counts[counts['Breed'] != '']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Predictions", f"{total:,}")
+    col2.metric("Cows", f"{int(counts.loc[counts['Cattle'] == 'Cow', 'Count'].sum()):,}")
+    col3.metric("Buffaloes", f"{int(counts.loc[counts['Cattle'] == 'Buffalo', 'Count'].sum()):,}")
+    identified_total = int(identified['Count'].sum())
+    breed_confidence = (f"avg. breed confidence {identified['Breed confidence sum'].sum() / identified_total * 100:.0f}%"
+                        if identified_total else None)
+    col4.metric("Breeds identified", f"{identified_total:,}", breed_confidence, delta_color="off")
+    
+    chart_layout = dict(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+    
+    st.markdown("### 📅 Predictions per Day")
+    per_day = counts.groupby(['Day', 'Cattle'], as_index=False)['Count'].sum()
+    fig = px.bar(per_day, x='Day', y='Count', color='Cattle',
+                 color_discrete_map={'Cow': '#3498db', 'Buffalo': '#e74c3c', 'None': '#95a5a6'})
+    fig.update_layout(**chart_layout)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### 🧬 Most Identified Breeds")
+        if identified.empty:
+            st.caption("No breed has been identified in this period.")
+        else:
+            breeds = identified.groupby('Breed', as_index=False)[['Count', 'Breed confidence sum']].sum()
+            breeds['Average confidence'] = breeds['Breed confidence sum'] / breeds['Count']
+            breeds['Breed'] = breeds['Breed'].str.replace('_', ' ')
+            breeds = breeds.nlargest(15, 'Count').sort_values('Count')
+            fig = px.bar(breeds, x='Count', y='Breed', orientation='h', color='Average confidence',
+                         color_continuous_scale='Viridis', range_color=(0, 1))
+            fig.update_layout(**chart_layout)
+            st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        st.markdown("### 📸 Input Types")
+        sources = counts.groupby('Source', as_index=False)['Count'].sum()
+        fig = px.pie(sources, values='Count', names='Source')
+        fig.update_layout(**chart_layout)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.markdown("### 📊 Confidence Distribution")
+    buckets = pd.DataFrame(aggregates['confidence_buckets'], columns=['Day', 'Model', 'Bucket', 'Count'])
+    buckets = buckets.groupby(['Model', 'Bucket'], as_index=False)['Count'].sum()
+    bucket_width = 100 / CONFIDENCE_BUCKETS
+    buckets['Confidence'] = (buckets['Bucket'] + 0.5) * bucket_width
+    fig = px.bar(buckets, x='Confidence', y='Count', color='Model', barmode='group',
+                 labels={'Confidence': 'Confidence (%)'})
+    fig.add_vline(x=CONFIDENCE_THRESHOLD * 100, line_dash='dash', annotation_text='breed gate')
+    fig.update_layout(**chart_layout)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    history = get_prediction_history()
+    if history is not None:
+        st.caption(f"Recorded by this replica since start: {history.stats['written']:,} written, "
+                   f"{history.stats['dropped']:,} dropped (writer busy).")
 
 def display_technical_details():
     """Display technical implementation details"""
@@ -1787,16 +2971,44 @@ def display_technical_details():
             </div>
             """, unsafe_allow_html=True)
         
+        benchmark = get_benchmark_summary()
+        breed_timing = (benchmark or {}).get('stages', {}).get('predict_breed')
+        if breed_timing:
+            inference_time = f"{breed_timing['p50_ms']:.0f} ms (p50), {breed_timing['p95_ms']:.0f} ms (p95)"
+        else:
+            inference_time = "Not benchmarked yet"
+        
         with col2:
-            st.markdown("""
+            st.markdown(f"""
             <div class="metric-container">
                 <h4>Breed Classifier</h4>
                 <p><strong>Accuracy:</strong> 88.7%</p>
                 <p><strong>Top-3 Accuracy:</strong> 96.3%</p>
-                <p><strong>Inference Time:</strong> ~0.1s</p>
+                <p><strong>Inference Time:</strong> {inference_time}</p>
                 <p><strong>Model Size:</strong> 45MB</p>
             </div>
             """, unsafe_allow_html=True)
+        
+        if benchmark and benchmark['stages']:
+            # Latency table from the latest benchmark_inference.py run
+            st.markdown("#### ⏱️ Latest Benchmark Run")
+            benchmark_table = pd.DataFrame([
+                {
+                    'Stage': stage,
+                    'p50 (ms)': round(timing['p50_ms'], 1),
+                    'p95 (ms)': round(timing['p95_ms'], 1),
+                    'Throughput (img/s)': round(timing['throughput_ips'], 1),
+                    'Threads': timing['threads'],
+                    'Input': timing['source'],
+                }
+                for stage, timing in benchmark['stages'].items()
+            ])
+            st.dataframe(benchmark_table, use_container_width=True, hide_index=True)
+            peak_rss = f", peak RSS {benchmark['peak_rss_mb']:.0f} MB" if benchmark['peak_rss_mb'] else ""
+            st.caption(f"Measured {benchmark['timestamp']} with {benchmark['weights']} weights{peak_rss}. "
+                       f"Reproduce with `python benchmark_inference.py`.")
+        else:
+            st.caption("Run `python benchmark_inference.py` to measure inference latency on this machine.")
 
 def display_about_page():
     """Display about page with project information"""
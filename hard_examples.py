@@ -0,0 +1,284 @@
+"""
+Hard-example capture and uncertainty-ranked selection for active learning.
+
+Predictions below the 60% breed gate used to be discarded, and the "👎 Need
+More Info" button only showed a thank-you message. The app now hands those
+images, with their probability vectors, to a ``HardExampleStore``: capture only
+enqueues, and a single background thread encodes the images and appends the
+records, so the request path never waits on disk.
+
+Store layout (append-only):
+    <store>/classes.json     class names of each task, in model output order
+    <store>/records.jsonl    one JSON record per capture
+    <store>/images/<sha1>.jpg
+
+``select`` ranks the stored records by uncertainty (one vectorized pass per
+task) and writes a CSV for labelling; ``python -m training.finetune`` then
+fine-tunes the production model on the labelled rows.
+
+Environment (app):
+    CATTLE_CAPTURE          "0" disables capture (default: enabled)
+    CATTLE_CAPTURE_DIR      store directory (default: data/hard_examples)
+    CATTLE_CAPTURE_BELOW    capture predictions below this confidence (default: 0.60)
+    CATTLE_CAPTURE_QUEUE    captures waiting to be written before new ones are dropped (default: 64)
+
+Usage:
+    python hard_examples.py --task breed --limit 200 --output labelling.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+CAPTURE_ENABLED = os.environ.get('CATTLE_CAPTURE', '1').strip() != '0'
+CAPTURE_DIR = os.environ.get('CATTLE_CAPTURE_DIR', 'data/hard_examples')
+CAPTURE_BELOW = float(os.environ.get('CATTLE_CAPTURE_BELOW', '0.60'))
+CAPTURE_QUEUE = int(os.environ.get('CATTLE_CAPTURE_QUEUE', '64'))
+
+RECORDS_FILE = 'records.jsonl'
+CLASSES_FILE = 'classes.json'
+IMAGES_DIR = 'images'
+JPEG_QUALITY = 90
+STRATEGIES = ('margin', 'entropy', 'least_confidence')
+
+# Records from user flags rank above any purely model-selected record
+USER_FLAG = 'user_flag'
+LOW_CONFIDENCE = 'low_confidence'
+
+
+# -----------------------------
+# Capture
+# -----------------------------
+class HardExampleStore:
+    """
+    Append-only store fed through a bounded queue by one writer thread.
+
+    ``capture`` never blocks: when the writer falls behind and the queue is
+    full, the capture is dropped and counted.
+    """
+
+    def __init__(self, store_dir=CAPTURE_DIR, class_names=None, max_pending=CAPTURE_QUEUE):
+        self.store_dir = Path(store_dir)
+        self.class_names = class_names or {}
+        self.stats = {'captured': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._writer = threading.Thread(target=self._write_loop, name='hard-examples', daemon=True)
+        self._writer.start()
+
+    def capture(self, image, task, probs, reason=LOW_CONFIDENCE):
+        """
+        Queue ``image`` and its probability vector for writing.
+
+        A copy of ``image`` is queued, so callers may go on modifying theirs
+        (e.g. thumbnailing it) while the writer encodes it.
+
+        Returns:
+            True if queued, False if dropped because the writer is behind
+        """
+        if self._queue.full():
+            self.stats['dropped'] += 1
+            return False
+        item = (image.copy(), task, np.asarray(probs, dtype=np.float32), reason, time.time())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['captured'] += 1
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued capture has been written (used by scripts and tests)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _write_loop(self):
+        images_dir = self.store_dir / IMAGES_DIR
+        while True:
+            # Block for the first item, then drain whatever else is waiting so
+            # a burst costs one append to the records file
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                images_dir.mkdir(parents=True, exist_ok=True)
+                self._write_classes()
+                lines = []
+                for item in batch:
+                    try:
+                        lines.append(json.dumps(self._write_image(images_dir, *item)))
+                    except Exception as e:
+                        self.stats['failed'] += 1
+                        print(f"⚠️ Hard-example capture failed: {e}")
+                with open(self.store_dir / RECORDS_FILE, 'a') as f:
+                    f.write(''.join(line + '\n' for line in lines))
+                self.stats['written'] += len(lines)
+            except OSError as e:
+                self.stats['failed'] += len(batch)
+                print(f"⚠️ Hard-example store unavailable: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_classes(self):
+        path = self.store_dir / CLASSES_FILE
+        if self.class_names and not path.exists():
+            with open(path, 'w') as f:
+                json.dump(self.class_names, f, indent=2)
+
+    def _write_image(self, images_dir, image, task, probs, reason, timestamp):
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, format='JPEG', quality=JPEG_QUALITY)
+        data = buffer.getvalue()
+        sha1 = hashlib.sha1(data).hexdigest()
+        image_path = images_dir / f"{sha1}.jpg"
+        # Reruns and repeated flags of one upload share the file
+        if not image_path.exists():
+            tmp_path = image_path.with_suffix('.tmp')
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, image_path)
+        predicted = int(probs.argmax())
+        classes = self.class_names.get(task)
+        return {
+            'id': uuid.uuid4().hex[:16],
+            'time': datetime.fromtimestamp(timestamp).isoformat(timespec='seconds'),
+            'task': task,
+            'reason': reason,
+            'image': f"{IMAGES_DIR}/{sha1}.jpg",
+            'sha1': sha1,
+            'predicted': classes[predicted] if classes else predicted,
+            'confidence': round(float(probs[predicted]), 5),
+            'probs': [round(float(p), 5) for p in probs],
+        }
+
+
+# -----------------------------
+# Selection
+# -----------------------------
+def load_records(store_dir=CAPTURE_DIR, task=None):
+    """Records in the store (optionally of one ``task``), skipping a torn last line"""
+    records = []
+    try:
+        with open(Path(store_dir) / RECORDS_FILE) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if task is None or record['task'] == task:
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def uncertainty_scores(probs, strategy='margin'):
+    """
+    Uncertainty of each row of ``probs`` [N, C]; higher means more uncertain.
+
+    - margin: 1 - (top-1 minus top-2 probability)
+    - entropy: Shannon entropy normalised by log(C)
+    - least_confidence: 1 - top-1 probability
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if strategy == 'margin':
+        top2 = np.partition(probs, -2, axis=1)[:, -2:]
+        return 1.0 - (top2[:, 1] - top2[:, 0])
+    if strategy == 'entropy':
+        entropy = -(probs * np.log(np.clip(probs, 1e-12, 1.0))).sum(axis=1)
+        return entropy / np.log(probs.shape[1])
+    if strategy == 'least_confidence':
+        return 1.0 - probs.max(axis=1)
+    raise ValueError(f"Unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+
+
+def select_for_labelling(records, strategy='margin', limit=None):
+    """
+    Rank ``records`` for labelling, most uncertain first.
+
+    Records of the same image and task are merged (flags on an image already
+    captured as low-confidence add to it). User-flagged images come first,
+    then the rest by uncertainty. Scores are computed in one batched pass per
+    task, since the tasks have different numbers of classes.
+
+    Returns:
+        list of merged records with 'score' and 'count' added
+    """
+    merged = {}
+    for record in records:
+        key = (record['sha1'], record['task'])
+        if key not in merged:
+            merged[key] = dict(record, reasons=[record['reason']], count=1)
+        else:
+            entry = merged[key]
+            entry['count'] += 1
+            if record['reason'] not in entry['reasons']:
+                entry['reasons'].append(record['reason'])
+
+    by_task = {}
+    for entry in merged.values():
+        by_task.setdefault(entry['task'], []).append(entry)
+    for entries in by_task.values():
+        scores = uncertainty_scores(np.array([entry['probs'] for entry in entries]), strategy)
+        for entry, score in zip(entries, scores):
+            entry['score'] = float(score)
+
+    ranked = sorted(merged.values(), key=lambda e: (USER_FLAG in e['reasons'], e['score']), reverse=True)
+    return ranked[:limit] if limit else ranked
+
+
+def write_labelling_csv(ranked, store_dir, output):
+    """CSV with an empty 'label' column to fill in; ``training.finetune`` reads it back"""
+    with open(output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'task', 'image', 'predicted', 'confidence', 'score', 'reasons', 'label'])
+        for entry in ranked:
+            writer.writerow([
+                entry['id'], entry['task'], str(Path(store_dir) / entry['image']), entry['predicted'],
+                f"{entry['confidence']:.4f}", f"{entry['score']:.4f}", '+'.join(entry['reasons']), '',
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank captured hard examples for labelling")
+    parser.add_argument('--store', default=CAPTURE_DIR, help="hard-example store directory")
+    parser.add_argument('--task', choices=['breed', 'cattle'], help="only rank this task's captures")
+    parser.add_argument('--strategy', choices=STRATEGIES, default='margin')
+    parser.add_argument('--limit', type=int, help="number of examples to select")
+    parser.add_argument('--output', help="write the selection to this CSV for labelling")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    records = load_records(args.store, args.task)
+    ranked = select_for_labelling(records, args.strategy, args.limit)
+    print(f"📝 {len(records)} captures, {len(ranked)} selected by {args.strategy} "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"{'id':<16} {'task':<6} {'predicted':<20} {'conf':>6} {'score':>6}  reasons")
+    for entry in ranked[:20]:
+        print(f"{entry['id']:<16} {entry['task']:<6} {str(entry['predicted']):<20} "
+              f"{entry['confidence']:>6.2f} {entry['score']:>6.3f}  {'+'.join(entry['reasons'])}")
+    if args.output:
+        write_labelling_csv(ranked, args.store, args.output)
+        print(f"✅ Wrote {args.output}; fill in the 'label' column, then run python -m training.finetune")
+
+
+if __name__ == '__main__':
+    main()
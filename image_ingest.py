@@ -0,0 +1,148 @@
+"""
+Upload ingest stage: size limits and reduced-size decoding.
+
+``Image.open`` only parses the header, so the pixel dimensions are checked
+before any pixel data is decoded. Oversized JPEGs are decoded at a reduced
+scale in the DCT domain (``Image.draft``) instead of decoding all 50 MP and
+shrinking afterwards. Other formats (PNG, WebP, ...) have no reduced-scale
+decode, so they get a much lower pixel limit. Everything is then bounded to a
+working size that is still far above the 224×224 model input.
+
+What goes back to the browser is smaller still: ``st.image`` re-encodes a PIL
+image as a quality-100 JPEG on every rerun, so each upload also gets a preview
+encoded once, bounded to ``PREVIEW_MAX_SIDE`` at ``PREVIEW_QUALITY``, whose
+bytes Streamlit forwards as they are.
+
+Environment overrides:
+    CATTLE_MAX_UPLOAD_MB           reject uploads larger than this (default: 25)
+    CATTLE_MAX_IMAGE_PIXELS        reject images with more pixels than this (default: 100 MP)
+    CATTLE_MAX_FULL_DECODE_PIXELS  the same, for formats always decoded at full size (default: 16 MP)
+    CATTLE_WORKING_MAX_SIDE        longest side kept after decoding (default: 1024)
+    CATTLE_PREVIEW_MAX_SIDE        longest side of the preview sent to the browser (default: 640)
+    CATTLE_PREVIEW_QUALITY         JPEG quality of that preview (default: 80)
+"""
+
+import io
+import os
+import time
+
+from PIL import Image
+
+MAX_UPLOAD_BYTES = int(float(os.environ.get('CATTLE_MAX_UPLOAD_MB', 25)) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(os.environ.get('CATTLE_MAX_IMAGE_PIXELS', 100_000_000))
+MAX_FULL_DECODE_PIXELS = int(os.environ.get('CATTLE_MAX_FULL_DECODE_PIXELS', 16_000_000))
+WORKING_MAX_SIDE = int(os.environ.get('CATTLE_WORKING_MAX_SIDE', 1024))
+PREVIEW_MAX_SIDE = int(os.environ.get('CATTLE_PREVIEW_MAX_SIDE', 640))
+PREVIEW_QUALITY = int(os.environ.get('CATTLE_PREVIEW_QUALITY', 80))
+
+
+class ImageRejected(ValueError):
+    """Raised when an upload exceeds the configured limits or cannot be decoded"""
+
+
+def _draft_size(width, height, max_side):
+    """Requested draft size: the original aspect ratio with ``max_side`` as the longest side"""
+    scale = max_side / max(width, height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+# Formats whose decoder honours Image.draft (MPO is multi-picture JPEG)
+DRAFT_FORMATS = ('JPEG', 'MPO')
+
+
+def ingest_image(file_obj, size_bytes=None, max_bytes=MAX_UPLOAD_BYTES,
+                 max_pixels=MAX_IMAGE_PIXELS, max_side=WORKING_MAX_SIDE,
+                 max_full_decode_pixels=MAX_FULL_DECODE_PIXELS):
+    """
+    Decode an uploaded image into a bounded-size RGB ``PIL.Image``.
+
+    Args:
+        file_obj: binary file-like object positioned anywhere (e.g. st.UploadedFile)
+        size_bytes: upload size if already known, avoids seeking to the end
+        max_bytes: uploads larger than this are rejected without decoding
+        max_pixels: images whose header reports more pixels are rejected
+        max_full_decode_pixels: the same, for formats without reduced-scale decoding
+        max_side: longest side of the returned image
+
+    Returns:
+        image: RGB image no larger than ``max_side`` on its longest side
+        info: dict with the original dimensions, format, mode and byte size
+
+    Raises:
+        ImageRejected: if a limit is exceeded or the data is not a valid image
+    """
+    if size_bytes is None:
+        file_obj.seek(0, os.SEEK_END)
+        size_bytes = file_obj.tell()
+    if size_bytes > max_bytes:
+        raise ImageRejected(
+            f"File is {size_bytes / 1024 / 1024:.1f} MB; the limit is {max_bytes / 1024 / 1024:.0f} MB."
+        )
+
+    file_obj.seek(0)
+    try:
+        with Image.open(file_obj) as img:
+            # Only the header has been read at this point
+            width, height = img.size
+            if width * height > max_pixels:
+                raise ImageRejected(
+                    f"Image is {width}×{height} ({width * height / 1e6:.0f} MP); "
+                    f"the limit is {max_pixels / 1e6:.0f} MP."
+                )
+            if img.format not in DRAFT_FORMATS and width * height > max_full_decode_pixels:
+                # These decode every pixel before they can be shrunk: 100 MP is ~300 MB of RGB
+                raise ImageRejected(
+                    f"{img.format or 'This'} image is {width}×{height} ({width * height / 1e6:.0f} MP); "
+                    f"the limit for this format is {max_full_decode_pixels / 1e6:.0f} MP. "
+                    f"Save it as JPEG or resize it."
+                )
+            info = {
+                'width': width,
+                'height': height,
+                'format': img.format,
+                'mode': img.mode,
+                'size_bytes': size_bytes,
+            }
+            if max(width, height) > max_side:
+                # JPEG decodes at 1/2, 1/4 or 1/8 scale; a no-op for other formats
+                img.draft('RGB', _draft_size(width, height, max_side))
+            image = img.convert('RGB')
+    except ImageRejected:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageRejected(f"Could not decode image: {e}") from e
+
+    info['decoded_width'], info['decoded_height'] = image.size
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    info['working_width'], info['working_height'] = image.size
+    return image, info
+
+
+def encode_preview(image, max_side=PREVIEW_MAX_SIDE, quality=PREVIEW_QUALITY):
+    """
+    Encode a display copy of ``image`` once, for ``st.image`` to send as is.
+
+    Args:
+        image: PIL image; it is not modified
+        max_side: longest side of the preview
+        quality: JPEG quality
+
+    Returns:
+        data: progressive JPEG bytes
+        info: dict with the preview 'width', 'height', 'bytes' and 'encode_ms'
+    """
+    start = time.perf_counter()
+    # convert() returns a copy even when the mode already matches
+    preview = image.convert('RGB')
+    preview.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    # Progressive JPEG shows a coarse version while the rest arrives on slow links
+    preview.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    data = buffer.getvalue()
+    return data, {
+        'width': preview.width,
+        'height': preview.height,
+        'bytes': len(data),
+        'encode_ms': (time.perf_counter() - start) * 1000,
+    }
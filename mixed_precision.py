@@ -0,0 +1,214 @@
+"""
+Opt-in bfloat16 autocast and channels-last memory format.
+
+Both the app's ``predict_*`` functions and ``training.engine`` run fp32 by
+default. On CPUs with native bf16 (AVX512-BF16 or AMX) autocasting the
+convolutions to bf16 and keeping activations in channels-last (NHWC) layout
+lets oneDNN use its fastest kernels. Without native bf16 oneDNN emulates it,
+which is slower than fp32, so a bf16 request falls back to fp32 there unless
+forced.
+
+Environment (app; training takes the same settings through its config):
+    CATTLE_PRECISION      "fp32" (default) or "bf16"
+    CATTLE_CHANNELS_LAST  "1" stores weights and inputs channels-last (default: off)
+    CATTLE_FORCE_BF16     "1" keeps bf16 even without native CPU support
+
+Step time and output drift, fp32 against bf16 with and without channels-last:
+    python mixed_precision.py --batch-sizes 1 32 --iterations 20
+"""
+
+import argparse
+import contextlib
+import os
+import time
+
+import torch
+
+PRECISIONS = ('fp32', 'bf16')
+NATIVE_BF16_CPU_FLAGS = ('avx512_bf16', 'amx_bf16')
+
+
+# -----------------------------
+# Capability detection
+# -----------------------------
+def _cpu_flags():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return None
+
+
+def native_bf16_supported(device_type='cpu'):
+    """True if ``device_type`` runs bf16 natively rather than through emulation"""
+    if device_type == 'cuda':
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    flags = _cpu_flags()
+    if flags is not None:
+        return any(flag in flags for flag in NATIVE_BF16_CPU_FLAGS)
+    # No /proc/cpuinfo (macOS, Windows): fall back to oneDNN's own check
+    checker = getattr(torch.ops.mkldnn, '_is_mkldnn_bf16_supported', None)
+    return bool(checker and checker())
+
+
+def resolve_precision(requested='fp32', device_type='cpu', force=False):
+    """
+    The precision to actually run, given the requested one.
+
+    Returns:
+        precision: 'fp32' or 'bf16'
+        reason: why a bf16 request fell back to fp32, else None
+    """
+    if requested not in PRECISIONS:
+        raise ValueError(f"Unknown precision {requested!r}; expected one of {PRECISIONS}")
+    if requested == 'bf16' and not force and not native_bf16_supported(device_type):
+        return 'fp32', f"no native bf16 support on this {device_type.upper()}"
+    return requested, None
+
+
+def detect_precision_config(device_type='cpu'):
+    """Precision settings for the app from CATTLE_PRECISION / CATTLE_CHANNELS_LAST / CATTLE_FORCE_BF16"""
+    requested = os.environ.get('CATTLE_PRECISION', 'fp32').strip().lower() or 'fp32'
+    force = os.environ.get('CATTLE_FORCE_BF16', '0').strip() == '1'
+    precision, fallback_reason = resolve_precision(requested, device_type, force)
+    return {
+        'requested': requested,
+        'precision': precision,
+        'fallback_reason': fallback_reason,
+        'native_bf16': native_bf16_supported(device_type),
+        'channels_last': os.environ.get('CATTLE_CHANNELS_LAST', '0').strip() == '1',
+    }
+
+
+# -----------------------------
+# Model / input preparation
+# -----------------------------
+def autocast(precision, device_type='cpu'):
+    """Context manager autocasting to bf16 for 'bf16', a no-op for 'fp32'"""
+    if precision == 'bf16':
+        return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def prepare_model(model, channels_last=False):
+    """Convert ``model``'s 4-D weights to channels-last in place (weights stay fp32)"""
+    if channels_last:
+        model.to(memory_format=torch.channels_last)
+    return model
+
+
+def prepare_input(tensor, channels_last=False):
+    """Match an NCHW input batch to the model's memory format"""
+    if channels_last and tensor.dim() == 4:
+        return tensor.contiguous(memory_format=torch.channels_last)
+    return tensor
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def _time_steps(step, iterations, warmup):
+    for _ in range(warmup):
+        step()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        step()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def benchmark_precision(num_classes=41, batch_sizes=(1, 32), iterations=20, warmup=3, seed=42,
+                        force=False):
+    """
+    Median inference and training step time per (precision, channels-last,
+    batch size), plus how far bf16 logits drift from fp32 on the same batch.
+
+    Returns:
+        list of result dicts
+    """
+    import torch.nn as nn
+    from torchvision import models
+
+    torch.manual_seed(seed)
+    reference = models.resnet18(weights=None)
+    reference.fc = nn.Linear(reference.fc.in_features, num_classes)
+    state = {k: v.clone() for k, v in reference.state_dict().items()}
+
+    results = []
+    for batch_size in batch_sizes:
+        images = torch.randn(batch_size, 3, 224, 224, generator=torch.Generator().manual_seed(seed))
+        labels = torch.randint(0, num_classes, (batch_size,), generator=torch.Generator().manual_seed(seed))
+        with torch.no_grad():
+            reference_logits = reference.eval()(images)
+
+        for precision in PRECISIONS:
+            if precision == 'bf16' and not force and not native_bf16_supported():
+                print("⚠️ Skipping bf16: no native bf16 support on this CPU (use --force to emulate)")
+                continue
+            for channels_last in (False, True):
+                model = models.resnet18(weights=None)
+                model.fc = nn.Linear(model.fc.in_features, num_classes)
+                model.load_state_dict(state)
+                prepare_model(model, channels_last)
+                batch = prepare_input(images, channels_last)
+
+                def infer():
+                    with torch.no_grad(), autocast(precision):
+                        return model(batch)
+
+                optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+                criterion = nn.CrossEntropyLoss()
+
+                def train_step():
+                    optimizer.zero_grad()
+                    with autocast(precision):
+                        loss = criterion(model(batch), labels)
+                    loss.backward()
+                    optimizer.step()
+
+                model.eval()
+                infer_s = _time_steps(infer, iterations, warmup)
+                logits = infer().float()
+                model.train()
+                # Training last: it changes the weights the drift check relies on
+                train_s = _time_steps(train_step, max(1, iterations // 2), 1)
+
+                results.append({
+                    'precision': precision,
+                    'channels_last': channels_last,
+                    'batch_size': batch_size,
+                    'infer_ms': infer_s * 1000,
+                    'train_step_ms': train_s * 1000,
+                    'max_logit_diff': (logits - reference_logits).abs().max().item(),
+                    'top1_agreement': (logits.argmax(1) == reference_logits.argmax(1)).float().mean().item(),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 against bf16 / channels-last step time")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--classes', type=int, default=41)
+    parser.add_argument('--force', action='store_true', help="benchmark bf16 even without native support")
+    args = parser.parse_args()
+
+    print(f"Native bf16: {'yes' if native_bf16_supported() else 'no'}, torch threads: {torch.get_num_threads()}")
+    results = benchmark_precision(args.classes, args.batch_sizes, args.iterations, args.warmup,
+                                  force=args.force)
+    print(f"{'precision':>9} {'layout':>8} {'batch':>5} {'infer ms':>9} {'train ms':>9} "
+          f"{'max |Δlogit|':>12} {'top-1 agree':>11}")
+    for r in results:
+        print(f"{r['precision']:>9} {'NHWC' if r['channels_last'] else 'NCHW':>8} {r['batch_size']:>5} "
+              f"{r['infer_ms']:>9.1f} {r['train_step_ms']:>9.1f} {r['max_logit_diff']:>12.4f} "
+              f"{r['top1_agreement']:>11.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+Versioned model registry with background loading and hot swap.
+
+The app used to load ``models/*.pth`` once per process through
+``@st.cache_resource``, so a model update meant restarting every replica and
+losing warm caches. The registry keeps versioned artifacts with manifests:
+
+    <registry>/<task>/<version>/model.pth
+    <registry>/<task>/<version>/manifest.json   version, sha256, classes, source, metrics
+    <registry>/<task>/CURRENT                   the version to serve
+
+Each replica polls the ``CURRENT`` pointers. When one changes, the new
+version is loaded, checked against its manifest and warmed up on a background
+thread, then swapped in with a single reference assignment. Requests lease
+the version that was active when they started and finish on it; a replaced
+version is released once its last lease is returned.
+
+Without a registry entry for a task, the legacy checkpoint under ``models/``
+is served as version "legacy".
+
+Environment (app):
+    CATTLE_MODEL_REGISTRY   registry directory (default: models/registry)
+    CATTLE_REGISTRY_POLL    seconds between checks for a new version; 0 disables (default: 15)
+
+Usage:
+    python model_registry.py publish --task breed --checkpoint models/breed_classifier.pth --activate
+    python model_registry.py activate --task breed --version 20261019-1200
+    python model_registry.py list
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import torch
+
+REGISTRY_DIR = os.environ.get('CATTLE_MODEL_REGISTRY', 'models/registry')
+POLL_SECONDS = float(os.environ.get('CATTLE_REGISTRY_POLL', '15'))
+
+MODEL_FILE = 'model.pth'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+LEGACY_VERSION = 'legacy'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+# -----------------------------
+# Registry layout
+# -----------------------------
+def current_version(root, task):
+    """The version ``CURRENT`` points at for ``task``, or None"""
+    try:
+        return (Path(root) / task / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(root, task, version):
+    with open(Path(root) / task / version / MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def list_versions(root, task):
+    """Manifests of every published version of ``task``, oldest first"""
+    task_dir = Path(root) / task
+    if not task_dir.is_dir():
+        return []
+    manifests = []
+    for version_dir in task_dir.iterdir():
+        if (version_dir / MANIFEST_FILE).exists():
+            manifests.append(read_manifest(root, task, version_dir.name))
+    return sorted(manifests, key=lambda m: m['created'])
+
+
+def publish(root, task, checkpoint, version=None, activate=False, metrics=None):
+    """
+    Copy ``checkpoint`` (a bare state dict) into the registry as a new version.
+
+    Returns:
+        manifest of the published version
+    """
+    state = torch.load(checkpoint, map_location='cpu')
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+    version_dir = Path(root) / task / version
+    if version_dir.exists():
+        raise ValueError(f"{task} version {version} already exists")
+    version_dir.mkdir(parents=True)
+    shutil.copyfile(checkpoint, version_dir / MODEL_FILE)
+    manifest = {
+        'task': task,
+        'version': version,
+        'file': MODEL_FILE,
+        'sha256': file_sha256(version_dir / MODEL_FILE),
+        'architecture': 'resnet18',
+        'num_classes': int(state['fc.weight'].shape[0]),
+        'source': str(checkpoint),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'metrics': metrics or {},
+    }
+    _write_atomic(version_dir / MANIFEST_FILE, json.dumps(manifest, indent=2))
+    if activate:
+        activate_version(root, task, version)
+    return manifest
+
+
+def activate_version(root, task, version):
+    """Point ``CURRENT`` at ``version``; replicas pick it up on their next poll"""
+    read_manifest(root, task, version)  # fail on unknown versions
+    _write_atomic(Path(root) / task / CURRENT_FILE, version + '\n')
+
+
+# -----------------------------
+# Serving
+# -----------------------------
+class LoadedModel:
+    """One loaded version of a task's model and its in-flight lease count"""
+
+    def __init__(self, task, version, model, manifest, warmup_ms):
+        self.task = task
+        self.version = version
+        self.model = model
+        self.manifest = manifest
+        self.loaded_at = datetime.now().isoformat(timespec='seconds')
+        self.warmup_ms = warmup_ms
+        self.leases = 0
+        self.retired = False
+
+
+class Lease:
+    """
+    A request's hold on one model version; release it when the request is done.
+    Usable as a context manager.
+    """
+
+    def __init__(self, registry, entry):
+        self._registry = registry
+        self._entry = entry
+        self.model = entry.model
+        self.version = entry.version
+
+    def release(self):
+        if self._entry is not None:
+            self._registry._release(self._entry)
+            # Drop every reference, so a stored job does not pin an old model
+            self._entry = None
+            self.model = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ModelRegistry:
+    """
+    Serves the active version of each task and hot-swaps new ones.
+
+    Args:
+        root: registry directory
+        build_model: callable(task, num_classes) returning an untrained model
+        num_classes: {task: number of classes the app expects}
+        legacy_paths: {task: checkpoint served when the registry has no version}
+        warmup: optional callable(model) run before a version starts serving
+    """
+
+    def __init__(self, root, build_model, num_classes, legacy_paths, warmup=None):
+        self.root = Path(root)
+        self.build_model = build_model
+        self.num_classes = num_classes
+        self.legacy_paths = legacy_paths
+        self.warmup = warmup
+        self._active = {}
+        self._draining = []
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._watcher = None
+
+    def _load(self, task, version):
+        if version == LEGACY_VERSION:
+            path, manifest = self.legacy_paths[task], {'version': LEGACY_VERSION, 'source': self.legacy_paths[task]}
+        else:
+            manifest = read_manifest(self.root, task, version)
+            path = self.root / task / version / manifest['file']
+            if file_sha256(path) != manifest['sha256']:
+                raise ValueError(f"{task} {version}: checksum does not match its manifest")
+            if manifest['num_classes'] != self.num_classes[task]:
+                raise ValueError(f"{task} {version}: {manifest['num_classes']} classes, "
+                                 f"the app expects {self.num_classes[task]}")
+        model = self.build_model(task, self.num_classes[task])
+        model.load_state_dict(torch.load(path, map_location='cpu'))
+        model.eval()
+        # Lets callers key cached results by the version that produced them
+        model.registry_version = version
+        start = time.perf_counter()
+        if self.warmup is not None:
+            self.warmup(model)
+        return LoadedModel(task, version, model, manifest, (time.perf_counter() - start) * 1000)
+
+    def _wanted_version(self, task):
+        version = current_version(self.root, task)
+        if version is None and os.path.exists(self.legacy_paths[task]):
+            return LEGACY_VERSION
+        return version
+
+    def _swap(self, entry):
+        with self._lock:
+            old = self._active.get(entry.task)
+            self._active[entry.task] = entry
+            if old is not None:
+                old.retired = True
+                if old.leases:
+                    self._draining.append(old)
+                else:
+                    self._free(old)
+
+    def _free(self, entry):
+        entry.model = None
+        # ResNet-18 weights are ~45 MB per version; return them promptly
+        gc.collect()
+
+    def _release(self, entry):
+        with self._lock:
+            entry.leases -= 1
+            if entry.retired and entry.leases == 0 and entry in self._draining:
+                self._draining.remove(entry)
+                self._free(entry)
+
+    def lease(self, task):
+        """
+        Lease the active version of ``task``, loading it first if nothing is active.
+
+        Raises:
+            FileNotFoundError: if the task has neither a registry version nor a legacy checkpoint
+        """
+        with self._lock:
+            entry = self._active.get(task)
+            if entry is not None:
+                entry.leases += 1
+                return Lease(self, entry)
+        # First request of the process: load synchronously, like the old cached loader
+        with self._load_lock:
+            if task not in self._active:
+                version = self._wanted_version(task)
+                if version is None:
+                    raise FileNotFoundError(f"No {task} model in {self.root} or at {self.legacy_paths[task]}")
+                self._swap(self._load(task, version))
+        return self.lease(task)
+
+    def refresh(self):
+        """
+        Load, warm up and swap in every task whose ``CURRENT`` version changed.
+        A version that fails to load is skipped until ``CURRENT`` changes again.
+
+        Returns:
+            list of (task, version) pairs swapped in
+        """
+        swapped = []
+        for task in list(self._active):
+            version = self._wanted_version(task)
+            if version is None or version == self._active[task].version or self._failed.get(task) == version:
+                continue
+            try:
+                with self._load_lock:
+                    entry = self._load(task, version)
+            except Exception as e:
+                self._failed[task] = version
+                print(f"❌ Keeping {task} {self._active[task].version}: could not load {version}: {e}")
+                continue
+            self._swap(entry)
+            swapped.append((task, version))
+            print(f"✅ Swapped in {task} {version} (warm-up {entry.warmup_ms:.0f} ms)")
+        return swapped
+
+    def start_watcher(self, poll_seconds=POLL_SECONDS):
+        """Poll for new versions on a daemon thread"""
+        if poll_seconds <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(poll_seconds)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠️ Model registry check failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name='model-registry', daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        """Active and draining versions per task, for the sidebar"""
+        with self._lock:
+            return {
+                task: {
+                    'version': entry.version,
+                    'loaded_at': entry.loaded_at,
+                    'warmup_ms': entry.warmup_ms,
+                    'in_flight': entry.leases,
+                    'draining': [(old.version, old.leases) for old in self._draining if old.task == task],
+                }
+                for task, entry in self._active.items()
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish and activate model versions")
+    parser.add_argument('--registry', default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish_parser = commands.add_parser('publish', help="add a checkpoint as a new version")
+    publish_parser.add_argument('--task', choices=['breed', 'cattle'], required=True)
+    publish_parser.add_argument('--checkpoint', required=True, help="bare state dict, e.g. models/breed_classifier.pth")
+    publish_parser.add_argument('--version', help="version name (default: a timestamp)")
+    publish_parser.add_argument('--metrics', help="JSON file of evaluation metrics to record in the manifest")
+    publish_parser.add_argument('--activate', action='store_true', help="serve it once replicas poll")
+    activate_parser = commands.add_parser('activate', help="serve a published version (also rolls back)")
+    activate_parser.add_argument('--task', choices=['breed', 'cattle'], required=True)
+    activate_parser.add_argument('--version', required=True)
+    commands.add_parser('list', help="published versions")
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        metrics = None
+        if args.metrics:
+            with open(args.metrics) as f:
+                metrics = json.load(f)
+        manifest = publish(args.registry, args.task, args.checkpoint, args.version, args.activate, metrics)
+        print(f"✅ Published {args.task} {manifest['version']}{' (active)' if args.activate else ''}")
+    elif args.command == 'activate':
+        activate_version(args.registry, args.task, args.version)
+        print(f"✅ {args.task} now serves {args.version}")
+    else:
+        for task in ('cattle', 'breed'):
+            active = current_version(args.registry, task)
+            for manifest in list_versions(args.registry, task):
+                marker = '*' if manifest['version'] == active else ' '
+                print(f"{marker} {task:<6} {manifest['version']:<20} {manifest['created']}  "
+                      f"{manifest['sha256'][:12]}  {manifest['source']}")
+
+
+if __name__ == '__main__':
+    main()
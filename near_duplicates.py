@@ -0,0 +1,236 @@
+"""
+Perceptual-hash cache of predictions for near-duplicate uploads.
+
+The same animal photo keeps coming back resized, recompressed by WhatsApp or
+slightly cropped, so hashing the uploaded bytes never matches. Two 64-bit
+perceptual hashes of a 32×32 grayscale thumbnail do:
+
+- pHash: signs of the 8×8 lowest-frequency DCT coefficients, without the DC
+  term (overall brightness), against their median (63 bits); rescaling,
+  recompression and brightness changes move it by 0-4 bits, a 3% crop by up
+  to about 10
+- dHash: signs of horizontal gradients of a 9×8 thumbnail; used to confirm a
+  pHash match, which cuts false matches between different photos
+
+A hit serves one user's prediction for another user's photo, and two animals
+photographed in the same stall and pose can be close too, so the default
+radius only accepts resized and recompressed copies. Run this module on a
+folder of real, distinct uploads to see how close different photos come
+before raising it (see ``main``).
+
+Entries are indexed by pHash in a multi-index hash table: the 63 bits are cut
+into ``radius + 1`` chunks, and by the pigeonhole principle any hash within
+``radius`` bits of a query agrees with it exactly on at least one chunk. A
+lookup therefore only compares the few entries sharing a chunk, and entries
+can be evicted (least recently used first) without rebuilding anything.
+
+Results are namespaced by task, model version and TTA setting, so a
+hot-swapped model never serves its predecessor's predictions.
+
+Environment overrides:
+    CATTLE_NEAR_DUP           "0" disables the cache (default: enabled)
+    CATTLE_NEAR_DUP_RADIUS    maximum pHash Hamming distance of a match (default: 4)
+    CATTLE_NEAR_DUP_ENTRIES   cached predictions (default: 5000)
+
+Usage:
+    python near_duplicates.py data/hard_examples/images     # distances between distinct photos
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+from PIL import Image
+
+NEAR_DUP_ENABLED = os.environ.get('CATTLE_NEAR_DUP', '1').strip() != '0'
+NEAR_DUP_RADIUS = int(os.environ.get('CATTLE_NEAR_DUP_RADIUS', '4'))
+NEAR_DUP_ENTRIES = int(os.environ.get('CATTLE_NEAR_DUP_ENTRIES', '5000'))
+
+PHASH_BITS = 63
+THUMBNAIL_SIZE = 32
+# The dHash confirmation may differ a little more: gradients of a 9×8
+# thumbnail flip more easily than low DCT frequencies
+DHASH_RADIUS_FACTOR = 1.5
+LATENCY_WINDOW = 1000
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(THUMBNAIL_SIZE)
+
+
+def _bits_to_int(bits):
+    bits = bits.ravel()
+    # packbits pads to whole bytes on the right
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big') >> (-len(bits) % 8)
+
+
+def image_fingerprint(image):
+    """
+    (pHash, dHash) of ``image`` as 63- and 64-bit ints.
+
+    Both come from one 32×32 grayscale thumbnail, so the full-size image is
+    only read once.
+    """
+    thumbnail = image.convert('L').resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(thumbnail, dtype=np.float32)
+    # The DC term only encodes overall brightness, and is nearly always above the median
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].ravel()[1:]
+    phash = _bits_to_int(low > np.median(low))
+    small = np.asarray(thumbnail.resize((9, 8), Image.BILINEAR), dtype=np.float32)
+    dhash = _bits_to_int(small[:, 1:] > small[:, :-1])
+    return phash, dhash
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class NearDuplicateCache:
+    """
+    LRU cache of prediction results looked up by perceptual-hash distance.
+
+    Args:
+        radius: maximum pHash Hamming distance of a match
+        max_entries: entries kept; the least recently used are evicted
+    """
+
+    def __init__(self, radius=NEAR_DUP_RADIUS, max_entries=NEAR_DUP_ENTRIES):
+        self.radius = radius
+        self.max_entries = max_entries
+        chunks = radius + 1
+        bounds = np.linspace(0, PHASH_BITS, chunks + 1).astype(int)
+        self._chunks = [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self._index = [{} for _ in self._chunks]
+        # entry id -> (namespace, phash, dhash, value), least recently used first
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._fingerprint_ms = deque(maxlen=LATENCY_WINDOW)
+        self._lookup_ms = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {'lookups': 0, 'hits': 0, 'stored': 0, 'evicted': 0}
+
+    def _keys(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._chunks]
+
+    def fingerprint(self, image):
+        """``image_fingerprint`` of ``image``, timed for the summary"""
+        start = time.perf_counter()
+        fingerprint = image_fingerprint(image)
+        self._fingerprint_ms.append((time.perf_counter() - start) * 1000)
+        return fingerprint
+
+    def lookup(self, namespace, fingerprint):
+        """
+        The value stored for the nearest match of ``fingerprint`` in ``namespace``, or None.
+        """
+        start = time.perf_counter()
+        phash, dhash = fingerprint
+        best, best_distance = None, None
+        with self._lock:
+            candidates = set()
+            for index, key in zip(self._index, self._keys(phash)):
+                candidates.update(index.get(key, ()))
+            for entry_id in candidates:
+                entry_namespace, entry_phash, entry_dhash, _ = self._entries[entry_id]
+                if entry_namespace != namespace:
+                    continue
+                distance = hamming(phash, entry_phash)
+                if (distance <= self.radius and hamming(dhash, entry_dhash) <= self.radius * DHASH_RADIUS_FACTOR
+                        and (best_distance is None or distance < best_distance)):
+                    best, best_distance = entry_id, distance
+            self.stats['lookups'] += 1
+            value = None
+            if best is not None:
+                self._entries.move_to_end(best)
+                value = self._entries[best][3]
+                self.stats['hits'] += 1
+            self._lookup_ms.append((time.perf_counter() - start) * 1000)
+        return value
+
+    def store(self, namespace, fingerprint, value):
+        phash, dhash = fingerprint
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (namespace, phash, dhash, value)
+            for index, key in zip(self._index, self._keys(phash)):
+                index.setdefault(key, set()).add(entry_id)
+            self.stats['stored'] += 1
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, (_, phash, _, _) = self._entries.popitem(last=False)
+        for index, key in zip(self._index, self._keys(phash)):
+            bucket = index[key]
+            bucket.discard(entry_id)
+            if not bucket:
+                del index[key]
+        self.stats['evicted'] += 1
+
+    def summary(self):
+        """Hit rate, entry count, and fingerprint and lookup latency percentiles (ms)"""
+        def percentiles(values):
+            return tuple(float(v) for v in np.percentile(values, [50, 95])) if values else (None, None)
+
+        with self._lock:
+            lookups, hits = self.stats['lookups'], self.stats['hits']
+            entries = len(self._entries)
+            lookup_ms = percentiles(list(self._lookup_ms))
+        fingerprint_ms = percentiles(list(self._fingerprint_ms))
+        return {
+            'entries': entries,
+            'lookups': lookups,
+            'hit_rate': hits / lookups if lookups else None,
+            'fingerprint_ms_p50': fingerprint_ms[0],
+            'fingerprint_ms_p95': fingerprint_ms[1],
+            'lookup_ms_p50': lookup_ms[0],
+            'lookup_ms_p95': lookup_ms[1],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="pHash distances between distinct photos, for choosing CATTLE_NEAR_DUP_RADIUS"
+    )
+    parser.add_argument('folder', help="directory of real uploads showing different animals or scenes")
+    parser.add_argument('--max-radius', type=int, default=12)
+    args = parser.parse_args()
+
+    fingerprints = []
+    for path in sorted(os.listdir(args.folder)):
+        try:
+            with Image.open(os.path.join(args.folder, path)) as image:
+                fingerprints.append((path, image_fingerprint(image.convert('RGB'))))
+        except OSError:
+            continue
+    if len(fingerprints) < 2:
+        print(f"⚠️ Need at least two images in {args.folder}")
+        return
+
+    nearest = []
+    for i, (_, (phash, dhash)) in enumerate(fingerprints):
+        nearest.append(min(
+            (hamming(phash, other_phash), hamming(dhash, other_dhash))
+            for j, (_, (other_phash, other_dhash)) in enumerate(fingerprints) if j != i
+        ))
+    print(f"📊 Nearest other photo for each of {len(fingerprints)} images (should be distinct photos):")
+    print(f"{'radius':>6} {'would match':>12}")
+    for radius in range(args.max_radius + 1):
+        matched = sum(p <= radius and d <= radius * DHASH_RADIUS_FACTOR for p, d in nearest)
+        print(f"{radius:>6} {matched:>12}")
+    print("💡 Keep CATTLE_NEAR_DUP_RADIUS below the first radius where distinct photos match; "
+          "true duplicates in the folder also show up here.")
+
+
+if __name__ == '__main__':
+    main()
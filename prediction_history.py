@@ -0,0 +1,283 @@
+"""
+Persistent prediction history with incrementally maintained aggregates.
+
+Predictions used to be rendered and forgotten. Every served prediction is now
+appended to a local SQLite log, and the same transaction updates small
+aggregate tables:
+
+    predictions         one row per prediction (the log; never scanned by the app)
+    daily_counts        predictions per day × source × cattle class × breed, with confidence sums
+    confidence_buckets  predictions per day × task × 5% confidence bucket
+
+``record`` only enqueues; a single writer thread drains the queue and writes
+each burst in one transaction, so request latency never includes disk I/O.
+When the writer falls behind, new records are dropped and counted. The
+database runs in WAL mode, so the analytics page reads the aggregates
+without blocking the writer. Those tables have at most a few thousand rows
+per year, however long the log grows.
+
+Environment (app):
+    CATTLE_HISTORY          "0" disables the history (default: enabled)
+    CATTLE_HISTORY_DB       database file (default: data/history/predictions.db)
+    CATTLE_HISTORY_QUEUE    records waiting to be written before new ones are dropped (default: 1024)
+
+Usage:
+    python prediction_history.py                 # summary from the aggregates
+    python prediction_history.py --rebuild       # recompute the aggregates from the log
+"""
+
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+HISTORY_ENABLED = os.environ.get('CATTLE_HISTORY', '1').strip() != '0'
+HISTORY_DB = os.environ.get('CATTLE_HISTORY_DB', 'data/history/predictions.db')
+HISTORY_QUEUE = int(os.environ.get('CATTLE_HISTORY_QUEUE', '1024'))
+
+CONFIDENCE_BUCKETS = 20
+# Stored instead of NULL, so it can be part of the aggregates' primary key
+NO_BREED = ''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    day TEXT NOT NULL,
+    source TEXT NOT NULL,
+    cattle TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    breed TEXT NOT NULL,
+    breed_confidence REAL
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    source TEXT NOT NULL,
+    cattle TEXT NOT NULL,
+    breed TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    breed_confidence_sum REAL NOT NULL,
+    PRIMARY KEY (day, source, cattle, breed)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS confidence_buckets (
+    day TEXT NOT NULL,
+    task TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (day, task, bucket)
+) WITHOUT ROWID;
+"""
+
+
+def confidence_bucket(confidence):
+    return min(int(confidence * CONFIDENCE_BUCKETS), CONFIDENCE_BUCKETS - 1)
+
+
+def connect(db_path):
+    """Writer connection in WAL mode, creating the schema if needed"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # WAL with synchronous=NORMAL only risks the last transactions on power loss
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _aggregate(rows):
+    """Aggregate deltas of ``predictions`` rows (time, day, source, cattle, confidence, breed, breed_confidence)"""
+    counts = Counter()
+    confidence_sums = Counter()
+    breed_confidence_sums = Counter()
+    buckets = Counter()
+    for _, day, source, cattle, confidence, breed, breed_confidence in rows:
+        key = (day, source, cattle, breed)
+        counts[key] += 1
+        confidence_sums[key] += confidence
+        buckets[(day, 'cattle', confidence_bucket(confidence))] += 1
+        if breed_confidence is not None:
+            breed_confidence_sums[key] += breed_confidence
+            buckets[(day, 'breed', confidence_bucket(breed_confidence))] += 1
+    daily = [key + (n, confidence_sums[key], breed_confidence_sums[key]) for key, n in counts.items()]
+    return daily, [key + (n,) for key, n in buckets.items()]
+
+
+def _add_to_aggregates(connection, rows):
+    daily, buckets = _aggregate(rows)
+    connection.executemany(
+        "INSERT INTO daily_counts VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (day, source, cattle, breed) DO UPDATE SET n = n + excluded.n, "
+        "confidence_sum = confidence_sum + excluded.confidence_sum, "
+        "breed_confidence_sum = breed_confidence_sum + excluded.breed_confidence_sum", daily
+    )
+    connection.executemany(
+        "INSERT INTO confidence_buckets VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (day, task, bucket) DO UPDATE SET n = n + excluded.n", buckets
+    )
+
+
+def _apply(connection, rows):
+    connection.executemany(
+        "INSERT INTO predictions (time, day, source, cattle, confidence, breed, breed_confidence) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    _add_to_aggregates(connection, rows)
+
+
+class PredictionHistory:
+    """
+    Append-only prediction log fed through a bounded queue by one writer thread.
+
+    ``record`` never blocks: when the writer falls behind and the queue is
+    full, the record is dropped and counted.
+    """
+
+    def __init__(self, db_path=HISTORY_DB, max_pending=HISTORY_QUEUE):
+        self.db_path = db_path
+        self.stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'transactions': 0}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._writer = threading.Thread(target=self._write_loop, name='prediction-history', daemon=True)
+        self._writer.start()
+
+    def record(self, source, cattle, confidence, breed=None, breed_confidence=None):
+        """
+        Queue one prediction for writing.
+
+        Returns:
+            True if queued, False if dropped because the writer is behind
+        """
+        now = time.time()
+        row = (now, datetime.fromtimestamp(now).strftime('%Y-%m-%d'), source, cattle, float(confidence),
+               breed or NO_BREED, float(breed_confidence) if breed_confidence is not None else None)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['recorded'] += 1
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued record has been written (used by scripts and tests)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _write_loop(self):
+        connection = None
+        while True:
+            # Block for the first record, then drain whatever else is waiting
+            # so a burst (a batch upload, a herd) costs one transaction
+            rows = [self._queue.get()]
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if connection is None:
+                    connection = connect(self.db_path)
+                with connection:
+                    _apply(connection, rows)
+                self.stats['written'] += len(rows)
+                self.stats['transactions'] += 1
+            except (sqlite3.Error, OSError) as e:
+                connection = None
+                self.stats['failed'] += len(rows)
+                print(f"⚠️ Prediction history unavailable: {e}")
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def read_aggregates(db_path=HISTORY_DB, since_day=None):
+    """
+    Aggregate tables, optionally from ``since_day`` ('YYYY-MM-DD') on.
+
+    Only ``daily_counts`` and ``confidence_buckets`` are read, never the log.
+
+    Returns:
+        dict with 'daily_counts' rows (day, source, cattle, breed, n,
+        confidence_sum, breed_confidence_sum) and 'confidence_buckets' rows
+        (day, task, bucket, n), or None if there is no history yet
+    """
+    if not Path(db_path).exists():
+        return None
+    connection = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True)
+    try:
+        where, params = ("WHERE day >= ?", (since_day,)) if since_day else ("", ())
+        return {
+            'daily_counts': connection.execute(f"SELECT * FROM daily_counts {where}", params).fetchall(),
+            'confidence_buckets': connection.execute(f"SELECT * FROM confidence_buckets {where}", params).fetchall(),
+        }
+    except sqlite3.OperationalError:
+        return None  # created but not initialised yet
+    finally:
+        connection.close()
+
+
+def rebuild_aggregates(db_path=HISTORY_DB, chunk_size=100000):
+    """Recompute the aggregate tables from the log, e.g. after editing it by hand"""
+    connection = connect(db_path)
+    try:
+        with connection:
+            connection.execute("DELETE FROM daily_counts")
+            connection.execute("DELETE FROM confidence_buckets")
+            cursor = connection.execute(
+                "SELECT time, day, source, cattle, confidence, breed, breed_confidence FROM predictions"
+            )
+            total = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                _add_to_aggregates(connection, rows)
+                total += len(rows)
+        return total
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or repair the prediction history")
+    parser.add_argument('--db', default=HISTORY_DB)
+    parser.add_argument('--since', help="first day to include, YYYY-MM-DD")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the aggregates from the log")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        start = time.perf_counter()
+        total = rebuild_aggregates(args.db)
+        print(f"✅ Rebuilt aggregates from {total} predictions in {time.perf_counter() - start:.1f}s")
+        return
+    aggregates = read_aggregates(args.db, args.since)
+    if not aggregates or not aggregates['daily_counts']:
+        print(f"⚠️ No predictions recorded in {args.db}")
+        return
+    cattle, breeds, days = Counter(), Counter(), set()
+    for day, _, cattle_class, breed, n, _, _ in aggregates['daily_counts']:
+        cattle[cattle_class] += n
+        if breed:
+            breeds[breed] += n
+        days.add(day)
+    print(f"📊 {sum(cattle.values())} predictions over {len(days)} days")
+    for name, n in cattle.most_common():
+        print(f"   {name:<10} {n:>8}")
+    for name, n in breeds.most_common(10):
+        print(f"   {name.replace('_', ' '):<24} {n:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Torch CPU thread-pool configuration for the classifier app.
+
+Torch sizes its intra-op pool from the number of host cores, ignoring the
+fractional CPU quota containers are given through cgroups. Under concurrent
+Streamlit sessions every forward pass then spawns a thread per host core and
+the replica oversubscribes its quota. This module reads the quota, derives
+intra/inter-op thread counts and an inference slot budget, and applies them.
+
+Environment overrides:
+    CATTLE_TORCH_THREADS          intra-op threads per forward pass
+    CATTLE_TORCH_INTEROP_THREADS  inter-op threads (default: 1)
+    CATTLE_INFERENCE_SLOTS        forward passes allowed to run at once
+    CATTLE_PIN_SESSIONS           "0" disables the slot budget (default: enabled)
+"""
+
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+import torch
+
+# ResNet-18 at batch size 1 stops scaling beyond a handful of threads, so a
+# single forward pass never gets more than this many unless overridden.
+MAX_DEFAULT_INTRA_OP_THREADS = 4
+
+CGROUP_V2_ROOT = '/sys/fs/cgroup'
+CGROUP_V1_CPU_DIRS = ['/sys/fs/cgroup/cpu,cpuacct', '/sys/fs/cgroup/cpu']
+
+_inference_slots = None
+_slot_lock = threading.Lock()
+# Forward passes running or waiting for a slot, for background work that
+# should only use idle capacity
+_inference_load = 0
+
+
+# -----------------------------
+# CPU quota detection
+# -----------------------------
+def _read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_v2_dir():
+    """Directory of this process' cgroup v2 hierarchy (falls back to the mount root)"""
+    line = None
+    try:
+        with open('/proc/self/cgroup') as f:
+            for entry in f:
+                if entry.startswith('0::'):
+                    line = entry.strip()[3:]
+                    break
+    except OSError:
+        pass
+    if line and line != '/':
+        candidate = os.path.join(CGROUP_V2_ROOT, line.lstrip('/'))
+        if os.path.exists(os.path.join(candidate, 'cpu.max')):
+            return candidate
+    return CGROUP_V2_ROOT
+
+
+def read_cgroup_cpu_quota():
+    """
+    Return the container CPU quota in CPUs (e.g. 1.5), or None if unlimited
+    or not running under cgroups.
+    """
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read_first_line(os.path.join(_cgroup_v2_dir(), 'cpu.max'))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: separate quota / period files, quota is -1 when unlimited
+    for cpu_dir in CGROUP_V1_CPU_DIRS:
+        quota = _read_first_line(os.path.join(cpu_dir, 'cpu.cfs_quota_us'))
+        period = _read_first_line(os.path.join(cpu_dir, 'cpu.cfs_period_us'))
+        if quota and period:
+            if int(quota) > 0 and int(period) > 0:
+                return int(quota) / int(period)
+            return None
+    return None
+
+
+def available_cpus():
+    """CPUs this process may run on (affinity mask, falling back to cpu_count)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return None
+    return max(1, int(value))
+
+
+# -----------------------------
+# Configuration
+# -----------------------------
+def detect_runtime_config():
+    """
+    Work out thread settings for this replica.
+
+    Returns:
+        config: dict with the detected CPU budget and the chosen thread counts
+    """
+    cpu_quota = read_cgroup_cpu_quota()
+    cpus = available_cpus()
+    # A 1.5 CPU quota can keep one thread busy, not two
+    cpu_budget = max(1, min(cpus, math.floor(cpu_quota))) if cpu_quota else cpus
+
+    intra_op_threads = _env_int('CATTLE_TORCH_THREADS')
+    if intra_op_threads is None:
+        intra_op_threads = min(cpu_budget, MAX_DEFAULT_INTRA_OP_THREADS)
+
+    inter_op_threads = _env_int('CATTLE_TORCH_INTEROP_THREADS') or 1
+
+    inference_slots = _env_int('CATTLE_INFERENCE_SLOTS')
+    if inference_slots is None:
+        inference_slots = max(1, cpu_budget // intra_op_threads)
+
+    return {
+        'cpu_quota': cpu_quota,
+        'available_cpus': cpus,
+        'cpu_budget': cpu_budget,
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'inference_slots': inference_slots,
+        'pin_sessions': os.environ.get('CATTLE_PIN_SESSIONS', '1') != '0',
+    }
+
+
+def apply_runtime_config(config):
+    """
+    Apply ``config`` to torch and set up the inference slot budget.
+
+    Inter-op threads can only be set before torch has started any parallel
+    work, so a failure there is recorded in the config rather than raised.
+    """
+    torch.set_num_threads(config['intra_op_threads'])
+    try:
+        torch.set_num_interop_threads(config['inter_op_threads'])
+        config['inter_op_applied'] = True
+    except RuntimeError:
+        config['inter_op_applied'] = False
+    config['inter_op_threads_effective'] = torch.get_num_interop_threads()
+
+    set_inference_slots(config['inference_slots'] if config['pin_sessions'] else None)
+    return config
+
+
+def configure_torch_runtime():
+    """Detect and apply the thread configuration; returns the applied config"""
+    return apply_runtime_config(detect_runtime_config())
+
+
+# -----------------------------
+# Session thread budgets
+# -----------------------------
+def set_inference_slots(slots):
+    """Limit concurrent forward passes to ``slots`` (None removes the limit)"""
+    global _inference_slots
+    with _slot_lock:
+        _inference_slots = threading.BoundedSemaphore(slots) if slots else None
+
+
+@contextmanager
+def inference_slot():
+    """
+    Hold one inference slot for the duration of a forward pass.
+
+    Each slot is worth ``intra_op_threads`` cores, so sessions beyond the
+    budget queue here instead of oversubscribing the CPU quota.
+    """
+    global _inference_load
+    with _slot_lock:
+        _inference_load += 1
+    try:
+        semaphore = _inference_slots
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+    finally:
+        with _slot_lock:
+            _inference_load -= 1
+
+
+def inference_load():
+    """Number of forward passes currently running or waiting for a slot"""
+    return _inference_load
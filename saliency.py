@@ -0,0 +1,109 @@
+"""
+Class activation maps (CAM) from the prediction's own forward pass.
+
+Both classifiers are ResNet-18s: ``layer4`` produces a [512, 7, 7] feature map,
+global average pooling reduces it to 512 features and ``fc`` scores them. The
+score of class k is therefore the pooled sum of ``fc.weight[k] · A``, and the
+7×7 map ``fc.weight[k] · A`` (CAM, Zhou et al. 2016) shows where that score
+came from. For this architecture it is what Grad-CAM computes too, but needs
+no backward pass and no second inference.
+
+An ``ActivationRecorder`` is attached to each served model once, as a forward
+hook on ``layer4``. It keeps nothing unless the calling thread is recording,
+so requests that don't ask for a heatmap, and concurrent requests from other
+sessions on the same model, only pay for one attribute lookup. With
+test-time augmentation the first (original view) pass is the one recorded.
+"""
+
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from PIL import Image
+
+CAM_LAYER = 'layer4'
+OVERLAY_ALPHA = 0.45
+
+
+class ActivationRecorder:
+    """Forward hook keeping the first ``layer4`` output of the recording thread"""
+
+    def __init__(self, model, layer=CAM_LAYER):
+        self._local = threading.local()
+        self.handle = getattr(model, layer).register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, output):
+        local = self._local
+        if getattr(local, 'recording', False) and local.activations is None:
+            local.activations = output.detach().float()
+
+    @contextmanager
+    def recording(self):
+        """
+        Record the next forward pass of this thread.
+
+        Yields:
+            a dict whose 'activations' entry holds [B, 512, 7, 7] afterwards (or None)
+        """
+        local = self._local
+        local.recording, local.activations = True, None
+        result = {}
+        try:
+            yield result
+        finally:
+            result['activations'] = local.activations
+            local.recording, local.activations = False, None
+
+
+def attach_recorder(model, layer=CAM_LAYER):
+    """Attach an ``ActivationRecorder`` to ``model`` as ``model.cam_recorder``"""
+    model.cam_recorder = ActivationRecorder(model, layer)
+    return model
+
+
+@contextmanager
+def recorded_activations(model):
+    """``model.cam_recorder.recording()``, or a no-op for models without a recorder"""
+    recorder = getattr(model, 'cam_recorder', None)
+    if recorder is None:
+        yield {'activations': None}
+        return
+    with recorder.recording() as result:
+        yield result
+
+
+def class_activation_map(activations, fc_weight, class_index):
+    """
+    CAM of ``class_index`` for one image, scaled to [0, 1].
+
+    Args:
+        activations: [512, 7, 7] ``layer4`` output
+        fc_weight: [K, 512] weights of the final linear layer
+        class_index: class to explain
+
+    Returns:
+        [7, 7] float32 numpy array
+    """
+    with torch.no_grad():
+        cam = torch.einsum('c,chw->hw', fc_weight[class_index].float(), activations.float())
+    cam = cam.clamp_(min=0).numpy().astype(np.float32)
+    peak = cam.max()
+    return cam / peak if peak > 0 else cam
+
+
+def _colormap(values):
+    """Jet-like RGB colours for values in [0, 1] (blue → cyan → yellow → red)"""
+    r = np.clip(1.5 - np.abs(4 * values - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * values - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * values - 1), 0, 1)
+    return (np.stack([r, g, b], axis=-1) * 255).astype(np.uint8)
+
+
+def heatmap_overlay(image, cam, alpha=OVERLAY_ALPHA):
+    """``image`` blended with ``cam`` upsampled to its size and coloured"""
+    # The model saw the image squashed to 224×224, so the 7×7 grid stretches
+    # over the whole image rather than a centre crop
+    upsampled = Image.fromarray(cam).resize(image.size, Image.BILINEAR)
+    heat = Image.fromarray(_colormap(np.clip(np.asarray(upsampled), 0, 1)))
+    return Image.blend(image.convert('RGB'), heat, alpha)
@@ -0,0 +1,334 @@
+"""
+Per-session memory accounting and eviction of stale session artifacts.
+
+Each browser tab is a Streamlit session, and everything a session keeps in
+``st.session_state`` (the decoded working image, batch thumbnails, video
+previews, finished prediction jobs) stays in memory until the session ends.
+An idle tab is only dropped by Streamlit long after the user has left, so
+a replica with many open tabs grows until it is killed.
+
+Large artifacts are therefore kept in a process-wide ``SessionArtifacts``
+store instead, keyed by session id, which:
+
+- measures what each artifact holds (image pixels, array and tensor buffers)
+- compacts the artifacts of a session idle for ``COMPACT_AFTER`` seconds:
+  images are kept as lossless PNG bytes and decoded again on access, and
+  artifacts the session can rebuild exactly (the working image, from the
+  upload Streamlit still holds) are dropped
+- drops every artifact of sessions idle for ``EVICT_AFTER`` seconds, or that
+  Streamlit reports as closed
+- keeps the total under ``MEMORY_BUDGET_MB`` by compacting, then evicting,
+  the least recently used sessions first
+
+Compaction and budget eviction run on a background thread: encoding another
+session's images never happens on a request or while the store is locked.
+
+A session whose artifact was evicted simply recomputes it on its next rerun,
+as if it were a new upload. Upload bytes themselves are owned by Streamlit's
+file manager and are not counted.
+
+Environment overrides:
+    CATTLE_SESSION_MEMORY_MB      budget for session artifacts across sessions (default: 512)
+    CATTLE_SESSION_COMPACT_AFTER  idle seconds before a session's artifacts are compacted (default: 60)
+    CATTLE_SESSION_EVICT_AFTER    idle seconds before a session's artifacts are dropped (default: 900)
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+from PIL import Image
+
+MEMORY_BUDGET_MB = float(os.environ.get('CATTLE_SESSION_MEMORY_MB', '512'))
+COMPACT_AFTER = float(os.environ.get('CATTLE_SESSION_COMPACT_AFTER', '60'))
+EVICT_AFTER = float(os.environ.get('CATTLE_SESSION_EVICT_AFTER', '900'))
+
+# Lossless, so a restored image is pixel-identical; level 1 favours speed over size
+COMPACT_PNG_LEVEL = 1
+# Containers nested deeper than this are counted shallowly
+MAX_SIZE_DEPTH = 6
+
+
+def estimate_bytes(obj, _seen=None, _depth=0):
+    """
+    Approximate memory held by ``obj``: pixel buffers of PIL images, numpy and
+    torch buffers, bytes, and containers of them (including finished futures).
+    """
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, Image.Image):
+        return obj.width * obj.height * len(obj.getbands())
+    if isinstance(obj, CompactImage):
+        return len(obj.data)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, torch.Tensor):
+        return obj.element_size() * obj.nelement()
+    if isinstance(obj, (bytes, bytearray, memoryview, str)):
+        return sys.getsizeof(obj)
+    if _depth >= MAX_SIZE_DEPTH:
+        return sys.getsizeof(obj)
+    if isinstance(obj, Future):
+        if not obj.done() or obj.cancelled() or obj.exception() is not None:
+            return sys.getsizeof(obj)
+        return sys.getsizeof(obj) + estimate_bytes(obj.result(), seen, _depth + 1)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_bytes(k, seen, _depth + 1) + estimate_bytes(v, seen, _depth + 1) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_bytes(item, seen, _depth + 1) for item in obj)
+    return sys.getsizeof(obj)
+
+
+class CompactImage:
+    """A PIL image kept as PNG bytes until it is needed again"""
+
+    def __init__(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=COMPACT_PNG_LEVEL)
+        self.data = buffer.getvalue()
+        self.size = image.size
+
+    def restore(self):
+        image = Image.open(io.BytesIO(self.data))
+        image.load()
+        return image
+
+
+def compact_images(value):
+    """Replace every PIL image in ``value`` (nested in lists, tuples and dicts) by a ``CompactImage``"""
+    if isinstance(value, Image.Image):
+        return CompactImage(value)
+    if isinstance(value, tuple):
+        return tuple(compact_images(v) for v in value)
+    if isinstance(value, list):
+        return [compact_images(v) for v in value]
+    if isinstance(value, dict):
+        return {k: compact_images(v) for k, v in value.items()}
+    return value
+
+
+def restore_images(value):
+    """Inverse of ``compact_images``"""
+    if isinstance(value, CompactImage):
+        return value.restore()
+    if isinstance(value, tuple):
+        return tuple(restore_images(v) for v in value)
+    if isinstance(value, list):
+        return [restore_images(v) for v in value]
+    if isinstance(value, dict):
+        return {k: restore_images(v) for k, v in value.items()}
+    return value
+
+
+class _Artifact:
+    __slots__ = ('value', 'nbytes', 'compactable', 'recomputable', 'compacted')
+
+    def __init__(self, value, compactable, recomputable):
+        self.value = value
+        self.nbytes = estimate_bytes(value)
+        self.compactable = compactable
+        self.recomputable = recomputable
+        self.compacted = False
+
+
+class SessionArtifacts:
+    """
+    Process-wide store of large per-session values with LRU eviction.
+
+    Requests only do bookkeeping under the lock. Encoding images for
+    compaction, and evicting sessions while over budget, happen on a
+    background thread, so the total may exceed the budget for a moment.
+
+    Args:
+        budget_bytes: total bytes of artifacts across sessions
+        compact_after: idle seconds before a session's artifacts are compacted
+        evict_after: idle seconds before a session's artifacts are dropped
+        is_active: optional callable(session_id) telling whether a session is still open
+    """
+
+    def __init__(self, budget_bytes=MEMORY_BUDGET_MB * 1024 * 1024, compact_after=COMPACT_AFTER,
+                 evict_after=EVICT_AFTER, is_active=None):
+        self.budget_bytes = budget_bytes
+        self.compact_after = compact_after
+        self.evict_after = evict_after
+        self.is_active = is_active
+        self.stats = {'compacted': 0, 'evicted': 0, 'evicted_bytes': 0, 'restored': 0}
+        # session id -> {key: _Artifact}, least recently used session first
+        self._sessions = OrderedDict()
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = threading.Thread(target=self._maintenance_loop, name='session-compactor', daemon=True)
+        self._worker.start()
+
+    def touch(self, session_id):
+        """Mark ``session_id`` as active and run the idle and budget checks for the others"""
+        with self._lock:
+            self._touch(session_id)
+            self._maintain(session_id)
+
+    def get(self, session_id, key):
+        """The artifact stored under ``key``, restored if it was compacted, or None"""
+        with self._lock:
+            self._touch(session_id)
+            artifact = self._sessions[session_id].get(key)
+            if artifact is None:
+                return None
+            if not artifact.compacted:
+                return artifact.value
+            compacted = artifact.value
+        # Decoded outside the lock, so other sessions are not kept waiting
+        value = restore_images(compacted)
+        with self._lock:
+            if artifact.compacted and artifact.value is compacted:
+                artifact.value = value
+                artifact.nbytes = estimate_bytes(value)
+                artifact.compacted = False
+                self.stats['restored'] += 1
+                self._maintain(session_id)
+        return value
+
+    def put(self, session_id, key, value, compactable=True, recomputable=False):
+        """
+        Store ``value`` under ``key`` for ``session_id``.
+
+        Args:
+            compactable: whether PIL images in ``value`` may be kept as PNG
+                while the session is idle
+            recomputable: whether ``value`` may be dropped instead, because
+                the session rebuilds exactly the same value when it is missing
+        """
+        with self._lock:
+            self._touch(session_id)
+            self._sessions[session_id][key] = _Artifact(value, compactable, recomputable)
+            self._maintain(session_id)
+
+    def pop(self, session_id, key):
+        with self._lock:
+            artifact = self._sessions.get(session_id, {}).pop(key, None)
+            return artifact.value if artifact is not None else None
+
+    def session_bytes(self, session_id):
+        with self._lock:
+            return sum(a.nbytes for a in self._sessions.get(session_id, {}).values())
+
+    def total_bytes(self):
+        with self._lock:
+            return self._total_bytes()
+
+    def snapshot(self):
+        """Per-session rows (most recently used first) for the debug panel"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    'session': session_id,
+                    'bytes': sum(a.nbytes for a in artifacts.values()),
+                    'artifacts': {key: a.nbytes for key, a in artifacts.items()},
+                    'compacted': any(a.compacted for a in artifacts.values()),
+                    'idle_seconds': now - self._last_seen[session_id],
+                }
+                for session_id, artifacts in reversed(self._sessions.items())
+            ]
+
+    def compact(self):
+        """
+        Compact idle sessions, then compact and evict the least recently used
+        sessions while over budget. Runs on the background thread; callable
+        directly from scripts and tests.
+        """
+        with self._lock:
+            now = time.monotonic()
+            current = self._most_recent()
+            over_budget = self._total_bytes() > self.budget_bytes
+            pending = [
+                (session_id, key, artifact, now - self._last_seen[session_id] >= self.compact_after)
+                for session_id, artifacts in self._sessions.items() if session_id != current
+                for key, artifact in artifacts.items() if self._shrinkable(artifact)
+            ]
+        for session_id, key, artifact, idle in pending:
+            if not idle and (not over_budget or self.total_bytes() <= self.budget_bytes):
+                continue
+            # The expensive part, done without holding the lock
+            value = None if artifact.recomputable else compact_images(artifact.value)
+            nbytes = 0 if value is None else estimate_bytes(value)
+            with self._lock:
+                artifacts = self._sessions.get(session_id)
+                # Skip artifacts replaced, removed or restored meanwhile, and sessions that came back
+                if (artifacts is None or artifacts.get(key) is not artifact or artifact.compacted
+                        or session_id == self._most_recent()):
+                    continue
+                if artifact.recomputable:
+                    del artifacts[key]
+                else:
+                    artifact.value, artifact.nbytes, artifact.compacted = value, nbytes, True
+                self.stats['compacted'] += 1
+
+        # Still over budget: drop the least recently used sessions
+        with self._lock:
+            current = self._most_recent()
+            total = self._total_bytes()
+            for session_id in list(self._sessions):
+                if total <= self.budget_bytes:
+                    break
+                if session_id == current:
+                    continue
+                total -= sum(a.nbytes for a in self._sessions[session_id].values())
+                self._evict(session_id)
+
+    def _maintenance_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Session artifact compaction failed: {e}")
+
+    def _total_bytes(self):
+        return sum(a.nbytes for artifacts in self._sessions.values() for a in artifacts.values())
+
+    def _most_recent(self):
+        return next(reversed(self._sessions), None)
+
+    @staticmethod
+    def _shrinkable(artifact):
+        return artifact.recomputable or (artifact.compactable and not artifact.compacted)
+
+    def _touch(self, session_id):
+        self._sessions.setdefault(session_id, {})
+        self._sessions.move_to_end(session_id)
+        self._last_seen[session_id] = time.monotonic()
+
+    def _evict(self, session_id):
+        artifacts = self._sessions.pop(session_id)
+        self._last_seen.pop(session_id)
+        if artifacts:
+            self.stats['evicted'] += len(artifacts)
+            self.stats['evicted_bytes'] += sum(a.nbytes for a in artifacts.values())
+
+    def _maintain(self, current):
+        """Cheap checks under the lock; compaction and budget eviction are left to the background thread"""
+        now = time.monotonic()
+        idle_work = False
+        for session_id in list(self._sessions):
+            if session_id == current:
+                continue
+            idle = now - self._last_seen[session_id]
+            closed = self.is_active is not None and not self.is_active(session_id)
+            if closed or idle >= self.evict_after:
+                self._evict(session_id)
+            elif idle >= self.compact_after and any(map(self._shrinkable, self._sessions[session_id].values())):
+                idle_work = True
+        if idle_work or self._total_bytes() > self.budget_bytes:
+            self._wake.set()
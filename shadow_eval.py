@@ -0,0 +1,249 @@
+"""
+Shadow evaluation of a candidate breed model on live traffic.
+
+Offline accuracy on the stored validation split does not tell us how a
+retrained breed model behaves on what farmers actually upload. In shadow mode
+the preprocessed input tensor of every breed prediction is also handed to a
+``ShadowEvaluator``, which runs the candidate off the request path:
+
+- ``submit`` only enqueues; when the bounded queue is full the sample is
+  dropped and counted, so users never wait on the candidate
+- one worker thread drains the queue in batches, at a lowered OS priority,
+  and only starts a batch when no live forward pass is running or waiting
+- per sample it records whether the candidate's top-1 breed agrees with the
+  production result, both confidences and the latency of each model
+
+Production results may be refined by test-time augmentation; the candidate
+always takes a single pass, so agreement is measured against what users saw.
+Latency is not: a request's time includes waiting for an inference slot and
+any TTA passes, so the production model is timed again in the worker, on the
+same batch as the candidate. Both figures are per image of a batched pass.
+
+Environment (app):
+    CATTLE_SHADOW_BREED_MODEL   candidate checkpoint (bare state dict); unset disables shadow mode
+    CATTLE_SHADOW_QUEUE         samples waiting for the candidate before new ones are dropped (default: 64)
+    CATTLE_SHADOW_BATCH         samples per candidate forward pass (default: 8)
+    CATTLE_SHADOW_LOG           JSONL file of evaluated samples (default: data/shadow/breed.jsonl; "" disables)
+
+Usage:
+    python shadow_eval.py --log data/shadow/breed.jsonl
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from runtime_config import inference_load
+
+SHADOW_MODEL_PATH = os.environ.get('CATTLE_SHADOW_BREED_MODEL', '').strip() or None
+SHADOW_QUEUE = int(os.environ.get('CATTLE_SHADOW_QUEUE', '64'))
+SHADOW_BATCH = int(os.environ.get('CATTLE_SHADOW_BATCH', '8'))
+SHADOW_LOG = os.environ.get('CATTLE_SHADOW_LOG', 'data/shadow/breed.jsonl').strip() or None
+
+# Added to the worker thread's nice value (Linux schedules threads individually)
+WORKER_NICENESS = 10
+# How often the worker checks whether live inference has gone quiet
+IDLE_POLL_SECONDS = 0.05
+# Latency percentiles are taken over this many recent samples
+LATENCY_WINDOW = 1000
+
+
+def _lower_thread_priority(niceness=WORKER_NICENESS):
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass  # not Linux, or not permitted; the idle check still applies
+
+
+class ShadowEvaluator:
+    """
+    Runs a candidate model on copies of production inputs in the background.
+
+    Args:
+        predict: callable taking a [B, 3, 224, 224] batch and returning [B, K]
+            probabilities of the candidate (it holds its own inference slot)
+        baseline: optional callable running the production model the same
+            way, timed for the latency comparison; its output is not used
+        class_names: class names in model output order
+        max_pending: queue size; samples beyond it are dropped
+        batch_size: samples per candidate forward pass
+        log_path: optional JSONL file receiving one line per evaluated sample
+    """
+
+    def __init__(self, predict, class_names, max_pending=SHADOW_QUEUE, batch_size=SHADOW_BATCH, log_path=None,
+                 baseline=None):
+        self.predict = predict
+        self.baseline = baseline
+        self.class_names = class_names
+        self.batch_size = batch_size
+        self.log_path = Path(log_path) if log_path else None
+        self.stats = {'submitted': 0, 'dropped': 0, 'evaluated': 0, 'agreed': 0, 'failed': 0}
+        self.disagreements = Counter()
+        self._production_ms = deque(maxlen=LATENCY_WINDOW)
+        self._candidate_ms = deque(maxlen=LATENCY_WINDOW)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._worker = threading.Thread(target=self._run, name='shadow-eval', daemon=True)
+        self._worker.start()
+
+    def submit(self, tensor, production_probs):
+        """
+        Queue one preprocessed input [3, 224, 224] with the production result users saw.
+
+        Returns:
+            True if queued, False if dropped because the candidate is behind
+        """
+        item = (tensor, np.asarray(production_probs, dtype=np.float32))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['submitted'] += 1
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued sample has been evaluated (used by scripts and tests)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                # Live requests go first; samples arriving meanwhile are dropped
+                while inference_load() > 0:
+                    time.sleep(IDLE_POLL_SECONDS)
+                self._evaluate(batch)
+            except Exception as e:
+                self.stats['failed'] += len(batch)
+                print(f"⚠️ Shadow evaluation failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _evaluate(self, batch):
+        tensors, production = zip(*batch)
+        inputs = torch.stack(tensors)
+        start = time.perf_counter()
+        candidate = np.asarray(self.predict(inputs), dtype=np.float32)
+        candidate_ms = (time.perf_counter() - start) * 1000 / len(batch)
+        production_ms = None
+        if self.baseline is not None:
+            start = time.perf_counter()
+            self.baseline(inputs)
+            production_ms = (time.perf_counter() - start) * 1000 / len(batch)
+
+        production = np.stack(production)
+        production_top = production.argmax(axis=1)
+        candidate_top = candidate.argmax(axis=1)
+        agreed = production_top == candidate_top
+        for p, c in zip(production_top[~agreed], candidate_top[~agreed]):
+            self.disagreements[(self.class_names[p], self.class_names[c])] += 1
+        if production_ms is not None:
+            self._production_ms.extend([production_ms] * len(batch))
+        self._candidate_ms.extend([candidate_ms] * len(batch))
+        self.stats['evaluated'] += len(batch)
+        self.stats['agreed'] += int(agreed.sum())
+
+        if self.log_path is not None:
+            now = datetime.now().isoformat(timespec='seconds')
+            lines = [json.dumps({
+                'time': now,
+                'production': self.class_names[production_top[i]],
+                'production_confidence': round(float(production[i, production_top[i]]), 5),
+                'candidate': self.class_names[candidate_top[i]],
+                'candidate_confidence': round(float(candidate[i, candidate_top[i]]), 5),
+                'production_ms': round(production_ms, 2) if production_ms is not None else None,
+                'candidate_ms': round(candidate_ms, 2),
+            }) for i in range(len(batch))]
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.write(''.join(line + '\n' for line in lines))
+
+    def summary(self):
+        """Agreement rate, batched per-image latency percentiles (ms) and the most common disagreements"""
+        return summarize(self.stats['evaluated'], self.stats['agreed'], list(self._production_ms),
+                         list(self._candidate_ms), self.disagreements, dict(self.stats))
+
+
+def summarize(evaluated, agreed, production_ms, candidate_ms, disagreements, stats=None):
+    """Summary dict shared by the live evaluator and the log reader"""
+    def percentiles(values):
+        if not values:
+            return None
+        p50, p95 = np.percentile(values, [50, 95])
+        return {'p50': float(p50), 'p95': float(p95)}
+
+    production, candidate = percentiles(production_ms), percentiles(candidate_ms)
+    return {
+        'stats': stats or {'evaluated': evaluated, 'agreed': agreed},
+        'agreement': agreed / evaluated if evaluated else None,
+        'production_ms': production,
+        'candidate_ms': candidate,
+        'latency_delta_ms': candidate['p50'] - production['p50'] if production and candidate else None,
+        'top_disagreements': disagreements.most_common(5),
+    }
+
+
+def summarize_log(log_path):
+    """Summary of a shadow log, e.g. one collected across replicas"""
+    evaluated = agreed = 0
+    production_ms, candidate_ms, disagreements = [], [], Counter()
+    with open(log_path) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            evaluated += 1
+            if row['production'] == row['candidate']:
+                agreed += 1
+            else:
+                disagreements[(row['production'], row['candidate'])] += 1
+            if row.get('production_ms') is not None:
+                production_ms.append(row['production_ms'])
+            candidate_ms.append(row['candidate_ms'])
+    return summarize(evaluated, agreed, production_ms, candidate_ms, disagreements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a shadow evaluation log")
+    parser.add_argument('--log', default=SHADOW_LOG or 'data/shadow/breed.jsonl')
+    args = parser.parse_args()
+
+    summary = summarize_log(args.log)
+    evaluated = summary['stats']['evaluated']
+    if not evaluated:
+        print(f"⚠️ No shadow samples in {args.log}")
+        return
+    print(f"🔬 {evaluated} samples, top-1 agreement {summary['agreement']:.1%}")
+    if summary['production_ms']:
+        print(f"   production p50 {summary['production_ms']['p50']:.1f} ms, p95 {summary['production_ms']['p95']:.1f} ms "
+              f"(per image, batched)")
+    print(f"   candidate  p50 {summary['candidate_ms']['p50']:.1f} ms, p95 {summary['candidate_ms']['p95']:.1f} ms "
+          f"(per image, batched)")
+    for (production, candidate), count in summary['top_disagreements']:
+        print(f"   {count:>5}  {production} -> {candidate}")
+
+
+if __name__ == '__main__':
+    main()
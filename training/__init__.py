@@ -0,0 +1,8 @@
+"""
+Training code for the cattle and breed classifiers.
+
+The modules here hold what used to live only in
+``cattle_breed_model_training.ipynb`` so it can be imported by the notebook,
+by worker processes and by command-line tools alike. Run them from the
+repository root, e.g. ``python -m training.shard_cache --help``.
+"""
@@ -0,0 +1,221 @@
+"""
+Parallel training data loading.
+
+``create_data_loaders`` used to hard-code ``num_workers=0`` for Windows
+notebook compatibility and ``pin_memory=True`` even on CPU, so every decode
+and augmentation ran serially inside the training process. Datasets now live
+in importable modules, so worker processes work on every platform; this
+module picks worker counts per platform, keeps workers alive across epochs,
+prefetches batches and only pins memory when a GPU will consume it.
+
+Loader throughput benchmark (images/sec against worker count):
+    python -m training.data_pipeline --cache ./data/cache/breed --workers 0 2 4 8 16
+    python -m training.data_pipeline --data ./data/indian-bovine-breeds --task breed
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from training.datasets import CattleBreedDataset, train_transforms, val_transforms
+from training.splits import (
+    CachedValidationDataset, SplitManager, TransformSubset, validation_cache_prefix
+)
+
+DEFAULT_PREFETCH_FACTOR = 4
+DEFAULT_SPLIT_DIR = 'data/splits'
+
+
+def available_cpus():
+    """CPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_num_workers():
+    """
+    Platform-aware worker count. Linux forks workers cheaply, so it gets up to
+    8 and leaves a core for the training process; Windows and macOS spawn a
+    fresh interpreter per worker, so they stay at 4.
+    """
+    cpus = available_cpus()
+    if cpus <= 1:
+        return 0
+    cap = 8 if sys.platform.startswith('linux') else 4
+    return min(cap, cpus - 1)
+
+
+def split_cpu_budget(threads, num_workers=None):
+    """
+    Split a process' CPU budget between intra-op threads and loader workers.
+
+    Every worker is a process keeping a core busy (``seed_worker`` gives it
+    one thread), so workers come out of ``threads`` instead of running on
+    top of it. At two threads or fewer the main process loads the data itself.
+
+    Returns:
+        intra_op_threads, num_workers
+    """
+    if num_workers is None:
+        num_workers = threads // 3 if threads > 2 else 0
+    return max(1, threads - num_workers), num_workers
+
+
+def seed_worker(worker_id):
+    """
+    Give each worker its own numpy/random seed derived from torch's, and a
+    single intra-op thread so N workers don't each spawn a thread per core.
+    """
+    worker_seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+    torch.set_num_threads(1)
+
+
+def loader_kwargs(num_workers=None, prefetch_factor=None, pin_memory=None):
+    """DataLoader keyword arguments for the given (or default) worker settings"""
+    if num_workers is None:
+        num_workers = default_num_workers()
+    kwargs = {
+        'num_workers': num_workers,
+        # Pinned memory only speeds up host-to-GPU copies; on CPU it is pure overhead
+        'pin_memory': torch.cuda.is_available() if pin_memory is None else pin_memory,
+    }
+    if num_workers > 0:
+        kwargs.update(
+            persistent_workers=True,
+            prefetch_factor=prefetch_factor or DEFAULT_PREFETCH_FACTOR,
+            worker_init_fn=seed_worker,
+        )
+    return kwargs
+
+
+# Create data loaders function
+def create_data_loaders(dataset, config):
+    """
+    Create training and validation data loaders.
+
+    ``dataset`` must be built without a transform: the training and validation
+    views apply their own. The split is stored per dataset version in
+    ``config['split_dir']`` and reused by later runs; with 'cache_val' (the
+    default) validation images are preprocessed once and read back from disk.
+
+    ``config`` may set 'num_workers' and 'prefetch_factor'; missing or None
+    values fall back to the platform defaults above.
+    """
+    # Stable, stratified split shared by every run on this version of the data
+    split_dir = config.get('split_dir') or DEFAULT_SPLIT_DIR
+    train_indices, val_indices, split_id = SplitManager(split_dir).get_split(
+        dataset, config['train_split'], config.get('seed', 42)
+    )
+
+    # Separate views, so augmentation only ever applies to the training side
+    train_dataset = TransformSubset(dataset, train_indices, train_transforms)
+    val_dataset = TransformSubset(dataset, val_indices, val_transforms)
+    if config.get('cache_val', True) and len(val_dataset):
+        val_dataset = CachedValidationDataset(
+            val_dataset, validation_cache_prefix(dataset, split_dir, split_id)
+        )
+
+    kwargs = loader_kwargs(config.get('num_workers'), config.get('prefetch_factor'))
+
+    # Create data loaders
+    train_loader = DataLoader(
+        train_dataset,
+        batch_size=config['batch_size'],
+        shuffle=True,
+        **kwargs
+    )
+
+    val_loader = DataLoader(
+        val_dataset,
+        batch_size=config['batch_size'],
+        shuffle=False,
+        **kwargs
+    )
+
+    print(f"Training samples: {len(train_dataset)}")
+    print(f"Validation samples: {len(val_dataset)}")
+    print(f"Loader workers: {kwargs['num_workers']}, pin_memory: {kwargs['pin_memory']}")
+
+    return train_loader, val_loader
+
+
+# -----------------------------
+# Loader throughput benchmark
+# -----------------------------
+def benchmark_loader(dataset, num_workers, batch_size=32, batches=50, prefetch_factor=None):
+    """
+    Measure how fast a loader over ``dataset`` produces training batches.
+
+    Returns:
+        dict with worker startup time (first batch) and steady-state images/sec
+    """
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, drop_last=True,
+                        **loader_kwargs(num_workers, prefetch_factor))
+    start = time.perf_counter()
+    iterator = iter(loader)
+    next(iterator)
+    first_batch_s = time.perf_counter() - start
+
+    images = 0
+    start = time.perf_counter()
+    for _ in range(batches):
+        try:
+            batch_images, _ = next(iterator)
+        except StopIteration:
+            break
+        images += batch_images.shape[0]
+    elapsed = time.perf_counter() - start
+    del iterator, loader
+    return {
+        'num_workers': num_workers,
+        'first_batch_s': first_batch_s,
+        'images': images,
+        'images_per_sec': images / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training loader throughput against worker count")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--data', help="dataset root with one directory per class (decodes JPEGs)")
+    source.add_argument('--cache', help="shard cache directory built by training.shard_cache")
+    parser.add_argument('--task', choices=['breed', 'cattle'], default='breed')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({0, 2, 4, default_num_workers(), available_cpus() - 1} - {-1}))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--prefetch-factor', type=int, default=DEFAULT_PREFETCH_FACTOR)
+    parser.add_argument('--output', help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    if args.cache:
+        from training.shard_cache import ShardCacheDataset
+        dataset = ShardCacheDataset(args.cache, transform=train_transforms)
+    else:
+        dataset = CattleBreedDataset(args.data, transform=train_transforms, task=args.task)
+
+    results = []
+    print(f"{'workers':>8} {'first batch (s)':>16} {'images/sec':>12}")
+    for num_workers in args.workers:
+        result = benchmark_loader(dataset, num_workers, args.batch_size, args.batches, args.prefetch_factor)
+        results.append(result)
+        print(f"{num_workers:>8} {result['first_batch_s']:>16.2f} {result['images_per_sec']:>12.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'source': args.cache or args.data, 'batch_size': args.batch_size,
+                       'cpus': available_cpus(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
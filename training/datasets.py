@@ -0,0 +1,108 @@
+"""
+Class definitions, dataset and transforms for the Indian Bovine Breeds dataset.
+"""
+
+from pathlib import Path
+
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import transforms
+
+from training.manifest import manifest_samples, print_report, update_manifest
+
+# Define breed classes based on README
+INDIAN_BREEDS = [
+    'Alambadi', 'Amritmahal', 'Banni', 'Bargur', 'Bhadawari', 'Dangi', 'Deoni',
+    'Gir', 'Hallikar', 'Hariana', 'Jaffrabadi', 'Kangayam', 'Kankrej', 'Kasargod',
+    'Kenkatha', 'Kherigarh', 'Khillari', 'Krishna Valley', 'Malnad Gidda', 'Mehsana',
+    'Murrah', 'Nagori', 'Nagpuri', 'Nili Ravi', 'Nimari', 'Ongole', 'Pulikulam',
+    'Rathi', 'Red Sindhi', 'Sahiwal', 'Surti', 'Tharparkar', 'Toda', 'Umblachery', 'Vechur'
+]
+
+INTERNATIONAL_BREEDS = [
+    'Ayrshire', 'Brown Swiss', 'Guernsey', 'Holstein Friesian', 'Jersey', 'Red Dane'
+]
+
+ALL_BREEDS = INDIAN_BREEDS + INTERNATIONAL_BREEDS
+CATTLE_CLASSES = ['Cow', 'Buffalo', 'None']
+
+# Create class to index mappings
+breed_to_idx = {breed: idx for idx, breed in enumerate(ALL_BREEDS)}
+idx_to_breed = {idx: breed for breed, idx in breed_to_idx.items()}
+
+cattle_to_idx = {cattle: idx for idx, cattle in enumerate(CATTLE_CLASSES)}
+idx_to_cattle = {idx: cattle for cattle, idx in cattle_to_idx.items()}
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Images are resized to this before any augmentation. The shard cache stores
+# them at this size, which turns the Resize below into a plain copy.
+PRERESIZE_SIZE = (256, 256)
+
+
+def task_classes(task):
+    """Return (classes, class_to_idx) for 'breed' or 'cattle'"""
+    if task == 'breed':
+        return ALL_BREEDS, breed_to_idx
+    return CATTLE_CLASSES, cattle_to_idx
+
+
+# Custom Dataset Class
+class CattleBreedDataset(Dataset):
+    def __init__(self, root_dir, transform=None, task='breed', manifest_path=None):
+        """
+        Args:
+            root_dir (string): Directory with all the images organized by class
+            transform (callable, optional): Optional transform to be applied on a sample
+            task (string): 'breed' for breed classification, 'cattle' for cattle classification
+            manifest_path (string, optional): Dataset manifest file (default: under data/manifests/)
+        """
+        self.root_dir = Path(root_dir)
+        self.transform = transform
+        self.task = task
+        self.manifest_path = manifest_path
+        self.samples = []
+        self.classes, self.class_to_idx = task_classes(task)
+
+        # Load all image paths and labels
+        self._load_samples()
+
+    def _load_samples(self):
+        """Load image paths and labels from the incrementally updated dataset manifest"""
+        manifest = update_manifest(self.root_dir, self.classes, self.manifest_path)
+        self.samples, report = manifest_samples(manifest, self.root_dir, self.class_to_idx)
+        print_report(report)
+
+        print(f"Loaded {len(self.samples)} samples for {self.task} classification")
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        img_path, label = self.samples[idx]
+
+        # Corrupt files were excluded by the manifest, so a failure here is a real error
+        with Image.open(img_path) as img:
+            image = img.convert('RGB')
+        if self.transform:
+            image = self.transform(image)
+        return image, label
+
+
+# Define transforms based on README specifications
+train_transforms = transforms.Compose([
+    transforms.Resize(PRERESIZE_SIZE),
+    transforms.RandomResizedCrop(224),
+    transforms.RandomHorizontalFlip(p=0.5),
+    transforms.RandomRotation(degrees=15),
+    transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+])
+
+val_transforms = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+])
@@ -0,0 +1,439 @@
+"""
+Scriptable, resumable training engine for the cattle and breed classifiers.
+
+Every epoch writes a checkpoint with the model, optimizer, scheduler,
+early-stopping and history state. A pre-empted run picks up from the last
+finished epoch with ``--resume`` instead of restarting from zero. Both tasks
+can train at once in separate processes, each with its own share of the CPU
+threads. Per-epoch loss, accuracy, throughput and wall time are printed and
+appended to ``<run-dir>/<task>/metrics.jsonl``.
+
+Usage:
+    python -m training.engine --data ./data/indian-bovine-breeds --tasks cattle breed --parallel
+    python -m training.engine --data ./data/indian-bovine-breeds --tasks breed --resume
+    python -m training.engine --data ./data/indian-bovine-breeds --cache-dir ./data/cache --epochs 20
+    python -m training.engine --data ./data/indian-bovine-breeds --precision bf16 --channels-last
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from mixed_precision import autocast, prepare_input, prepare_model, resolve_precision
+from training.data_pipeline import available_cpus, create_data_loaders, split_cpu_budget
+from training.datasets import CattleBreedDataset, task_classes
+from training.models import MODEL_FILENAMES, create_model
+
+# Training Configuration
+TRAINING_CONFIG = {
+    'batch_size': 32,
+    'learning_rate': 0.001,
+    'num_epochs': 50,
+    'patience': 10,  # Early stopping patience
+    'min_delta': 0.001,  # Minimum change to qualify as improvement
+    'train_split': 0.8,  # 80% for training, 20% for validation
+    'weight_decay': 1e-4,
+    'step_size': 10,  # Learning rate scheduler step size
+    'gamma': 0.1,  # Learning rate decay factor
+    'num_workers': None,  # Data loader workers (None = platform default)
+    'prefetch_factor': 4,  # Batches prefetched per worker
+    'seed': 42,  # Seeds weights init, the train/val split and augmentation
+    'split_dir': 'data/splits',  # Stored train/val splits and cached validation tensors
+    'cache_val': True,  # Preprocess validation images once and reuse them
+    'precision': 'fp32',  # 'bf16' autocasts on CPUs/GPUs with native bf16 support
+    'channels_last': False,  # NHWC weights and inputs
+}
+
+CHECKPOINT_FILE = 'checkpoint.pth'
+METRICS_FILE = 'metrics.jsonl'
+
+
+# Create training helper functions
+def create_optimizer_and_scheduler(model, config):
+    """Create optimizer and learning rate scheduler"""
+    optimizer = optim.Adam(
+        model.parameters(),
+        lr=config['learning_rate'],
+        weight_decay=config['weight_decay']
+    )
+
+    scheduler = optim.lr_scheduler.StepLR(
+        optimizer,
+        step_size=config['step_size'],
+        gamma=config['gamma']
+    )
+
+    return optimizer, scheduler
+
+
+def create_criterion():
+    """Create loss function"""
+    return nn.CrossEntropyLoss()
+
+
+# -----------------------------
+# Checkpoints
+# -----------------------------
+def save_training_checkpoint(path, state):
+    """Write ``state`` atomically so a pre-emption mid-write never corrupts the last checkpoint"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_training_checkpoint(path, device):
+    """Return the checkpoint dict at ``path``, or None if there is none"""
+    if not Path(path).exists():
+        return None
+    return torch.load(path, map_location=device, weights_only=False)
+
+
+def _clone_state(model):
+    # state_dict() returns live tensors that the optimizer keeps updating in place
+    return {k: v.detach().clone() for k, v in model.state_dict().items()}
+
+
+def _append_metrics(path, record):
+    if path is None:
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+# -----------------------------
+# Training loop
+# -----------------------------
+def run_epoch(model, loader, criterion, device, optimizer=None, precision='fp32', channels_last=False):
+    """
+    One pass over ``loader``; trains when ``optimizer`` is given, evaluates otherwise.
+    ``precision`` 'bf16' runs the forward pass and loss under bf16 autocast.
+
+    Returns:
+        loss, accuracy (%), images seen, seconds
+    """
+    training = optimizer is not None
+    model.train(training)
+    running_loss, correct, total = 0.0, 0, 0
+    start = time.perf_counter()
+
+    with torch.set_grad_enabled(training):
+        for images, labels in loader:
+            images = prepare_input(images.to(device), channels_last)
+            labels = labels.to(device)
+
+            if training:
+                optimizer.zero_grad()
+            with autocast(precision, device.type):
+                outputs = model(images)
+                loss = criterion(outputs, labels)
+            if training:
+                loss.backward()
+                optimizer.step()
+
+            running_loss += loss.item()
+            _, predicted = torch.max(outputs, 1)
+            total += labels.size(0)
+            correct += (predicted == labels).sum().item()
+
+    elapsed = time.perf_counter() - start
+    return running_loss / max(1, len(loader)), 100 * correct / max(1, total), total, elapsed
+
+
+def train_model(model, train_loader, val_loader, model_name, config,
+                device=None, checkpoint_path=None, resume=False, metrics_path=None):
+    """
+    Train model with early stopping and best model saving
+
+    Args:
+        model: PyTorch model to train
+        train_loader: Training data loader
+        val_loader: Validation data loader
+        model_name: Name used in log output
+        config: Training configuration dictionary
+        device: torch device (default: CUDA if available)
+        checkpoint_path: where to write the per-epoch checkpoint (None disables it)
+        resume: continue from ``checkpoint_path`` if it exists
+        metrics_path: JSONL file that per-epoch metrics are appended to
+
+    Returns:
+        model: Trained model with the best weights restored
+        history: Training history
+    """
+    device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model.to(device)
+    precision, fallback_reason = resolve_precision(config.get('precision', 'fp32'), device.type)
+    if fallback_reason:
+        print(f"⚠️ bf16 requested but training in fp32: {fallback_reason}")
+    channels_last = config.get('channels_last', False)
+    prepare_model(model, channels_last)
+
+    # Initialize training components
+    criterion = create_criterion()
+    optimizer, scheduler = create_optimizer_and_scheduler(model, config)
+
+    # Training history
+    history = {
+        'train_loss': [],
+        'train_acc': [],
+        'val_loss': [],
+        'val_acc': [],
+        'train_images_per_sec': [],
+        'epoch_seconds': [],
+    }
+
+    # Early stopping variables
+    best_val_acc = 0.0
+    patience_counter = 0
+    best_model_state = None
+    start_epoch = 0
+
+    checkpoint = load_training_checkpoint(checkpoint_path, device) if resume and checkpoint_path else None
+    if checkpoint is not None:
+        model.load_state_dict(checkpoint['model_state_dict'])
+        optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
+        history = checkpoint['history']
+        best_val_acc = checkpoint['best_val_acc']
+        patience_counter = checkpoint['patience_counter']
+        best_model_state = checkpoint['best_model_state']
+        start_epoch = checkpoint['epoch'] + 1
+        torch.set_rng_state(checkpoint['torch_rng_state'])
+        print(f"⏯️ Resuming {model_name} from epoch {start_epoch + 1} "
+              f"(best validation accuracy so far: {best_val_acc:.2f}%)")
+        if checkpoint.get('stopped'):
+            print(f"✅ {model_name} already finished training")
+            start_epoch = config['num_epochs']
+
+    print(f"Starting training for {model_name}")
+    print("=" * 50)
+
+    for epoch in range(start_epoch, config['num_epochs']):
+        epoch_start = time.perf_counter()
+
+        train_loss, train_acc, train_images, train_seconds = run_epoch(
+            model, train_loader, criterion, device, optimizer, precision, channels_last
+        )
+        val_loss, val_acc, val_images, val_seconds = run_epoch(
+            model, val_loader, criterion, device, precision=precision, channels_last=channels_last
+        )
+
+        # Update learning rate
+        scheduler.step()
+
+        epoch_seconds = time.perf_counter() - epoch_start
+        train_ips = train_images / train_seconds if train_seconds > 0 else 0.0
+
+        # Save metrics
+        history['train_loss'].append(train_loss)
+        history['train_acc'].append(train_acc)
+        history['val_loss'].append(val_loss)
+        history['val_acc'].append(val_acc)
+        history['train_images_per_sec'].append(train_ips)
+        history['epoch_seconds'].append(epoch_seconds)
+
+        # Print epoch results
+        print(f"[{model_name}] Epoch {epoch+1}/{config['num_epochs']} "
+              f"- {epoch_seconds:.1f}s, {train_ips:.1f} train img/s, "
+              f"{val_images / val_seconds if val_seconds > 0 else 0.0:.1f} val img/s")
+        print(f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}%")
+        print(f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%")
+        print(f"Learning Rate: {optimizer.param_groups[0]['lr']:.6f}")
+
+        # Early stopping check
+        if val_acc > best_val_acc + config['min_delta']:
+            best_val_acc = val_acc
+            patience_counter = 0
+            best_model_state = _clone_state(model)
+            print(f"💾 New best model saved! Validation Accuracy: {best_val_acc:.2f}%")
+        else:
+            patience_counter += 1
+            print(f"⏳ Patience: {patience_counter}/{config['patience']}")
+
+        stopped = patience_counter >= config['patience']
+
+        _append_metrics(metrics_path, {
+            'model': model_name,
+            'epoch': epoch + 1,
+            'train_loss': train_loss,
+            'train_acc': train_acc,
+            'val_loss': val_loss,
+            'val_acc': val_acc,
+            'lr': optimizer.param_groups[0]['lr'],
+            'train_images_per_sec': train_ips,
+            'val_images_per_sec': val_images / val_seconds if val_seconds > 0 else 0.0,
+            'epoch_seconds': epoch_seconds,
+        })
+
+        if checkpoint_path:
+            save_training_checkpoint(checkpoint_path, {
+                'epoch': epoch,
+                'model_state_dict': model.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'scheduler_state_dict': scheduler.state_dict(),
+                'history': history,
+                'best_val_acc': best_val_acc,
+                'best_model_state': best_model_state,
+                'patience_counter': patience_counter,
+                'torch_rng_state': torch.get_rng_state(),
+                'config': config,
+                'stopped': stopped,
+            })
+
+        if stopped:
+            print(f"🛑 Early stopping triggered after {epoch + 1} epochs")
+            break
+
+        print()
+
+    # Load best model
+    if best_model_state is not None:
+        model.load_state_dict(best_model_state)
+        print(f"✅ Best model restored with validation accuracy: {best_val_acc:.2f}%")
+
+    return model, history
+
+
+# -----------------------------
+# Task runner
+# -----------------------------
+def build_dataset(task, data_dir, cache_dir=None):
+    """Raw dataset for ``task``, or the pre-decoded shard cache when ``cache_dir`` is given"""
+    dataset = CattleBreedDataset(data_dir, task=task)
+    if cache_dir is None:
+        return dataset
+    from training.shard_cache import ensure_shard_cache, ShardCacheDataset
+    ensure_shard_cache(dataset, Path(cache_dir) / task)
+    return ShardCacheDataset(Path(cache_dir) / task)
+
+
+def train_task(task, data_dir, run_dir, models_dir, config, resume=False, cache_dir=None, threads=None):
+    """
+    Train one task end to end and write its production checkpoint.
+
+    Returns:
+        history: training history of the task
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(config['seed'])
+
+    task_dir = Path(run_dir) / task
+    classes, _ = task_classes(task)
+    model_name = f"{task.capitalize()} Classifier"
+
+    dataset = build_dataset(task, data_dir, cache_dir)
+    train_loader, val_loader = create_data_loaders(dataset, config)
+
+    run_start = time.perf_counter()
+    model, history = train_model(
+        create_model(num_classes=len(classes), pretrained=True),
+        train_loader,
+        val_loader,
+        model_name,
+        config,
+        checkpoint_path=task_dir / CHECKPOINT_FILE,
+        resume=resume,
+        metrics_path=task_dir / METRICS_FILE,
+    )
+
+    save_path = Path(models_dir) / MODEL_FILENAMES[task]
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(model.cpu().state_dict(), save_path)
+    print(f"✅ {model_name} saved to {save_path} "
+          f"({time.perf_counter() - run_start:.0f}s wall time this run)")
+    return history
+
+
+def _train_task_process(task, kwargs):
+    train_task(task, **kwargs)
+
+
+def run_training(tasks, data_dir, run_dir, models_dir, config, resume=False,
+                 cache_dir=None, parallel=False):
+    """
+    Train ``tasks`` one after the other, or concurrently in one process per
+    task with the CPU threads split evenly between them.
+
+    Returns:
+        failed: list of tasks whose training did not complete
+    """
+    if not parallel or len(tasks) == 1:
+        failed = []
+        for task in tasks:
+            try:
+                train_task(task, data_dir, run_dir, models_dir, config, resume, cache_dir)
+            except Exception as e:
+                print(f"❌ Error training {task} classifier: {e}")
+                failed.append(task)
+        return failed
+
+    # Loader workers are counted inside each task's share, not added on top of it
+    threads, num_workers = split_cpu_budget(max(1, available_cpus() // len(tasks)), config.get('num_workers'))
+    task_config = dict(config, num_workers=num_workers)
+
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    for task in tasks:
+        kwargs = dict(data_dir=data_dir, run_dir=run_dir, models_dir=models_dir, config=task_config,
+                      resume=resume, cache_dir=cache_dir, threads=threads)
+        process = context.Process(target=_train_task_process, args=(task, kwargs), name=f"train-{task}")
+        process.start()
+        processes[task] = process
+        print(f"🚀 Training {task} classifier in process {process.pid} with {threads} threads "
+              f"and {num_workers} loader workers")
+
+    failed = []
+    for task, process in processes.items():
+        process.join()
+        if process.exitcode != 0:
+            print(f"❌ {task} training exited with code {process.exitcode}")
+            failed.append(task)
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the cattle and breed classifiers")
+    parser.add_argument('--data', required=True, help="dataset root with one directory per class")
+    parser.add_argument('--tasks', nargs='+', choices=['cattle', 'breed'], default=['cattle', 'breed'])
+    parser.add_argument('--run-dir', default='runs/latest', help="checkpoints and metrics logs")
+    parser.add_argument('--models-dir', default='models', help="where production checkpoints are written")
+    parser.add_argument('--cache-dir', help="train from the pre-decoded shard cache under this directory")
+    parser.add_argument('--resume', action='store_true', help="continue from the last epoch checkpoint")
+    parser.add_argument('--parallel', action='store_true', help="train the tasks concurrently")
+    parser.add_argument('--epochs', type=int, help="override num_epochs")
+    parser.add_argument('--batch-size', type=int, help="override batch_size")
+    parser.add_argument('--lr', type=float, help="override learning_rate")
+    parser.add_argument('--workers', type=int, help="override num_workers")
+    parser.add_argument('--split-dir', help="override split_dir")
+    parser.add_argument('--precision', choices=['fp32', 'bf16'], help="override precision")
+    parser.add_argument('--channels-last', action='store_true', default=None, help="use channels-last tensors")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = dict(TRAINING_CONFIG)
+    overrides = {'num_epochs': args.epochs, 'batch_size': args.batch_size,
+                 'learning_rate': args.lr, 'num_workers': args.workers,
+                 'split_dir': args.split_dir, 'precision': args.precision,
+                 'channels_last': args.channels_last}
+    config.update({k: v for k, v in overrides.items() if v is not None})
+
+    failed = run_training(args.tasks, args.data, args.run_dir, args.models_dir, config,
+                          resume=args.resume, cache_dir=args.cache_dir, parallel=args.parallel)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
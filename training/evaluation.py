@@ -0,0 +1,261 @@
+"""
+Checkpoint evaluation on the stored validation split.
+
+The notebook's ``evaluate_model`` re-decoded and re-transformed the whole
+validation set on every call and computed top-3 accuracy one sample at a time
+with ``np.argsort``. Here validation images come from the preprocessed cache
+in ``training.splits``, logits are cached per (validation set, checkpoint)
+and every metric is computed from the logits with whole-array tensor ops, so
+re-evaluating or comparing checkpoints that were already scored takes no
+forward pass at all.
+
+Usage:
+    python -m training.evaluation --task breed --data ./data/indian-bovine-breeds \\
+        --cache-dir ./data/cache --checkpoint models/breed_classifier.pth runs/latest/breed/checkpoint.pth
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from mixed_precision import autocast, prepare_input, prepare_model, resolve_precision
+from training.data_pipeline import DEFAULT_SPLIT_DIR, loader_kwargs
+from training.datasets import task_classes, val_transforms
+from training.models import create_model
+from training.splits import (
+    CachedValidationDataset, SplitManager, TransformSubset, validation_cache_prefix
+)
+
+LOGITS_DIR = 'logits'
+
+
+def checkpoint_digest(path):
+    """Content hash of a checkpoint file, so retrained weights under the same name get new logits"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def load_checkpoint_state(path, use_last=False):
+    """
+    Model weights from either a production checkpoint (a bare state dict) or
+    a training checkpoint written by training.engine.
+
+    Args:
+        path: checkpoint file
+        use_last: for training checkpoints, take the last epoch's weights
+            instead of the best validation weights
+
+    Returns:
+        state_dict
+    """
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+    if 'model_state_dict' not in checkpoint:
+        return checkpoint
+    if not use_last and checkpoint.get('best_model_state') is not None:
+        return checkpoint['best_model_state']
+    return checkpoint['model_state_dict']
+
+
+def compute_logits(model, data_loader, device, precision='fp32', channels_last=False):
+    """Run ``model`` over ``data_loader`` once and return (logits, labels) as CPU tensors"""
+    model.eval()
+    all_logits, all_labels = [], []
+    with torch.no_grad(), autocast(precision, device.type):
+        for images, labels in data_loader:
+            images = prepare_input(images.to(device), channels_last)
+            all_logits.append(model(images).float().cpu())
+            all_labels.append(labels)
+    return torch.cat(all_logits), torch.cat(all_labels)
+
+
+def compute_metrics(logits, labels, num_classes, top_k=(3,)):
+    """
+    Accuracy, top-k accuracy, per-class precision/recall/F1 and the confusion
+    matrix, computed with whole-array tensor ops.
+
+    Args:
+        logits: [N, C] tensor (probabilities work too; only the ranking matters)
+        labels: [N] tensor of class indices
+        num_classes: C
+        top_k: k values for top-k accuracy
+
+    Returns:
+        metrics: dict of floats and numpy arrays
+    """
+    logits = torch.as_tensor(logits)
+    labels = torch.as_tensor(labels).long()
+    predictions = logits.argmax(dim=1)
+
+    # Row = actual, column = predicted, as in sklearn.metrics.confusion_matrix
+    cm = torch.bincount(labels * num_classes + predictions,
+                        minlength=num_classes * num_classes).view(num_classes, num_classes)
+    true_positives = cm.diag().double()
+    predicted_counts = cm.sum(dim=0).double()
+    support = cm.sum(dim=1).double()
+    # Classes that were never predicted (or never occur) score 0, like zero_division=0
+    precision = torch.where(predicted_counts > 0, true_positives / predicted_counts.clamp(min=1), 0.0)
+    recall = torch.where(support > 0, true_positives / support.clamp(min=1), 0.0)
+    f1 = torch.where(precision + recall > 0,
+                     2 * precision * recall / (precision + recall).clamp(min=1e-12), 0.0)
+
+    metrics = {
+        'samples': int(labels.numel()),
+        'accuracy': float((predictions == labels).double().mean()) if labels.numel() else 0.0,
+        'precision': precision.numpy(),
+        'recall': recall.numpy(),
+        'f1': f1.numpy(),
+        'support': support.long().numpy(),
+        'confusion_matrix': cm.numpy(),
+        'macro_precision': float(precision.mean()),
+        'macro_recall': float(recall.mean()),
+        'macro_f1': float(f1.mean()),
+    }
+    for k in top_k:
+        k_eff = min(k, num_classes)
+        hits = (logits.topk(k_eff, dim=1).indices == labels.unsqueeze(1)).any(dim=1)
+        metrics[f'top{k}_accuracy'] = float(hits.double().mean()) if labels.numel() else 0.0
+    return metrics
+
+
+def format_report(metrics, class_names):
+    """Per-class precision/recall/F1 table in the layout of sklearn's classification_report"""
+    width = max(len('macro avg'), *(len(name) for name in class_names))
+    lines = [f"{'':>{width}}  precision    recall  f1-score   support", ""]
+    for i, name in enumerate(class_names):
+        lines.append(f"{name:>{width}}  {metrics['precision'][i]:9.2f} {metrics['recall'][i]:9.2f} "
+                     f"{metrics['f1'][i]:9.2f} {metrics['support'][i]:9d}")
+    lines.append("")
+    lines.append(f"{'accuracy':>{width}}  {'':9} {'':9} {metrics['accuracy']:9.2f} {metrics['samples']:9d}")
+    lines.append(f"{'macro avg':>{width}}  {metrics['macro_precision']:9.2f} {metrics['macro_recall']:9.2f} "
+                 f"{metrics['macro_f1']:9.2f} {metrics['samples']:9d}")
+    return "\n".join(lines)
+
+
+def validation_dataset(dataset, config):
+    """The validation view of ``dataset`` for the stored split, from the preprocessed cache if enabled"""
+    split_dir = config.get('split_dir') or DEFAULT_SPLIT_DIR
+    _, val_indices, split_id = SplitManager(split_dir).get_split(
+        dataset, config['train_split'], config.get('seed', 42)
+    )
+    view = TransformSubset(dataset, val_indices, val_transforms)
+    if config.get('cache_val', True) and len(view):
+        return CachedValidationDataset(view, validation_cache_prefix(dataset, split_dir, split_id)), split_id
+    return view, split_id
+
+
+def evaluate_checkpoint(checkpoint_path, val_dataset, val_key, num_classes, logits_dir,
+                        device=None, batch_size=64, num_workers=None, use_last=False, top_k=(3,),
+                        precision='fp32', channels_last=False):
+    """
+    Metrics for one checkpoint on ``val_dataset``. Logits are stored under
+    ``logits_dir`` keyed by ``val_key``, the checkpoint's content hash and the
+    precision, and reused on the next call.
+
+    Returns:
+        metrics: see ``compute_metrics``, plus 'checkpoint', 'compute_precision', 'cached' and 'seconds'
+    """
+    start = time.perf_counter()
+    device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    precision, _ = resolve_precision(precision, device.type)
+    state = 'last' if use_last else 'best'
+    cache_path = Path(logits_dir) / f"{val_key}-{checkpoint_digest(checkpoint_path)}-{state}-{precision}.npz"
+
+    cached = cache_path.exists()
+    if cached:
+        stored = np.load(cache_path)
+        logits, labels = torch.from_numpy(stored['logits']), torch.from_numpy(stored['labels'])
+    else:
+        model = create_model(num_classes=num_classes, pretrained=False)
+        model.load_state_dict(load_checkpoint_state(checkpoint_path, use_last))
+        prepare_model(model.to(device), channels_last)
+        loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False,
+                            **loader_kwargs(num_workers))
+        logits, labels = compute_logits(model, loader, device, precision, channels_last)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(cache_path, logits=logits.numpy(), labels=labels.numpy())
+
+    metrics = compute_metrics(logits, labels, num_classes, top_k)
+    metrics.update(checkpoint=str(checkpoint_path), compute_precision=precision, cached=cached,
+                   seconds=time.perf_counter() - start)
+    return metrics
+
+
+def _json_ready(metrics, class_names):
+    result = {k: v for k, v in metrics.items() if not isinstance(v, np.ndarray)}
+    result['per_class'] = {
+        name: {'precision': float(metrics['precision'][i]), 'recall': float(metrics['recall'][i]),
+               'f1': float(metrics['f1'][i]), 'support': int(metrics['support'][i])}
+        for i, name in enumerate(class_names)
+    }
+    result['confusion_matrix'] = metrics['confusion_matrix'].tolist()
+    return result
+
+
+def main():
+    from training.engine import TRAINING_CONFIG, build_dataset
+
+    parser = argparse.ArgumentParser(description="Evaluate checkpoints on the stored validation split")
+    parser.add_argument('--checkpoint', nargs='+', required=True, help="production or training checkpoints")
+    parser.add_argument('--task', choices=['breed', 'cattle'], required=True)
+    parser.add_argument('--data', required=True, help="dataset root with one directory per class")
+    parser.add_argument('--cache-dir', help="use the pre-decoded shard cache under this directory")
+    parser.add_argument('--split-dir', default=TRAINING_CONFIG['split_dir'])
+    parser.add_argument('--top-k', type=int, nargs='+', default=[3, 5])
+    parser.add_argument('--last', action='store_true',
+                        help="for training checkpoints, score the last epoch instead of the best one")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--precision', nargs='+', choices=['fp32', 'bf16'], default=['fp32'],
+                        help="score each checkpoint at every listed precision")
+    parser.add_argument('--channels-last', action='store_true')
+    parser.add_argument('--report', action='store_true', help="print the per-class report")
+    parser.add_argument('--output', help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    config = dict(TRAINING_CONFIG, split_dir=args.split_dir)
+    classes, _ = task_classes(args.task)
+    dataset = build_dataset(args.task, args.data, args.cache_dir)
+    val_dataset, split_id = validation_dataset(dataset, config)
+    # Split and image content in both modes; the cached uint8 tensors are tagged
+    # apart from images decoded on the fly, whose logits differ slightly
+    if isinstance(val_dataset, CachedValidationDataset):
+        val_key = val_dataset.images_path.stem
+    else:
+        val_key = validation_cache_prefix(dataset, args.split_dir, split_id).name + '-uncached'
+    logits_dir = Path(args.split_dir) / LOGITS_DIR
+
+    results = []
+    header = f"{'checkpoint':<48} {'acc':>7} " + " ".join(f"{f'top{k}':>7}" for k in args.top_k) \
+        + f" {'macro F1':>9} {'seconds':>8}"
+    print(header)
+    for checkpoint in args.checkpoint:
+        for precision in args.precision:
+            metrics = evaluate_checkpoint(checkpoint, val_dataset, val_key, len(classes), logits_dir,
+                                          batch_size=args.batch_size, num_workers=args.workers,
+                                          use_last=args.last, top_k=args.top_k, precision=precision,
+                                          channels_last=args.channels_last)
+            results.append(_json_ready(metrics, classes))
+            top = " ".join(f"{metrics[f'top{k}_accuracy']:>7.2%}" for k in args.top_k)
+            source = " (cached)" if metrics['cached'] else ""
+            label = f"{checkpoint} [{metrics['compute_precision']}]"
+            print(f"{label:<48} {metrics['accuracy']:>7.2%} {top} {metrics['macro_f1']:>9.3f} "
+                  f"{metrics['seconds']:>8.2f}{source}")
+            if args.report:
+                print(format_report(metrics, classes))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'task': args.task, 'split': split_id, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Frozen-backbone feature store for fast head retraining.
+
+Adding a breed or relabelling images used to mean retraining the whole
+ResNet-18 for up to 50 epochs. The backbone is frozen in that case anyway, so
+this module runs the frozen prefix once per image (plus optional augmented
+views) and stores its output in a memory-mapped float16 array. Only the
+trainable suffix is then trained on those features with the regular training
+loop:
+
+    --unfreeze none     cache the pooled 512-d features, train ``fc`` only
+    --unfreeze layer4   cache layer3 output (256×14×14), train layer4 + ``fc``
+    --unfreeze layer3   cache layer2 output (128×28×28), train layer3, layer4 + ``fc``
+
+Store layout (one directory per task, backbone, unfreeze mode and view count):
+    features.f16   float16 array of shape [views, N, *feature_shape]
+    labels.npy     int64 labels, shape [N]
+    index.json     shape, data fingerprint, augmented view count and build time
+
+Usage:
+    python -m training.features --task breed --data ./data/indian-bovine-breeds \\
+        --cache-dir ./data/cache --backbone models/breed_classifier.pth --augmentations 2
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+
+from training.data_pipeline import DEFAULT_SPLIT_DIR, loader_kwargs
+from training.datasets import task_classes, train_transforms, val_transforms
+from training.evaluation import checkpoint_digest, load_checkpoint_state
+from training.models import MODEL_FILENAMES, create_model
+from training.splits import SplitManager, TransformSubset, content_fingerprint
+
+FEATURES_FILE = 'features.f16'
+LABELS_FILE = 'labels.npy'
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+
+BACKBONE_STAGES = ('conv1', 'bn1', 'relu', 'maxpool', 'layer1', 'layer2', 'layer3', 'layer4')
+UNFREEZE_LAYERS = {
+    'none': (),
+    'layer4': ('layer4',),
+    'layer3': ('layer3', 'layer4'),
+}
+
+# Head training defaults: the head is tiny, so bigger batches and fewer epochs
+HEAD_TRAINING_CONFIG = {
+    'batch_size': 256,
+    'num_epochs': 30,
+    'patience': 8,
+    'step_size': 10,
+}
+
+
+def split_model(model, unfreeze='none'):
+    """
+    Split a ResNet-18 into a frozen prefix and a trainable head.
+
+    Both halves share their modules with ``model``, and the head keeps the
+    torchvision module names, so training the head updates ``model`` in place.
+
+    Returns:
+        frozen: nn.Sequential producing the cached features
+        head: nn.Sequential from those features to the class logits
+    """
+    trainable = UNFREEZE_LAYERS[unfreeze]
+    frozen = nn.Sequential(OrderedDict(
+        (name, getattr(model, name)) for name in BACKBONE_STAGES if name not in trainable
+    ))
+    pooling = [('avgpool', model.avgpool), ('flatten', nn.Flatten())]
+    if trainable:
+        head = nn.Sequential(OrderedDict(
+            [(name, getattr(model, name)) for name in trainable] + pooling + [('fc', model.fc)]
+        ))
+    else:
+        for name, module in pooling:
+            frozen.add_module(name, module)
+        head = nn.Sequential(OrderedDict([('fc', model.fc)]))
+
+    for param in frozen.parameters():
+        param.requires_grad = False
+    frozen.eval()
+    return frozen, head
+
+
+def load_backbone(num_classes, backbone='imagenet'):
+    """
+    ResNet-18 with a fresh ``fc`` for ``num_classes`` on top of either the
+    ImageNet weights or the backbone of an existing checkpoint.
+
+    Returns:
+        model, backbone_id (a short name used to key the feature store)
+    """
+    if backbone == 'imagenet':
+        return create_model(num_classes=num_classes, pretrained=True), 'imagenet'
+
+    model = create_model(num_classes=num_classes, pretrained=False)
+    state = load_checkpoint_state(backbone)
+    # The class count may have changed, so the old fc is never reused
+    state = {k: v for k, v in state.items() if not k.startswith('fc.')}
+    model.load_state_dict(state, strict=False)
+    return model, checkpoint_digest(backbone)
+
+
+def load_index(store_dir):
+    """Return the store index, or None if there is no complete store in ``store_dir``"""
+    try:
+        with open(Path(store_dir) / INDEX_FILE) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != STORE_VERSION or not (Path(store_dir) / FEATURES_FILE).exists():
+        return None
+    return index
+
+
+def build_feature_store(dataset, store_dir, frozen, augmentations=0, batch_size=64,
+                        num_workers=None, seed=42, device=None):
+    """
+    Run ``frozen`` over every image of ``dataset`` once per view and store the output.
+
+    View 0 uses ``val_transforms``; views 1..``augmentations`` use
+    ``train_transforms`` with a fixed seed per view (``seed + view``), so a
+    rebuild reproduces the same augmentations with or without workers.
+
+    Returns:
+        index: the contents written to index.json
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    (store_dir / INDEX_FILE).unlink(missing_ok=True)
+    device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    frozen.to(device)
+
+    views = [val_transforms] + [train_transforms] * augmentations
+    start = time.perf_counter()
+    features = None
+    tmp_path = store_dir / (FEATURES_FILE + '.tmp')
+
+    with torch.no_grad():
+        for view, transform in enumerate(views):
+            # Seeds the main process, which applies the transforms when
+            # num_workers is 0; workers are seeded from the generator instead
+            torch.manual_seed(seed + view)
+            np.random.seed(seed + view)
+            random.seed(seed + view)
+            loader = DataLoader(TransformSubset(dataset, range(len(dataset)), transform),
+                                batch_size=batch_size, shuffle=False,
+                                generator=torch.Generator().manual_seed(seed + view),
+                                **loader_kwargs(num_workers))
+            row = 0
+            for images, _ in loader:
+                output = frozen(images.to(device)).cpu().numpy()
+                if features is None:
+                    shape = (len(views), len(dataset)) + output.shape[1:]
+                    features = np.memmap(tmp_path, dtype=np.float16, mode='w+', shape=shape)
+                features[view, row:row + len(output)] = output
+                row += len(output)
+            print(f"  view {view + 1}/{len(views)} done ({time.perf_counter() - start:.1f}s)")
+
+    features.flush()
+    shape = list(features.shape)
+    del features
+    tmp_path.replace(store_dir / FEATURES_FILE)
+    np.save(store_dir / LABELS_FILE, np.asarray([label for _, label in dataset.samples], dtype=np.int64))
+
+    index = {
+        'version': STORE_VERSION,
+        'task': dataset.task,
+        'shape': shape,
+        'fingerprint': content_fingerprint(dataset),
+        'augmentations': augmentations,
+        'build_seconds': time.perf_counter() - start,
+    }
+    with open(store_dir / INDEX_FILE, 'w') as f:
+        json.dump(index, f)
+    print(f"✅ Stored {shape[0]}×{shape[1]} feature maps of shape {tuple(shape[2:])} "
+          f"in {index['build_seconds']:.1f}s -> {store_dir}")
+    return index
+
+
+def ensure_feature_store(dataset, store_dir, frozen, augmentations=0, **kwargs):
+    """Build the feature store unless an up-to-date one already exists in ``store_dir``"""
+    index = load_index(store_dir)
+    if (index is not None and index['task'] == dataset.task
+            and index['augmentations'] == augmentations
+            and index['fingerprint'] == content_fingerprint(dataset)):
+        print(f"✅ Using existing feature store: {store_dir}")
+        return index
+    return build_feature_store(dataset, store_dir, frozen, augmentations, **kwargs)
+
+
+class FeatureStoreDataset(Dataset):
+    """
+    (feature, label) pairs for ``indices`` across ``views`` of a feature store.
+
+    The memory map is opened lazily in each process, like ShardCacheDataset.
+    """
+
+    def __init__(self, store_dir, indices, views=(0,)):
+        self.store_dir = Path(store_dir)
+        self.index = load_index(self.store_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"No feature store found in {self.store_dir}")
+        self.labels = np.load(self.store_dir / LABELS_FILE)
+        self.rows = [(view, idx) for view in views for idx in indices]
+        self._features = None
+
+    @property
+    def features(self):
+        if self._features is None:
+            self._features = np.memmap(self.store_dir / FEATURES_FILE, dtype=np.float16, mode='r',
+                                       shape=tuple(self.index['shape']))
+        return self._features
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        view, idx = self.rows[i]
+        return torch.from_numpy(self.features[view, idx].astype(np.float32)), int(self.labels[idx])
+
+
+def train_head(task, data_dir, store_root, run_dir, models_dir, config, unfreeze='none',
+               augmentations=0, backbone='imagenet', cache_dir=None, resume=False):
+    """
+    Retrain the trainable head of ``task`` from the feature store and write
+    the full model to its production checkpoint.
+
+    Returns:
+        history: training history of the head
+    """
+    from training.engine import CHECKPOINT_FILE, METRICS_FILE, build_dataset, train_model
+
+    torch.manual_seed(config['seed'])
+    classes, _ = task_classes(task)
+    dataset = build_dataset(task, data_dir, cache_dir)
+    model, backbone_id = load_backbone(len(classes), backbone)
+    frozen, head = split_model(model, unfreeze)
+
+    views = 1 + augmentations
+    store_dir = Path(store_root) / task / f"{backbone_id}-{unfreeze}-{views}v"
+    ensure_feature_store(dataset, store_dir, frozen, augmentations,
+                         num_workers=config.get('num_workers'), seed=config['seed'])
+
+    split_dir = config.get('split_dir') or DEFAULT_SPLIT_DIR
+    train_indices, val_indices, _ = SplitManager(split_dir).get_split(
+        dataset, config['train_split'], config['seed']
+    )
+    # Features are already in the page cache; worker processes would only add IPC
+    train_loader = DataLoader(FeatureStoreDataset(store_dir, train_indices, range(views)),
+                              batch_size=config['batch_size'], shuffle=True, **loader_kwargs(0))
+    val_loader = DataLoader(FeatureStoreDataset(store_dir, val_indices),
+                            batch_size=config['batch_size'], shuffle=False, **loader_kwargs(0))
+    print(f"Head training samples: {len(train_loader.dataset)} ({views} views), "
+          f"validation samples: {len(val_loader.dataset)}")
+
+    task_dir = Path(run_dir) / f"{task}-head-{unfreeze}"
+    start = time.perf_counter()
+    head, history = train_model(
+        head, train_loader, val_loader, f"{task.capitalize()} Head ({unfreeze})", config,
+        checkpoint_path=task_dir / CHECKPOINT_FILE, resume=resume, metrics_path=task_dir / METRICS_FILE,
+    )
+
+    # The head shares its modules with ``model``, which now holds the trained weights
+    save_path = Path(models_dir) / MODEL_FILENAMES[task]
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(model.cpu().state_dict(), save_path)
+    print(f"✅ {task.capitalize()} model saved to {save_path} "
+          f"(head trained in {time.perf_counter() - start:.1f}s)")
+    return history
+
+
+def main():
+    from training.engine import TRAINING_CONFIG
+
+    parser = argparse.ArgumentParser(description="Retrain the classifier head from cached backbone features")
+    parser.add_argument('--task', choices=['breed', 'cattle'], required=True)
+    parser.add_argument('--data', required=True, help="dataset root with one directory per class")
+    parser.add_argument('--cache-dir', help="read images from the pre-decoded shard cache under this directory")
+    parser.add_argument('--store-dir', default='data/features', help="where feature stores are kept")
+    parser.add_argument('--backbone', default='imagenet',
+                        help="'imagenet' or a checkpoint whose backbone is reused (its fc is dropped)")
+    parser.add_argument('--unfreeze', choices=sorted(UNFREEZE_LAYERS), default='none',
+                        help="layers trained on top of the cached features")
+    parser.add_argument('--augmentations', type=int, default=0,
+                        help="augmented views cached per image in addition to the plain one")
+    parser.add_argument('--run-dir', default='runs/latest')
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--epochs', type=int)
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--lr', type=float)
+    parser.add_argument('--workers', type=int, help="loader workers while building the store")
+    args = parser.parse_args()
+
+    config = dict(TRAINING_CONFIG, **HEAD_TRAINING_CONFIG)
+    overrides = {'num_epochs': args.epochs, 'batch_size': args.batch_size,
+                 'learning_rate': args.lr, 'num_workers': args.workers}
+    config.update({k: v for k, v in overrides.items() if v is not None})
+
+    train_head(args.task, args.data, args.store_dir, args.run_dir, args.models_dir, config,
+               unfreeze=args.unfreeze, augmentations=args.augmentations, backbone=args.backbone,
+               cache_dir=args.cache_dir, resume=args.resume)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Fine-tune a production model on labelled hard examples.
+
+``hard_examples.py`` captures low-confidence and user-flagged predictions from
+the app and ranks them for labelling. Once the 'label' column of its CSV is
+filled in, this module fine-tunes the current production checkpoint on just
+those images at a low learning rate, instead of a full retrain.
+
+Fine-tuning on a few hundred hard images alone tends to forget the rest of
+the data. With ``--data`` each epoch also replays a random sample of the
+original training split (``--replay`` images per labelled example) and the
+model is validated on the original stored validation split, so the reported
+accuracy shows whether the fine-tune helped overall. Without ``--data`` a
+stratified part of the labelled examples is held out instead.
+
+Usage:
+    python hard_examples.py --task breed --limit 200 --output labelling.csv
+    # ... fill in the 'label' column ...
+    python -m training.finetune --task breed --labels labelling.csv --data ./data/indian-bovine-breeds
+"""
+
+import argparse
+import csv
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import ConcatDataset, DataLoader, Dataset
+
+from training.data_pipeline import DEFAULT_SPLIT_DIR, create_data_loaders, loader_kwargs
+from training.datasets import task_classes, train_transforms, val_transforms
+from training.evaluation import load_checkpoint_state
+from training.models import MODEL_FILENAMES, create_model
+from training.splits import SplitManager, TransformSubset, stratified_split
+
+# Overrides of training.engine's TRAINING_CONFIG: the model is already trained
+FINETUNE_CONFIG = {
+    'learning_rate': 1e-4,
+    'num_epochs': 5,
+    'patience': 3,
+    'step_size': 5,
+}
+
+
+def _normalise_label(name):
+    # The app names breeds 'Brown_Swiss', the training code 'Brown Swiss'
+    return name.strip().replace('_', ' ').lower()
+
+
+def read_labelled_examples(labels_path, task, class_to_idx):
+    """
+    Labelled rows of ``task`` from a hard-example labelling CSV.
+
+    Returns:
+        samples: list of (image path, label index)
+        skipped: list of (image path, label) whose label is not a class of ``task``
+    """
+    lookup = {_normalise_label(name): idx for name, idx in class_to_idx.items()}
+    samples, skipped, seen = [], [], set()
+    with open(labels_path, newline='') as f:
+        for row in csv.DictReader(f):
+            label = (row.get('label') or '').strip()
+            if row['task'] != task or not label or row['image'] in seen:
+                continue
+            seen.add(row['image'])
+            if _normalise_label(label) in lookup:
+                samples.append((row['image'], lookup[_normalise_label(label)]))
+            else:
+                skipped.append((row['image'], label))
+    return samples, skipped
+
+
+class LabelledImageDataset(Dataset):
+    """Untransformed (image, label) pairs from an explicit sample list"""
+
+    def __init__(self, samples):
+        self.samples = list(samples)
+        self.transform = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        img_path, label = self.samples[idx]
+        with Image.open(img_path) as img:
+            return img.convert('RGB'), label
+
+
+def create_finetune_loaders(hard_dataset, config, replay_dataset=None, replay=4):
+    """
+    Training loader over the hard examples (plus replayed original training
+    images) and a validation loader.
+
+    Returns:
+        train_loader, val_loader
+    """
+    kwargs = loader_kwargs(config.get('num_workers'), config.get('prefetch_factor'))
+    if replay_dataset is None:
+        train_indices, val_indices = stratified_split(hard_dataset.samples, config['train_split'], config['seed'])
+        train_dataset = TransformSubset(hard_dataset, train_indices, train_transforms)
+        val_dataset = TransformSubset(hard_dataset, val_indices, val_transforms)
+    else:
+        # The original validation split (and its cached tensors) measures the model as a whole
+        _, val_loader = create_data_loaders(replay_dataset, config)
+        val_dataset = val_loader.dataset
+        split_dir = config.get('split_dir') or DEFAULT_SPLIT_DIR
+        original_train, _, _ = SplitManager(split_dir).get_split(
+            replay_dataset, config['train_split'], config['seed']
+        )
+        rng = np.random.default_rng(config['seed'])
+        n_replay = min(len(original_train), replay * len(hard_dataset))
+        replay_indices = sorted(rng.choice(original_train, size=n_replay, replace=False).tolist())
+        train_dataset = ConcatDataset([
+            TransformSubset(hard_dataset, range(len(hard_dataset)), train_transforms),
+            TransformSubset(replay_dataset, replay_indices, train_transforms),
+        ])
+
+    train_loader = DataLoader(train_dataset, batch_size=config['batch_size'], shuffle=True, **kwargs)
+    val_loader = DataLoader(val_dataset, batch_size=config['batch_size'], shuffle=False, **kwargs)
+    print(f"Fine-tuning samples: {len(train_dataset)}, validation samples: {len(val_dataset)}")
+    return train_loader, val_loader
+
+
+def finetune(task, labels_path, run_dir, models_dir, config, data_dir=None, cache_dir=None,
+             replay=4, checkpoint=None, resume=False):
+    """
+    Fine-tune the production model of ``task`` on the labelled hard examples
+    and write it back to its production checkpoint.
+
+    Returns:
+        history: training history of the fine-tune
+    """
+    from training.engine import CHECKPOINT_FILE, METRICS_FILE, build_dataset, train_model
+
+    torch.manual_seed(config['seed'])
+    classes, class_to_idx = task_classes(task)
+    samples, skipped = read_labelled_examples(labels_path, task, class_to_idx)
+    if skipped:
+        print(f"⚠️ Skipping {len(skipped)} example(s) with unknown {task} labels:")
+        for path, label in skipped[:10]:
+            print(f"  - {path}: {label!r}")
+    if not samples:
+        raise ValueError(f"No labelled {task} examples in {labels_path}")
+
+    save_path = Path(models_dir) / MODEL_FILENAMES[task]
+    checkpoint = checkpoint or save_path
+    model = create_model(num_classes=len(classes), pretrained=False)
+    model.load_state_dict(load_checkpoint_state(checkpoint))
+    print(f"📝 Fine-tuning {checkpoint} on {len(samples)} labelled hard examples")
+
+    replay_dataset = build_dataset(task, data_dir, cache_dir) if data_dir else None
+    train_loader, val_loader = create_finetune_loaders(
+        LabelledImageDataset(samples), config, replay_dataset, replay
+    )
+
+    task_dir = Path(run_dir) / f"{task}-finetune"
+    start = time.perf_counter()
+    model, history = train_model(
+        model, train_loader, val_loader, f"{task.capitalize()} Fine-tune", config,
+        checkpoint_path=task_dir / CHECKPOINT_FILE, resume=resume, metrics_path=task_dir / METRICS_FILE,
+    )
+
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(model.cpu().state_dict(), save_path)
+    print(f"✅ {task.capitalize()} model saved to {save_path} "
+          f"(fine-tuned in {time.perf_counter() - start:.1f}s)")
+    return history
+
+
+def main():
+    from training.engine import TRAINING_CONFIG
+
+    parser = argparse.ArgumentParser(description="Fine-tune a production model on labelled hard examples")
+    parser.add_argument('--task', choices=['breed', 'cattle'], required=True)
+    parser.add_argument('--labels', required=True, help="labelling CSV written by hard_examples.py")
+    parser.add_argument('--data', help="original dataset root, replayed and used for validation")
+    parser.add_argument('--cache-dir', help="read the original images from the pre-decoded shard cache")
+    parser.add_argument('--replay', type=int, default=4, help="original images replayed per hard example")
+    parser.add_argument('--checkpoint', help="model to start from (default: the production checkpoint)")
+    parser.add_argument('--run-dir', default='runs/latest', help="checkpoints and metrics logs")
+    parser.add_argument('--models-dir', default='models', help="where production checkpoints are written")
+    parser.add_argument('--resume', action='store_true', help="continue from the last epoch checkpoint")
+    parser.add_argument('--epochs', type=int, help="override num_epochs")
+    parser.add_argument('--batch-size', type=int, help="override batch_size")
+    parser.add_argument('--lr', type=float, help="override learning_rate")
+    parser.add_argument('--workers', type=int, help="override num_workers")
+    args = parser.parse_args()
+
+    config = dict(TRAINING_CONFIG, **FINETUNE_CONFIG)
+    overrides = {'num_epochs': args.epochs, 'batch_size': args.batch_size,
+                 'learning_rate': args.lr, 'num_workers': args.workers}
+    config.update({k: v for k, v in overrides.items() if v is not None})
+
+    finetune(args.task, args.labels, args.run_dir, args.models_dir, config, data_dir=args.data,
+             cache_dir=args.cache_dir, replay=args.replay, checkpoint=args.checkpoint, resume=args.resume)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Persistent, incrementally updated dataset manifest.
+
+``CattleBreedDataset`` used to glob ``*.jpg`` in every class directory on each
+construction. That missed ``.jpeg``/``.png``/upper-case variants, was slow on
+network filesystems, and left unreadable files to a try/except in
+``__getitem__`` that trained on gray placeholders. The manifest records every
+image once (class, size, mtime, content hash, dimensions, whether it decodes)
+and is refreshed incrementally:
+
+- a class directory whose mtime is unchanged is not listed again
+- in a changed directory only new or modified files (size/mtime) are re-read
+- corrupt files and duplicate content are reported up front and excluded
+
+Directory mtimes only change when entries are added, removed or renamed, so
+files rewritten in place need ``--rescan``.
+
+Usage:
+    python -m training.manifest --data ./data/indian-bovine-breeds --task breed
+    python -m training.manifest --data ./data/indian-bovine-breeds --rescan
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+MANIFEST_DIR = Path('data/manifests')
+MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+def default_manifest_path(root_dir):
+    """One manifest per dataset root, named after it"""
+    root = Path(root_dir).resolve()
+    return MANIFEST_DIR / f"{root.name}-{hashlib.sha1(str(root).encode()).hexdigest()[:8]}.json"
+
+
+def inspect_image(path):
+    """
+    Hash ``path`` and check that it decodes.
+
+    Returns:
+        dict with sha1, width, height, format and error (None when the image is
+        usable); a file that cannot be read is recorded with its error too
+    """
+    entry = {'sha1': None, 'width': None, 'height': None, 'format': None, 'error': None}
+    try:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        entry['sha1'] = digest.hexdigest()
+        with Image.open(path) as img:
+            entry.update(width=img.width, height=img.height, format=img.format)
+            # A reduced-scale JPEG decode still reads the whole stream, so
+            # truncated files fail here without paying for a full decode
+            img.draft('RGB', (64, 64))
+            img.load()
+    except Exception as e:
+        entry['error'] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+def load_manifest(path):
+    """Return the manifest at ``path``, or an empty one if missing or outdated"""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None or manifest.get('version') != MANIFEST_VERSION:
+        manifest = {'version': MANIFEST_VERSION, 'dirs': {}, 'files': {}}
+    return manifest
+
+
+def _save_manifest(manifest, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def update_manifest(root_dir, class_names, manifest_path=None, rescan=False, workers=None):
+    """
+    Bring the manifest of ``root_dir`` up to date for ``class_names``.
+
+    Args:
+        root_dir: dataset root with one directory per class
+        class_names: class directories to index
+        manifest_path: manifest file (default: under data/manifests/)
+        rescan: stat every file even in directories whose mtime is unchanged
+        workers: threads hashing and verifying new files
+
+    Returns:
+        manifest: {'root', 'dirs': {class: mtime_ns}, 'files': {relative path: entry}}
+    """
+    root = Path(root_dir)
+    manifest_path = manifest_path or default_manifest_path(root)
+    manifest = load_manifest(manifest_path)
+    manifest['root'] = str(root.resolve())
+    files = manifest['files']
+    start = time.perf_counter()
+
+    to_inspect = []
+    changed_dirs = 0
+    for class_name in class_names:
+        class_dir = root / class_name
+        try:
+            dir_mtime = class_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime = None
+        if not rescan and manifest['dirs'].get(class_name) == dir_mtime:
+            continue
+        changed_dirs += 1
+
+        previous = {rel for rel, entry in files.items() if entry['class'] == class_name}
+        seen = set()
+        if dir_mtime is not None:
+            for item in os.scandir(class_dir):
+                if not item.is_file() or Path(item.name).suffix.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                rel = f"{class_name}/{item.name}"
+                stat = item.stat()
+                seen.add(rel)
+                entry = files.get(rel)
+                if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                    files[rel] = {'class': class_name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                    to_inspect.append(rel)
+        for rel in previous - seen:
+            del files[rel]
+        if dir_mtime is None:
+            manifest['dirs'].pop(class_name, None)
+        else:
+            manifest['dirs'][class_name] = dir_mtime
+
+    if to_inspect:
+        with ThreadPoolExecutor(max_workers=workers or min(16, (os.cpu_count() or 1) * 2)) as pool:
+            for rel, info in zip(to_inspect, pool.map(inspect_image, [root / rel for rel in to_inspect])):
+                files[rel].update(info)
+
+    if changed_dirs:
+        _save_manifest(manifest, manifest_path)
+    print(f"📇 Manifest: {len(files)} images, {changed_dirs} changed directories, "
+          f"{len(to_inspect)} files inspected in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def manifest_samples(manifest, root_dir, class_to_idx):
+    """
+    Training samples from ``manifest`` for the classes in ``class_to_idx``.
+
+    Corrupt files are dropped. Of byte-identical files within one class only
+    the first path is kept; content filed under several classes is dropped
+    entirely, since its label is ambiguous.
+
+    Returns:
+        samples: sorted list of (path, label) tuples
+        report: {'corrupt': [(path, error)], 'duplicates': [[paths]], 'conflicts': [[paths]]}
+    """
+    root = Path(root_dir)
+    by_hash = {}
+    corrupt = []
+    for rel, entry in sorted(manifest['files'].items()):
+        if entry['class'] not in class_to_idx:
+            continue
+        if entry['error']:
+            corrupt.append((str(root / rel), entry['error']))
+            continue
+        by_hash.setdefault(entry['sha1'], []).append(rel)
+
+    samples, duplicates, conflicts = [], [], []
+    for rels in by_hash.values():
+        classes = {manifest['files'][rel]['class'] for rel in rels}
+        if len(classes) > 1:
+            conflicts.append([str(root / rel) for rel in rels])
+            continue
+        if len(rels) > 1:
+            duplicates.append([str(root / rel) for rel in rels])
+        rel = rels[0]
+        samples.append((str(root / rel), class_to_idx[manifest['files'][rel]['class']]))
+
+    report = {'corrupt': corrupt, 'duplicates': duplicates, 'conflicts': conflicts}
+    return sorted(samples), report
+
+
+def print_report(report):
+    """Print the problems found while building the sample list"""
+    if report['corrupt']:
+        print(f"⚠️ Skipping {len(report['corrupt'])} corrupt image(s):")
+        for path, error in report['corrupt'][:10]:
+            print(f"  - {path}: {error}")
+    if report['duplicates']:
+        extra = sum(len(group) - 1 for group in report['duplicates'])
+        print(f"⚠️ Skipping {extra} duplicate image(s) in {len(report['duplicates'])} group(s)")
+    if report['conflicts']:
+        print(f"⚠️ Skipping {len(report['conflicts'])} image(s) filed under more than one class:")
+        for group in report['conflicts'][:10]:
+            print(f"  - {', '.join(group)}")
+
+
+def main():
+    from training.datasets import task_classes
+
+    parser = argparse.ArgumentParser(description="Build or refresh the dataset manifest")
+    parser.add_argument('--data', required=True, help="dataset root with one directory per class")
+    parser.add_argument('--task', choices=['breed', 'cattle'], default='breed')
+    parser.add_argument('--manifest', help="manifest file (default: under data/manifests/)")
+    parser.add_argument('--rescan', action='store_true', help="re-stat every file, not just changed directories")
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    classes, class_to_idx = task_classes(args.task)
+    manifest = update_manifest(args.data, classes, args.manifest, args.rescan, args.workers)
+    samples, report = manifest_samples(manifest, args.data, class_to_idx)
+    print(f"✅ {len(samples)} usable {args.task} samples")
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
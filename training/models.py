@@ -0,0 +1,33 @@
+"""
+Model construction for the cattle and breed classifiers.
+"""
+
+import torch.nn as nn
+from torchvision import models
+
+# Production checkpoint file names, as loaded by cattle_with_breed_classifier.py
+MODEL_FILENAMES = {
+    'cattle': 'best_cow_buffalo_none_classifier.pth',
+    'breed': 'breed_classifier.pth',
+}
+
+
+def create_model(num_classes, pretrained=True):
+    """
+    Create ResNet-18 model with transfer learning
+
+    Args:
+        num_classes: Number of output classes
+        pretrained: Whether to use pretrained weights
+
+    Returns:
+        model: PyTorch model
+    """
+    # Load pretrained ResNet-18
+    model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1 if pretrained else None)
+
+    # Replace the final fully connected layer
+    num_features = model.fc.in_features
+    model.fc = nn.Linear(num_features, num_classes)
+
+    return model
@@ -0,0 +1,227 @@
+"""
+Pre-decoded, pre-resized training image cache.
+
+Every epoch used to decode each full-size JPEG only for ``train_transforms``
+to immediately resize it to 256×256. This module decodes and resizes every
+image once, in parallel, into a packed uint8 array that is memory-mapped at
+training time. Reading a sample is then a page-cache lookup, with no decode
+and no resize.
+
+Cache layout (one directory per dataset/task):
+    images.u8    raw uint8 array of shape [N, 256, 256, 3]
+    labels.npy   int64 labels, shape [N]
+    index.json   task, classes, shape, source paths and a fingerprint of the
+                 source files (path, size, mtime) used to detect staleness
+
+Usage:
+    python -m training.shard_cache --data ./data/indian-bovine-breeds --task breed \\
+        --out ./data/cache/breed
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+
+from training.datasets import CattleBreedDataset, PRERESIZE_SIZE
+
+IMAGES_FILE = 'images.u8'
+LABELS_FILE = 'labels.npy'
+INDEX_FILE = 'index.json'
+CACHE_VERSION = 1
+
+
+def dataset_fingerprint(samples):
+    """Hash of (path, size, mtime, label) for every sample; changes when the source data does"""
+    digest = hashlib.sha1()
+    for path, label in sorted(samples):
+        stat = os.stat(path)
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{label}\n".encode())
+    return digest.hexdigest()
+
+
+def load_resized(path, size=PRERESIZE_SIZE):
+    """
+    Decode ``path`` straight to a ``size`` uint8 RGB array.
+
+    Returns:
+        array of shape [H, W, 3], or None if the file cannot be decoded
+    """
+    try:
+        with Image.open(path) as img:
+            # Let JPEG decode at a reduced scale that is still >= the target size
+            img.draft('RGB', size)
+            image = img.convert('RGB').resize(size, Image.BILINEAR)
+        return np.asarray(image, dtype=np.uint8)
+    except Exception as e:
+        print(f"Error loading image {path}: {e}")
+        return None
+
+
+def _load_resized_star(args):
+    return load_resized(*args)
+
+
+def build_shard_cache(samples, cache_dir, task, classes, size=PRERESIZE_SIZE, workers=None):
+    """
+    Decode and resize ``samples`` once into ``cache_dir``.
+
+    Args:
+        samples: list of (image_path, label) tuples
+        cache_dir: output directory
+        task: 'breed' or 'cattle'
+        classes: class names, stored alongside for reference
+        size: (width, height) every image is resized to
+        workers: decode processes (default: all CPUs)
+
+    Returns:
+        index: the contents written to index.json
+    """
+    if not samples:
+        raise ValueError("No samples to cache")
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    width, height = size
+    row_shape = (height, width, 3)
+    row_bytes = int(np.prod(row_shape))
+
+    # Invalidate any previous cache first so a crash mid-build is never mistaken for a complete one
+    (cache_dir / INDEX_FILE).unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    tmp_images = cache_dir / (IMAGES_FILE + '.tmp')
+    images = np.memmap(tmp_images, dtype=np.uint8, mode='w+', shape=(len(samples),) + row_shape)
+
+    kept_paths, labels, skipped = [], [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        decoded = pool.map(_load_resized_star, [(path, size) for path, _ in samples], chunksize=32)
+        for (path, label), array in zip(samples, decoded):
+            if array is None:
+                skipped.append(path)
+                continue
+            images[len(kept_paths)] = array
+            kept_paths.append(path)
+            labels.append(label)
+
+    images.flush()
+    del images
+    if not kept_paths:
+        tmp_images.unlink()
+        raise ValueError(f"None of the {len(samples)} images could be decoded; nothing to cache "
+                         f"(first failure: {skipped[0]})")
+    # Drop the rows reserved for images that failed to decode
+    os.truncate(tmp_images, len(kept_paths) * row_bytes)
+    os.replace(tmp_images, cache_dir / IMAGES_FILE)
+    np.save(cache_dir / LABELS_FILE, np.asarray(labels, dtype=np.int64))
+
+    index = {
+        'version': CACHE_VERSION,
+        'task': task,
+        'classes': list(classes),
+        'shape': [len(kept_paths)] + list(row_shape),
+        'fingerprint': dataset_fingerprint(samples),
+        'paths': kept_paths,
+        'skipped': skipped,
+        'build_seconds': time.perf_counter() - start,
+    }
+    with open(cache_dir / INDEX_FILE, 'w') as f:
+        json.dump(index, f)
+
+    print(f"✅ Cached {len(kept_paths)} images at {width}×{height} in {index['build_seconds']:.1f}s "
+          f"({len(skipped)} skipped) -> {cache_dir}")
+    return index
+
+
+def load_index(cache_dir):
+    """Return the cache index, or None if there is no complete cache in ``cache_dir``"""
+    try:
+        with open(Path(cache_dir) / INDEX_FILE) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != CACHE_VERSION or not (Path(cache_dir) / IMAGES_FILE).exists():
+        return None
+    return index
+
+
+def ensure_shard_cache(dataset, cache_dir, size=PRERESIZE_SIZE, workers=None):
+    """
+    Build the cache for ``dataset`` (a CattleBreedDataset) unless an up-to-date
+    one already exists in ``cache_dir``.
+    """
+    index = load_index(cache_dir)
+    if (index is not None and index['task'] == dataset.task
+            and index['shape'][1:3] == [size[1], size[0]]
+            and index['fingerprint'] == dataset_fingerprint(dataset.samples)):
+        print(f"✅ Using existing shard cache: {cache_dir}")
+        return index
+    return build_shard_cache(dataset.samples, cache_dir, dataset.task, dataset.classes, size, workers)
+
+
+class ShardCacheDataset(Dataset):
+    """
+    Dataset over a shard cache. Drop-in replacement for CattleBreedDataset:
+    same ``samples``, ``classes``, ``task`` and ``transform`` attributes, and
+    ``__getitem__`` returns (transformed image, label).
+
+    The memory map is opened lazily in each process so DataLoader workers
+    share the page cache instead of receiving a pickled copy of the array.
+    """
+
+    def __init__(self, cache_dir, transform=None):
+        self.cache_dir = Path(cache_dir)
+        self.transform = transform
+        self.index = load_index(self.cache_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"No shard cache found in {self.cache_dir}")
+        self.task = self.index['task']
+        self.classes = self.index['classes']
+        self.labels = np.load(self.cache_dir / LABELS_FILE)
+        self.samples = list(zip(self.index['paths'], self.labels.tolist()))
+        self._images = None
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.memmap(self.cache_dir / IMAGES_FILE, dtype=np.uint8, mode='r',
+                                     shape=tuple(self.index['shape']))
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        # A view into the mapped file; PIL copies the 192 KB row, nothing is decoded
+        image = Image.fromarray(self.images[idx])
+        if self.transform:
+            image = self.transform(image)
+        return image, int(self.labels[idx])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the pre-decoded training image cache")
+    parser.add_argument('--data', required=True, help="dataset root with one directory per class")
+    parser.add_argument('--task', choices=['breed', 'cattle'], default='breed')
+    parser.add_argument('--out', required=True, help="cache directory to write")
+    parser.add_argument('--size', type=int, nargs=2, default=list(PRERESIZE_SIZE), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--workers', type=int, help="decode processes (default: all CPUs)")
+    args = parser.parse_args()
+
+    dataset = CattleBreedDataset(args.data, task=args.task)
+    ensure_shard_cache(dataset, args.out, tuple(args.size), args.workers)
+
+
+if __name__ == '__main__':
+    main()
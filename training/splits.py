@@ -0,0 +1,245 @@
+"""
+Stable train/validation splits and per-split dataset views.
+
+``create_data_loaders`` used to ``random_split`` a single dataset and then set
+``train_dataset.dataset.transform`` and ``val_dataset.dataset.transform``,
+which are the same object: both subsets ended up with ``val_transforms`` and
+training ran without augmentation. The split was also recomputed every run.
+
+Here the split is computed once per dataset version (a hash of the sample
+paths and labels), train ratio and seed, stratified by class, and stored as a
+JSON file of paths.
+Each side of it is a ``TransformSubset`` that applies its own transform.
+Validation preprocessing is deterministic, so the resized validation images
+are cached once per split as a memory-mapped uint8 array and reused by
+every epoch and every later run.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from torchvision import transforms
+
+from training.datasets import IMAGENET_MEAN, IMAGENET_STD
+
+SPLIT_VERSION = 1
+VAL_IMAGE_SIZE = (224, 224)
+
+
+def dataset_version(samples):
+    """Short hash identifying the set of (path, label) samples, independent of order"""
+    digest = hashlib.sha1()
+    for path, label in sorted(samples):
+        digest.update(f"{path}\0{label}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def stratified_split(samples, train_split, seed):
+    """
+    Split sample indices per class so every class keeps the ``train_split`` ratio.
+
+    Returns:
+        train_indices, val_indices: sorted lists of indices into ``samples``
+    """
+    rng = np.random.default_rng(seed)
+    by_label = {}
+    # Sort by path first so the split does not depend on directory listing order
+    for idx in sorted(range(len(samples)), key=lambda i: samples[i][0]):
+        by_label.setdefault(samples[idx][1], []).append(idx)
+
+    train_indices, val_indices = [], []
+    for label in sorted(by_label):
+        indices = np.array(by_label[label])
+        rng.shuffle(indices)
+        n_train = int(round(train_split * len(indices)))
+        if len(indices) > 1:
+            # Keep at least one validation image for every class that has two or more
+            n_train = min(n_train, len(indices) - 1)
+        train_indices.extend(indices[:n_train].tolist())
+        val_indices.extend(indices[n_train:].tolist())
+    return sorted(train_indices), sorted(val_indices)
+
+
+class SplitManager:
+    """
+    Stores one train/val split per dataset version, train ratio and seed under ``split_dir``.
+
+    The split is recorded by path, so it survives re-ordering of the sample
+    list and is shared by every run (and every sweep trial) on the same data.
+    The ratio and seed are part of the file name and of the returned split id,
+    so changing either gives a new split with its own validation cache instead
+    of silently reusing tensors cached for another split.
+    """
+
+    def __init__(self, split_dir):
+        self.split_dir = Path(split_dir)
+
+    def split_path(self, task, version, train_split, seed):
+        return self.split_dir / f"{task}-{version}-{train_split:g}-{seed}.json"
+
+    def get_split(self, dataset, train_split, seed):
+        """
+        Return (train_indices, val_indices, split_id) for ``dataset``, creating
+        and storing the split the first time this dataset version is seen.
+        """
+        version = dataset_version(dataset.samples)
+        path = self.split_path(dataset.task, version, train_split, seed)
+        split = self._load(path)
+
+        if split is None or split['train_split'] != train_split or split['seed'] != seed:
+            train_indices, val_indices = stratified_split(dataset.samples, train_split, seed)
+            split = {
+                'version': SPLIT_VERSION,
+                'task': dataset.task,
+                'dataset_version': version,
+                'train_split': train_split,
+                'seed': seed,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'train': [dataset.samples[i][0] for i in train_indices],
+                'val': [dataset.samples[i][0] for i in val_indices],
+            }
+            self.split_dir.mkdir(parents=True, exist_ok=True)
+            # Parallel tasks and concurrent sweep trials may write the same split;
+            # each writes its own file and renames it into place
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(split, f)
+            os.replace(tmp_path, path)
+            print(f"📝 Stored new {dataset.task} split {path.name}")
+            return train_indices, val_indices, path.stem
+
+        position = {sample_path: idx for idx, (sample_path, _) in enumerate(dataset.samples)}
+        train_indices = sorted(position[p] for p in split['train'])
+        val_indices = sorted(position[p] for p in split['val'])
+        return train_indices, val_indices, path.stem
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                split = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return split if split.get('version') == SPLIT_VERSION else None
+
+
+def content_fingerprint(dataset):
+    """
+    Short fingerprint of the image content behind ``dataset``.
+
+    Shard-cache datasets hold already-resized images, so they are tagged
+    apart from raw decodes of the same files.
+    """
+    index = getattr(dataset, 'index', None)
+    if index is not None:
+        return 'shard-' + index['fingerprint'][:12]
+    from training.shard_cache import dataset_fingerprint
+    return 'raw-' + dataset_fingerprint(dataset.samples)[:12]
+
+
+def validation_cache_prefix(dataset, split_dir, split_id):
+    """
+    Path prefix for the cached validation tensors of ``split_id``.
+
+    Keyed by the content fingerprint as well as the split, so edited images or
+    a rebuilt shard cache get fresh tensors while keeping the same split.
+    """
+    return Path(split_dir) / f"{split_id}-{content_fingerprint(dataset)}"
+
+
+class TransformSubset(Dataset):
+    """
+    A view over ``indices`` of ``dataset`` with its own ``transform``.
+
+    The underlying dataset must return untransformed images (its ``transform``
+    is None), so train and validation views never interfere.
+    """
+
+    def __init__(self, dataset, indices, transform=None):
+        if getattr(dataset, 'transform', None) is not None:
+            raise ValueError("TransformSubset needs a base dataset without a transform")
+        self.dataset = dataset
+        self.indices = list(indices)
+        self.transform = transform
+
+    @property
+    def labels(self):
+        return [self.dataset.samples[i][1] for i in self.indices]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        image, label = self.dataset[self.indices[idx]]
+        if self.transform:
+            image = self.transform(image)
+        return image, label
+
+
+class CachedValidationDataset(Dataset):
+    """
+    Deterministically preprocessed validation images, cached once per split.
+
+    Equivalent to ``val_transforms``: images are resized to 224×224 once and
+    stored as uint8; ``__getitem__`` only converts and normalizes the tensor.
+    """
+
+    def __init__(self, view, cache_prefix):
+        images_path = Path(f"{cache_prefix}-val.npy")
+        labels_path = Path(f"{cache_prefix}-val-labels.npy")
+        if not (images_path.exists() and labels_path.exists()):
+            self._build(view, images_path, labels_path)
+        self.images_path = images_path
+        self.labels = np.load(labels_path)
+        self._images = None
+        if len(self.labels) != len(view):
+            raise ValueError(f"Validation cache {images_path} does not match its split")
+        self.mean = torch.tensor(IMAGENET_MEAN).view(3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD).view(3, 1, 1)
+
+    @staticmethod
+    def _build(view, images_path, labels_path):
+        resize = transforms.Resize(VAL_IMAGE_SIZE)
+        # Per-process temporary files, renamed into place, as concurrent trials may build the same cache
+        tmp_images_path = images_path.with_suffix(f'.{os.getpid()}.tmp.npy')
+        tmp_labels_path = labels_path.with_suffix(f'.{os.getpid()}.tmp.npy')
+        images = np.lib.format.open_memmap(
+            tmp_images_path, mode='w+', dtype=np.uint8,
+            shape=(len(view), VAL_IMAGE_SIZE[0], VAL_IMAGE_SIZE[1], 3)
+        )
+        labels = np.empty(len(view), dtype=np.int64)
+        for i in range(len(view)):
+            image, label = view.dataset[view.indices[i]]
+            images[i] = np.asarray(resize(image), dtype=np.uint8)
+            labels[i] = label
+        images.flush()
+        del images
+        np.save(tmp_labels_path, labels)
+        os.replace(tmp_labels_path, labels_path)
+        os.replace(tmp_images_path, images_path)
+        print(f"✅ Cached {len(view)} preprocessed validation images -> {images_path}")
+
+    @property
+    def images(self):
+        # Opened lazily per process, like ShardCacheDataset, so workers share the page cache
+        if self._images is None:
+            self._images = np.load(self.images_path, mmap_mode='r')
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        image = torch.from_numpy(np.array(self.images[idx])).permute(2, 0, 1).float().div_(255)
+        return (image - self.mean) / self.std, int(self.labels[idx])
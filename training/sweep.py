@@ -0,0 +1,239 @@
+"""
+Hyperparameter sweeps with parallel trials and successive halving.
+
+Trying an alternative to ``TRAINING_CONFIG`` used to mean editing the dict in
+the notebook and rerunning it serially. This runner expands a grid of config
+overrides into trials, trains them in parallel processes with an even share
+of the CPU threads each (loader workers included), and prunes the losing half
+(``--eta``) at every rung of the epoch budget. Trials resume from their own
+``training.engine`` checkpoint when promoted, so no epoch is trained twice.
+
+The dataset manifest, shard cache, train/val split and validation cache are
+prepared once in the parent process; every trial reads the same files, so
+parallel trials share the page cache instead of multiplying I/O.
+
+Usage:
+    python -m training.sweep --data ./data/indian-bovine-breeds --cache-dir ./data/cache --task breed \\
+        --grid learning_rate=0.001,0.0003 batch_size=32,64 weight_decay=0.0001,0.001 \\
+        --parallel 4 --min-epochs 2 --max-epochs 16
+"""
+
+import argparse
+import ast
+import itertools
+import json
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import torch
+
+from training.data_pipeline import available_cpus, create_data_loaders, split_cpu_budget
+from training.datasets import task_classes
+from training.engine import (
+    CHECKPOINT_FILE, METRICS_FILE, TRAINING_CONFIG, build_dataset, load_training_checkpoint, train_model
+)
+from training.models import create_model
+
+RESULTS_FILE = 'results.json'
+# The rung budget owns num_epochs, and every trial must be ranked on the same
+# train/validation split
+RESERVED_KEYS = ('num_epochs', 'seed', 'train_split')
+# Config keys that legitimately differ between rungs of the same trial
+RUNG_KEYS = ('num_epochs', 'num_workers')
+
+
+def _ranked(results):
+    # Trials that reached a later rung rank above those pruned earlier
+    return sorted(results.values(), key=lambda r: (r['rung'], r['best_val_acc']), reverse=True)
+
+
+def parse_grid(specs):
+    """
+    Parse ``key=v1,v2`` specs into a dict of value lists.
+
+    Keys must exist in TRAINING_CONFIG and not be one of ``RESERVED_KEYS``;
+    values are Python literals.
+    """
+    grid = {}
+    for spec in specs:
+        key, _, values = spec.partition('=')
+        if key in RESERVED_KEYS:
+            raise ValueError(f"{key} cannot be swept: {', '.join(RESERVED_KEYS)} are fixed for the whole sweep")
+        if key not in TRAINING_CONFIG or not values:
+            raise ValueError(f"Bad grid entry {spec!r}; expected <TRAINING_CONFIG key>=v1,v2,...")
+        grid[key] = [ast.literal_eval(value) for value in values.split(',')]
+    return grid
+
+
+def expand_trials(grid):
+    """Cartesian product of ``grid`` as a list of override dicts"""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def rung_budgets(min_epochs, max_epochs, eta):
+    """Epoch budgets of the successive-halving rungs, e.g. 2, 4, 8, 16"""
+    if eta < 2:
+        raise ValueError(f"eta must be at least 2 (got {eta}); with smaller values the budget never grows")
+    if min_epochs < 1:
+        raise ValueError(f"min_epochs must be at least 1 (got {min_epochs})")
+    budgets = [min_epochs]
+    while budgets[-1] < max_epochs:
+        budgets.append(min(max_epochs, budgets[-1] * eta))
+    return budgets
+
+
+def _discard_stale_checkpoint(trial_dir, config):
+    """
+    Delete the trial's checkpoint and metrics if they were trained with another
+    config, e.g. by an earlier sweep with other overrides in the same directory,
+    so the trial starts fresh instead of resuming someone else's run.
+    """
+    checkpoint = load_training_checkpoint(trial_dir / CHECKPOINT_FILE, 'cpu')
+    if checkpoint is None:
+        return
+    saved = checkpoint.get('config', {})
+    changed = sorted(k for k in set(saved) | set(config) if k not in RUNG_KEYS and saved.get(k) != config.get(k))
+    if changed:
+        print(f"⚠️ {trial_dir.name}: checkpoint was trained with different {', '.join(changed)}; starting fresh")
+        for name in (CHECKPOINT_FILE, METRICS_FILE):
+            (trial_dir / name).unlink(missing_ok=True)
+
+
+def _run_trial(trial_id, overrides, budget, task, data_dir, cache_dir, sweep_dir, base_config, threads):
+    """Train one trial up to ``budget`` epochs in total, resuming its checkpoint"""
+    torch.set_num_threads(threads)
+    config = dict(base_config, **overrides, num_epochs=budget)
+    torch.manual_seed(config['seed'])
+
+    classes, _ = task_classes(task)
+    dataset = build_dataset(task, data_dir, cache_dir)
+    train_loader, val_loader = create_data_loaders(dataset, config)
+
+    trial_dir = Path(sweep_dir) / trial_id
+    _discard_stale_checkpoint(trial_dir, config)
+    start = time.perf_counter()
+    _, history = train_model(
+        create_model(num_classes=len(classes), pretrained=True),
+        train_loader,
+        val_loader,
+        trial_id,
+        config,
+        device=torch.device('cpu'),
+        checkpoint_path=trial_dir / CHECKPOINT_FILE,
+        resume=True,
+        metrics_path=trial_dir / METRICS_FILE,
+    )
+    return {
+        'trial': trial_id,
+        'overrides': overrides,
+        'epochs': len(history['val_acc']),
+        'best_val_acc': max(history['val_acc'], default=0.0),
+        'last_val_acc': history['val_acc'][-1] if history['val_acc'] else 0.0,
+        'train_images_per_sec': (sum(history['train_images_per_sec']) / len(history['train_images_per_sec'])
+                                 if history['train_images_per_sec'] else 0.0),
+        'seconds_this_rung': time.perf_counter() - start,
+    }
+
+
+def run_sweep(task, data_dir, sweep_dir, grid, base_config=None, cache_dir=None, parallel=2,
+              min_epochs=2, max_epochs=16, eta=2):
+    """
+    Run a successive-halving sweep over ``grid``.
+
+    Returns:
+        results: one dict per trial (its latest rung), best first
+    """
+    reserved = sorted(set(grid) & set(RESERVED_KEYS))
+    if reserved:
+        raise ValueError(f"{', '.join(reserved)} cannot be swept; they are fixed for the whole sweep")
+    base_config = dict(base_config or TRAINING_CONFIG)
+    trials = {f"trial-{i:02d}": overrides for i, overrides in enumerate(expand_trials(grid))}
+    budgets = rung_budgets(min_epochs, max_epochs, eta)
+    configured_workers = base_config.get('num_workers')
+
+    # Prepare everything trials share once, so they don't race to build it
+    dataset = build_dataset(task, data_dir, cache_dir)
+    create_data_loaders(dataset, base_config)
+
+    print(f"🔬 {len(trials)} trials, rungs {budgets} epochs, {parallel} at a time")
+    results = {}
+    survivors = list(trials)
+    context = multiprocessing.get_context('spawn')
+    for rung, budget in enumerate(budgets):
+        running = min(parallel, len(survivors))
+        # Fewer survivors than slots: give each one a bigger share of the CPU.
+        # Loader workers come out of that share, as in training.engine's parallel mode
+        rung_threads, rung_workers = split_cpu_budget(max(1, available_cpus() // running), configured_workers)
+        rung_config = dict(base_config, num_workers=rung_workers)
+        print(f"\n📶 Rung {rung + 1}/{len(budgets)}: {len(survivors)} trial(s) to {budget} epochs, "
+              f"{rung_threads} threads and {rung_workers} loader workers each")
+        with ProcessPoolExecutor(max_workers=running, mp_context=context) as pool:
+            futures = {
+                trial_id: pool.submit(_run_trial, trial_id, trials[trial_id], budget, task, data_dir,
+                                      cache_dir, sweep_dir, rung_config, rung_threads)
+                for trial_id in survivors
+            }
+            for trial_id, future in futures.items():
+                try:
+                    results[trial_id] = dict(future.result(), rung=rung + 1)
+                except Exception as e:
+                    print(f"❌ {trial_id} failed: {e}")
+                    results[trial_id] = {'trial': trial_id, 'overrides': trials[trial_id], 'rung': rung + 1,
+                                         'epochs': 0, 'best_val_acc': 0.0, 'error': str(e)}
+
+        write_results(sweep_dir, task, grid, budgets, results)
+        print_results_table(results)
+        ranked = sorted(survivors, key=lambda t: results[t]['best_val_acc'], reverse=True)
+        survivors = ranked[:max(1, math.floor(len(ranked) / eta))]
+
+    write_results(sweep_dir, task, grid, budgets, results)
+    print("\n🏆 Final results")
+    print_results_table(results)
+    return _ranked(results)
+
+
+def print_results_table(results):
+    """Trials ranked by rung reached, then best validation accuracy"""
+    rows = _ranked(results)
+    print(f"{'trial':<10} {'rung':>4} {'epochs':>6} {'best val':>9} {'img/s':>8}  overrides")
+    for r in rows:
+        overrides = ' '.join(f"{k}={v}" for k, v in r['overrides'].items())
+        status = f"  ❌ {r['error']}" if r.get('error') else ""
+        print(f"{r['trial']:<10} {r['rung']:>4} {r['epochs']:>6} {r['best_val_acc']:>8.2f}% "
+              f"{r.get('train_images_per_sec', 0.0):>8.1f}  {overrides}{status}")
+
+
+def write_results(sweep_dir, task, grid, budgets, results):
+    path = Path(sweep_dir) / RESULTS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = _ranked(results)
+    with open(path, 'w') as f:
+        json.dump({'task': task, 'grid': grid, 'rungs': budgets, 'results': rows}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter sweep")
+    parser.add_argument('--data', required=True, help="dataset root with one directory per class")
+    parser.add_argument('--task', choices=['breed', 'cattle'], default='breed')
+    parser.add_argument('--grid', nargs='+', required=True,
+                        help="TRAINING_CONFIG overrides as key=v1,v2 (e.g. learning_rate=0.001,0.0003)")
+    parser.add_argument('--cache-dir', help="train from the shared pre-decoded shard cache under this directory")
+    parser.add_argument('--sweep-dir', default='runs/sweep', help="trial checkpoints, metrics and results.json")
+    parser.add_argument('--parallel', type=int, default=2, help="trials trained at once")
+    parser.add_argument('--min-epochs', type=int, default=2, help="epoch budget of the first rung")
+    parser.add_argument('--max-epochs', type=int, default=16, help="epoch budget of the last rung")
+    parser.add_argument('--eta', type=int, default=2, help="keep 1/eta of the trials at every rung (at least 2)")
+    args = parser.parse_args()
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+
+    run_sweep(args.task, args.data, args.sweep_dir, parse_grid(args.grid), cache_dir=args.cache_dir,
+              parallel=args.parallel, min_epochs=args.min_epochs, max_epochs=args.max_epochs, eta=args.eta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Test-time augmentation (TTA) for borderline predictions.
+
+A single forward pass is enough for most uploads. When its top-class
+confidence falls inside an uncertainty band around the 60% breed gate, a few
+augmented views (flip, center crops, the standard resize-256/crop-224 view)
+are evaluated in one batched forward pass and their softmax probabilities
+averaged with the first pass. The common case therefore stays single-pass.
+
+Environment overrides:
+    CATTLE_TTA           "1" enables TTA by default (the sidebar toggle can still change it)
+    CATTLE_TTA_BAND      uncertainty band as "low,high" (default: 0.45,0.75)
+"""
+
+import os
+
+import torch
+import torchvision.transforms.functional as TF
+
+TTA_ENABLED = os.environ.get('CATTLE_TTA', '0') == '1'
+TTA_BAND = tuple(float(v) for v in os.environ.get('CATTLE_TTA_BAND', '0.45,0.75').split(','))
+
+# Center-crop fractions evaluated in addition to the full frame; 1.0 is the
+# full frame flipped horizontally
+CROP_FRACTIONS = (0.9, 0.8)
+
+
+def in_uncertainty_band(confidence, band):
+    """True if TTA should run for this first-pass ``confidence``"""
+    if not band:
+        return False
+    low, high = band
+    return low <= confidence < high
+
+
+def build_tta_views(image, mean, std, size=224):
+    """
+    Augmented views of ``image`` (excluding the plain first-pass view) as one batch.
+
+    Returns:
+        views: tensor of shape [V, 3, size, size]
+    """
+    width, height = image.size
+    views = [TF.hflip(image)]
+    for fraction in CROP_FRACTIONS:
+        crop = TF.center_crop(image, [int(height * fraction), int(width * fraction)])
+        views.append(crop)
+        views.append(TF.hflip(crop))
+    # The conventional resize-256 / center-crop-224 evaluation view: a slight
+    # zoom in (the central 87.5% of the squashed frame), not a zoom out
+    views.append(TF.center_crop(TF.resize(image, [int(size * 256 / 224)] * 2), [size, size]))
+
+    return torch.stack([
+        TF.normalize(TF.to_tensor(TF.resize(view, [size, size])), mean, std)
+        for view in views
+    ])
+
+
+def tta_probabilities(model, views, first_pass_probs):
+    """
+    Average ``first_pass_probs`` with the softmax over the ``build_tta_views``
+    batch, already matched to the model's memory format. Runs under the
+    caller's ``torch.no_grad()`` (and autocast, if any).
+
+    Returns:
+        probs: 1-D tensor of averaged class probabilities
+    """
+    view_probs = torch.softmax(model(views).float(), dim=1)
+    return torch.cat([first_pass_probs.unsqueeze(0), view_probs]).mean(dim=0)
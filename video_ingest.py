@@ -0,0 +1,323 @@
+"""
+Video file and camera-stream ingest with frame sampling and clip aggregation.
+
+Walk-by videos run at 25-60 fps, but consecutive frames of an animal are
+nearly identical, so classifying every frame mostly repeats work. Frames are
+sampled at a target rate instead, and the stride adapts to the footage:
+
+- a sampled frame that barely differs from the last kept one (mean absolute
+  difference of 32×32 grayscale thumbnails) is skipped and the stride doubles
+- a large difference (fast motion, a new animal) halves the stride
+
+Skipped frames are only grabbed, never converted or resized. Decoding runs in
+a background thread so it overlaps the forward passes, and kept frames are
+classified in batches. Per-frame probabilities are averaged into one result
+per clip.
+
+OpenCV is optional; without it video input is rejected with an install hint.
+
+OpenCV hands sources to FFmpeg, which also opens camera devices, local files
+and protocols such as ``concat:``. Visitors of a public app must not choose
+what the server opens, so live streams are off unless the operator enables
+them, and then only allowlisted rtsp/http(s) URLs are accepted.
+
+Environment overrides:
+    CATTLE_VIDEO_SAMPLE_FPS    frames per second of footage to sample (default: 2)
+    CATTLE_VIDEO_FRAME_DIFF    thumbnail difference below which a frame is skipped (default: 0.006)
+    CATTLE_VIDEO_MAX_FRAMES    frames classified per clip at most (default: 48)
+    CATTLE_VIDEO_MAX_SECONDS   footage read from a live stream at most (default: 20)
+    CATTLE_VIDEO_BATCH         frames per forward pass (default: 16)
+    CATTLE_VIDEO_STREAMS       "1" enables live stream input in the app (default: disabled)
+    CATTLE_VIDEO_STREAM_URLS   comma-separated stream URLs the app may open (default: none)
+"""
+
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import torch
+
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv', 'webm']
+SAMPLE_FPS = float(os.environ.get('CATTLE_VIDEO_SAMPLE_FPS', '2'))
+FRAME_DIFF_THRESHOLD = float(os.environ.get('CATTLE_VIDEO_FRAME_DIFF', '0.006'))
+MAX_FRAMES = int(os.environ.get('CATTLE_VIDEO_MAX_FRAMES', '48'))
+MAX_STREAM_SECONDS = float(os.environ.get('CATTLE_VIDEO_MAX_SECONDS', '20'))
+BATCH_SIZE = int(os.environ.get('CATTLE_VIDEO_BATCH', '16'))
+STREAMS_ENABLED = os.environ.get('CATTLE_VIDEO_STREAMS', '0').strip() == '1'
+STREAM_URLS = [url.strip() for url in os.environ.get('CATTLE_VIDEO_STREAM_URLS', '').split(',') if url.strip()]
+STREAM_SCHEMES = ('rtsp', 'http', 'https')
+
+# Streams often report no frame rate
+DEFAULT_FPS = 25.0
+DIFF_SIZE = (32, 32)
+# The stride never grows beyond this multiple of the base stride, so a long
+# static stretch cannot hide an animal walking in
+MAX_STRIDE_FACTOR = 4
+# A difference this many times the threshold counts as fast motion
+MOTION_FACTOR = 4
+PREVIEW_MAX_SIDE = 320
+MODEL_INPUT_SIZE = (224, 224)
+
+
+class VideoRejected(Exception):
+    """Raised when a video cannot be opened or OpenCV is not installed"""
+
+
+def _cv2():
+    try:
+        import cv2
+    except ImportError:
+        raise VideoRejected("Video analysis needs OpenCV: pip install opencv-python-headless")
+    return cv2
+
+
+def is_stream(source):
+    """True for camera indices and network streams, which have no end"""
+    return isinstance(source, int) or str(source).isdigit() or '://' in str(source)
+
+
+def allowed_streams(enabled=STREAMS_ENABLED, urls=STREAM_URLS):
+    """Allowlisted stream URLs with a permitted scheme, or [] when stream input is disabled"""
+    if not enabled:
+        return []
+    return [url for url in urls if urlsplit(url).scheme.lower() in STREAM_SCHEMES]
+
+
+def check_stream_source(source, enabled=STREAMS_ENABLED, urls=STREAM_URLS):
+    """
+    Validate a stream chosen in the app before it reaches OpenCV.
+
+    Raises:
+        VideoRejected: if stream input is disabled, ``source`` is a camera
+            index, uses another scheme, or is not on the operator's allowlist
+    """
+    source = str(source).strip()
+    if not enabled:
+        raise VideoRejected("Live stream input is disabled on this server")
+    if source.isdigit():
+        raise VideoRejected("Camera devices cannot be opened from the app")
+    if urlsplit(source).scheme.lower() not in STREAM_SCHEMES:
+        raise VideoRejected(f"Only {', '.join(STREAM_SCHEMES)} streams are supported")
+    if source not in allowed_streams(enabled, urls):
+        raise VideoRejected("This stream is not on the server's allowlist")
+    return source
+
+
+def open_capture(source):
+    """
+    Open a video file, stream URL (rtsp://, http://) or camera index.
+
+    Raises:
+        VideoRejected: if OpenCV is missing or the source cannot be opened
+    """
+    cv2 = _cv2()
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else str(source))
+    if not capture.isOpened():
+        capture.release()
+        raise VideoRejected(f"Could not open video {source}")
+    return capture
+
+
+def frame_difference(a, b):
+    """Mean absolute difference of two uint8 thumbnails, in [0, 1]"""
+    return float(np.abs(a.astype(np.int16) - b).mean()) / 255.0
+
+
+def sample_frames(source, sample_fps=SAMPLE_FPS, diff_threshold=FRAME_DIFF_THRESHOLD,
+                  max_frames=MAX_FRAMES, max_seconds=None, stats=None):
+    """
+    Yield the frames of ``source`` worth classifying.
+
+    Args:
+        source: video path, stream URL or camera index
+        sample_fps: target sampling rate; None samples every frame
+        diff_threshold: skip frames closer than this to the last kept frame; 0 keeps all
+        max_frames: stop after this many kept frames; None reads the whole clip
+        max_seconds: stop after this much footage (default: MAX_STREAM_SECONDS for streams)
+        stats: optional dict updated with 'decoded', 'sampled', 'skipped_similar' and 'fps'
+
+    Yields:
+        (timestamp_s, model_input, preview): model_input is a 224×224 RGB uint8
+        array, preview a small RGB uint8 array with the original aspect ratio
+    """
+    cv2 = _cv2()
+    stats = stats if stats is not None else {}
+    stats.update(decoded=0, sampled=0, skipped_similar=0)
+    if max_seconds is None and is_stream(source):
+        max_seconds = MAX_STREAM_SECONDS
+
+    capture = open_capture(source)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        stats['fps'] = fps
+        base_stride = max(1, round(fps / sample_fps)) if sample_fps else 1
+        stride = base_stride
+        until_next = 0
+        last_thumb = None
+        kept = 0
+        while max_frames is None or kept < max_frames:
+            # grab() demuxes and decodes; the colour conversion in retrieve()
+            # is only paid for frames that are looked at
+            if not capture.grab():
+                break
+            timestamp = stats['decoded'] / fps
+            stats['decoded'] += 1
+            if max_seconds is not None and timestamp > max_seconds:
+                break
+            if until_next > 0:
+                until_next -= 1
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            stats['sampled'] += 1
+
+            if diff_threshold:
+                thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), DIFF_SIZE,
+                                   interpolation=cv2.INTER_AREA)
+                if last_thumb is not None:
+                    difference = frame_difference(thumb, last_thumb)
+                    if difference < diff_threshold:
+                        stats['skipped_similar'] += 1
+                        stride = min(stride * 2, base_stride * MAX_STRIDE_FACTOR)
+                        until_next = stride - 1
+                        continue
+                    stride = max(1, base_stride // 2) if difference > diff_threshold * MOTION_FACTOR else base_stride
+                last_thumb = thumb
+            until_next = stride - 1
+
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            height, width = rgb.shape[:2]
+            scale = PREVIEW_MAX_SIDE / max(height, width)
+            preview = cv2.resize(rgb, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                 interpolation=cv2.INTER_AREA) if scale < 1 else rgb
+            kept += 1
+            yield timestamp, cv2.resize(rgb, MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA), preview
+    finally:
+        capture.release()
+
+
+def _prefetch(iterator, maxsize, stats):
+    """Run ``iterator`` in a background thread, so decoding overlaps inference"""
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Give up once the consumer has gone, so the capture gets released
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        start = time.perf_counter()
+        try:
+            for item in iterator:
+                if not put(item):
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            iterator.close()
+            stats['decode_seconds'] = time.perf_counter() - start
+            put(done)
+
+    threading.Thread(target=produce, name='video-decode', daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def frames_to_batch(frames, mean, std):
+    """Stack 224×224 RGB uint8 frames into a normalized [B, 3, 224, 224] float batch"""
+    batch = torch.from_numpy(np.stack(frames)).permute(0, 3, 1, 2).float().div_(255.0)
+    return (batch - torch.tensor(mean).view(1, 3, 1, 1)) / torch.tensor(std).view(1, 3, 1, 1)
+
+
+def analyze_clip(source, classify_batch, mean, std, batch_size=BATCH_SIZE, keep_previews=True, **sampling):
+    """
+    Sample, classify and aggregate one clip.
+
+    Args:
+        source: video path, stream URL or camera index
+        classify_batch: callable taking a normalized frame batch and returning
+            (cattle_probs [B, C], breed_probs [B, K] or None, breed_mask [B] bool)
+            as numpy arrays; breed_mask marks the frames that passed the breed
+            gate, the other rows of breed_probs are ignored
+        mean, std: normalization of the models
+        batch_size: frames per forward pass
+        keep_previews: return the small preview of every classified frame
+        **sampling: forwarded to ``sample_frames``
+
+    Returns:
+        dict with per-frame 'timestamps', 'cattle_probs', 'breed_probs' and
+        'breed_mask', clip-level 'cattle_probs' / 'breed_probs' means
+        ('clip_*'), 'previews' and 'stats' (frame counts and timings)
+    """
+    stats = {}
+    start = time.perf_counter()
+    timestamps, previews = [], []
+    cattle_rows, breed_rows, masks = [], [], []
+    classify_seconds = 0.0
+
+    def flush(frames):
+        nonlocal classify_seconds
+        classify_start = time.perf_counter()
+        cattle_probs, breed_probs, breed_mask = classify_batch(frames_to_batch(frames, mean, std))
+        classify_seconds += time.perf_counter() - classify_start
+        cattle_rows.append(cattle_probs)
+        masks.append(breed_mask)
+        if breed_probs is not None:
+            breed_rows.append(breed_probs)
+
+    pending = []
+    for timestamp, frame, preview in _prefetch(sample_frames(source, stats=stats, **sampling),
+                                               batch_size * 2, stats):
+        timestamps.append(timestamp)
+        if keep_previews:
+            previews.append(preview)
+        pending.append(frame)
+        if len(pending) == batch_size:
+            flush(pending)
+            pending = []
+    if pending:
+        flush(pending)
+
+    wall = time.perf_counter() - start
+    cattle_probs = np.concatenate(cattle_rows) if cattle_rows else np.zeros((0, 0), dtype=np.float32)
+    breed_mask = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+    breed_probs = np.concatenate(breed_rows) if breed_rows else None
+    # Breed probabilities only count for frames that passed the gate
+    gated = breed_probs[breed_mask] if breed_probs is not None else None
+
+    stats.update(
+        classified=len(timestamps),
+        wall_seconds=wall,
+        classify_seconds=classify_seconds,
+        decoded_fps=stats.get('decoded', 0) / wall if wall > 0 else 0.0,
+        processed_fps=len(timestamps) / wall if wall > 0 else 0.0,
+    )
+    return {
+        'timestamps': timestamps,
+        'cattle_probs': cattle_probs,
+        'breed_probs': breed_probs,
+        'breed_mask': breed_mask,
+        'clip_cattle_probs': cattle_probs.mean(axis=0) if len(cattle_probs) else None,
+        'clip_breed_probs': gated.mean(axis=0) if gated is not None and len(gated) else None,
+        'previews': previews,
+        'stats': stats,
+    }